@@ -0,0 +1,220 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+
+'''Evaluation grids: the content-addressed grid cache, user defined grids and near-field spheres'''
+
+import os
+import json
+import math
+import shutil
+import hashlib
+import functools
+import numpy as np
+
+from .meshFiles import flattenFaces, writeNodes, writeElements, readMeshHeader, readNodes, readElements
+
+# grids in Mesh2Input/EvaluationGrids that are spheres of the hyperinterpolation points of order N
+sphereTemplates = {46: '21_NF'}
+
+# blocks of 10000 node numbers that Output2HRTF_Main.m does not reserve for a grid (e.g. 210000: NF, 220000: FF)
+nearFieldOffsets = [200000]+list(range(230000, 300000, 10000))+list(range(600000, 700000, 10000))
+
+
+class EvaluationGrid:
+    '''Evaluation grid given by arrays instead of a folder in Mesh2Input/EvaluationGrids
+
+    vertices are given in the unit of the export, nodes and elements are
+    numbered starting at offset (e.g. 350000 for 'User', 200000 for the
+    near-field sphere).
+    '''
+
+    def __init__(self, name, vertices, faces, faceSizes=None, offset=0):
+        self.name = name
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.polygonVertices, self.polygonSizes = flattenFaces(faces, faceSizes)
+        self.offset = offset
+
+    @property
+    def numNodes(self):
+        return len(self.vertices)
+
+    @property
+    def numElements(self):
+        return len(self.polygonSizes)
+
+    def write(self, targetPath, unitFactor=1):
+        writeNodes(os.path.join(targetPath, "Nodes.txt"), self.vertices*unitFactor, offset=self.offset)
+        writeElements(os.path.join(targetPath, "Elements.txt"), self.polygonVertices, self.polygonSizes, offset=self.offset, suffix=" 2 0 1")
+
+
+def defaultGridCachePath():
+    return os.path.join(os.path.expanduser("~"), ".mesh2hrtf", "EvaluationGrids")
+
+
+def cacheEvaluationGrid(sourcePath, cachePath):
+    '''Store Nodes.txt and Elements.txt of a grid in the content-addressed cache
+
+    Returns the content hash and the number of nodes and elements. Sources
+    whose size and modification time did not change since they were cached
+    are neither re-hashed nor re-parsed.
+    '''
+    if not os.path.exists(cachePath):
+        os.makedirs(cachePath)
+    indexFile = os.path.join(cachePath, "index.json")
+    try:
+        with open(indexFile) as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        index = {}
+
+    sourcePath = os.path.abspath(sourcePath)
+    stamp = []
+    for name in ["Nodes.txt", "Elements.txt"]:
+        stat = os.stat(os.path.join(sourcePath, name))
+        stamp.extend([stat.st_size, stat.st_mtime_ns])
+
+    entry = index.get(sourcePath)
+    if entry is not None and entry['stamp'] == stamp and os.path.isdir(os.path.join(cachePath, entry['hash'])):
+        return entry['hash'], entry['numNodes'], entry['numElements']
+
+    contentHash = hashlib.sha1()
+    for name in ["Nodes.txt", "Elements.txt"]:
+        with open(os.path.join(sourcePath, name), "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                contentHash.update(block)
+    contentHash = contentHash.hexdigest()
+
+    # write to a temporary folder and rename it, so concurrent exports never see partial files
+    gridCache = os.path.join(cachePath, contentHash)
+    if not os.path.isdir(gridCache):
+        temp = "%s.%d.tmp" % (gridCache, os.getpid())
+        shutil.rmtree(temp, ignore_errors=True)
+        os.mkdir(temp)
+        for name in ["Nodes.txt", "Elements.txt"]:
+            shutil.copyfile(os.path.join(sourcePath, name), os.path.join(temp, name))
+        try:
+            os.rename(temp, gridCache)
+        except OSError:
+            shutil.rmtree(temp, ignore_errors=True)
+
+    index[sourcePath] = {'stamp': stamp,
+                         'hash': contentHash,
+                         'numNodes': readMeshHeader(os.path.join(gridCache, "Nodes.txt")),
+                         'numElements': readMeshHeader(os.path.join(gridCache, "Elements.txt"))}
+    temp = "%s.%d.tmp" % (indexFile, os.getpid())
+    with open(temp, "w") as file:
+        json.dump(index, file, indent=1)
+    os.replace(temp, indexFile)
+
+    entry = index[sourcePath]
+    return entry['hash'], entry['numNodes'], entry['numElements']
+
+
+def deployFile(source, target, deployment='HARDLINK'):
+    '''Place source at target as hard link or symbolic link, copying if linking fails'''
+    if os.path.lexists(target):
+        if deployment == 'HARDLINK' and os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        if deployment == 'HARDLINK':
+            os.link(source, target)
+            return
+        if deployment == 'SYMLINK':
+            os.symlink(os.path.abspath(source), target)
+            return
+    except OSError:
+        pass
+    shutil.copyfile(source, target)
+
+
+def deployEvaluationGrid(sourcePath, targetPath, cachePath="", deployment='HARDLINK'):
+    '''Deploy an evaluation grid into a project and return its number of nodes and elements
+
+    With deployment 'COPY' the grid is copied as is. Otherwise it is taken
+    from the content-addressed cache in cachePath (default: ~/.mesh2hrtf) and
+    linked into the project. Linked files are shared by all projects and must
+    not be edited in place.
+    '''
+    if deployment == 'COPY':
+        # deployFile removes links into the cache left by an earlier export first
+        for name in ["Nodes.txt", "Elements.txt"]:
+            deployFile(os.path.join(sourcePath, name), os.path.join(targetPath, name), 'COPY')
+        return readMeshHeader(os.path.join(targetPath, "Nodes.txt")), readMeshHeader(os.path.join(targetPath, "Elements.txt"))
+
+    if not cachePath:
+        cachePath = defaultGridCachePath()
+    contentHash, numNodes, numElements = cacheEvaluationGrid(sourcePath, cachePath)
+    for name in ["Nodes.txt", "Elements.txt"]:
+        deployFile(os.path.join(cachePath, contentHash, name), os.path.join(targetPath, name), deployment)
+    return numNodes, numElements
+
+
+# ----------------------- Near-field spheres -----------------------------------
+@functools.lru_cache(maxsize=None)
+def sphereTemplate(order):
+    '''Return the unit vectors (N, 3) and the triangles (vertex indices) of the sphere of order'''
+    if order not in sphereTemplates:
+        raise ValueError("No sphere of order %d, available: %s" % (order, ", ".join(str(key) for key in sorted(sphereTemplates))))
+    gridPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "EvaluationGrids", sphereTemplates[order])
+    numbers, nodes = readNodes(os.path.join(gridPath, "Nodes.txt"))
+    elementNumbers, elements = readElements(os.path.join(gridPath, "Elements.txt"))
+    directions = nodes/np.linalg.norm(nodes, axis=1)[:, np.newaxis]
+    return directions, np.searchsorted(numbers, elements)
+
+
+def nearFieldRadius(vertices, unitFactor=1, margin=0.005, step=0.001):
+    '''Return the radius in metres of a near-field sphere around vertices (in the export unit)
+
+    The largest distance of the vertices from the origin plus margin is
+    rounded up to step, so that subjects of similar size share the same
+    sphere in the grid cache.
+    '''
+    radius = np.max(np.linalg.norm(np.asarray(vertices, dtype=np.float64), axis=1))*unitFactor+margin
+    return math.ceil(round(radius/step, 6))*step
+
+
+def nearFieldOffset(index):
+    '''Return the node offset of the index-th near-field sphere of a project (see nearFieldOffsets)'''
+    if index >= len(nearFieldOffsets):
+        raise ValueError("At most %d near-field spheres can be calculated in one project" % len(nearFieldOffsets))
+    return nearFieldOffsets[index]
+
+
+def nearFieldSphere(radius, order=46, offset=200000, cachePath=""):
+    '''Return the folder of the near-field sphere of radius (metres) in the grid cache
+
+    The sphere (Nodes.txt in metres, Elements.txt, numbered from offset, see
+    nearFieldOffset for several spheres in a project) is written once per order, radius and offset to
+    <cachePath>/NearField/N<order>_<offset>/NF_Sphere_<radius in mm>mm and
+    can be passed to writeProject as nearFieldGrid.
+    '''
+    if not cachePath:
+        cachePath = defaultGridCachePath()
+    gridPath = os.path.join(os.path.abspath(cachePath), "NearField", "N%d_%d" % (order, offset), "NF_Sphere_%gmm" % round(radius*1000, 6))
+    if os.path.isdir(gridPath):
+        return gridPath
+
+    directions, triangles = sphereTemplate(order)
+    temp = "%s.%d.tmp" % (gridPath, os.getpid())
+    shutil.rmtree(temp, ignore_errors=True)
+    os.makedirs(temp)
+    EvaluationGrid(os.path.basename(gridPath), directions*radius, triangles, offset=offset).write(temp)
+    try:
+        os.rename(temp, gridPath)
+    except OSError:
+        shutil.rmtree(temp, ignore_errors=True)
+    return gridPath
@@ -0,0 +1,146 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Manifest of the files written by the export of a project
+
+<project>/ExportManifest.json maps each file (relative to the project) to
+the hash of the data it was written from, its size and modification time
+after writing and optionally a value returned by the writer (e.g. the
+number of nodes and elements of a grid). A re-export writes a file only if
+its data changed or the file was modified or removed since, e.g. the
+meshes are kept if only the frequency step changed. Files of the last
+export that are not part of the new one can be removed (removeStale).
+'''
+
+import os
+import re
+import json
+import hashlib
+import numpy as np
+
+
+def contentKey(*values):
+    '''Return the SHA-1 of arrays (content, dtype and shape) and other values (repr)'''
+    key = hashlib.sha1()
+    for value in values:
+        if isinstance(value, np.ndarray):
+            key.update(repr((value.dtype.str, value.shape)).encode("utf8"))
+            key.update(np.ascontiguousarray(value).tobytes())
+        else:
+            key.update(repr(value).encode("utf8"))
+    return key.hexdigest()
+
+
+def meshKey(meshes, unitFactor=1):
+    '''Return the content key of ObjectMesh or EvaluationGrid objects'''
+    values = [unitFactor]
+    for mesh in sorted(meshes, key=lambda mesh: mesh.name):
+        values.extend([mesh.name, mesh.vertices, mesh.polygonVertices, mesh.polygonSizes,
+                       getattr(mesh, 'materials', None), getattr(mesh, 'materialNames', None), getattr(mesh, 'offset', None)])
+    return contentKey(*values)
+
+
+class ExportManifest:
+    '''Content keys of the files of a project written by the last export'''
+
+    fileName = "ExportManifest.json"
+
+    def __init__(self, projectPath):
+        self.projectPath = projectPath
+        try:
+            with open(os.path.join(projectPath, self.fileName)) as file:
+                self.entries = json.load(file)['files']
+        except (OSError, ValueError, KeyError):
+            self.entries = {}
+        self.written = []
+        self.skipped = []
+        self.removed = []
+
+    def stamp(self, path):
+        filename = os.path.join(self.projectPath, path)
+        if not os.path.isfile(filename):
+            return None
+        stat = os.stat(filename)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def isCurrent(self, paths, key):
+        '''Return True if all files (relative paths) were written from key and not changed since'''
+        for path in paths:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != key or entry[1:3] != self.stamp(path):
+                return False
+        return True
+
+    def update(self, paths, key, write):
+        '''Call write() to write the files paths unless they are current for key, return True if written
+
+        A value returned by write() other than None is kept with the entries
+        (see value).
+        '''
+        if self.isCurrent(paths, key):
+            self.skipped.extend(paths)
+            return False
+        value = write()
+        for path in paths:
+            self.entries[path] = [key]+self.stamp(path)+([value] if value is not None else [])
+        self.written.extend(paths)
+        return True
+
+    def key(self, path):
+        '''Return the key the file path was written from (None if it is not in the manifest)'''
+        entry = self.entries.get(path)
+        return None if entry is None else entry[0]
+
+    def value(self, path):
+        '''Return the value returned by the writer of path (None if there is none)'''
+        entry = self.entries.get(path)
+        if entry is None or len(entry) < 4:
+            return None
+        return entry[3]
+
+    def writeText(self, path, text, key=None):
+        '''Write text to the file path unless it was written from key (default: the text) already'''
+        def write():
+            with open(os.path.join(self.projectPath, path), "w", encoding="utf8", newline="\n") as file:
+                file.write(text)
+        return self.update([path], contentKey(text) if key is None else key, write)
+
+    def removeStale(self, pattern):
+        '''Remove the files matching pattern (regular expression) that the current export did not write or keep'''
+        current = set(self.written+self.skipped)
+        for path in sorted(self.entries):
+            if re.match(pattern, path) and path not in current:
+                if os.path.isfile(os.path.join(self.projectPath, path)):
+                    os.remove(os.path.join(self.projectPath, path))
+                del self.entries[path]
+                self.removed.append(path)
+
+    def save(self):
+        filename = os.path.join(self.projectPath, self.fileName)
+        temp = "%s.%d.tmp" % (filename, os.getpid())
+        with open(temp, "w") as file:
+            json.dump({'version': 1, 'files': self.entries}, file, indent=1, sort_keys=True)
+        os.replace(temp, filename)
+
+    def report(self, maxNames=10):
+        '''Return a summary of the written and the skipped (unchanged) files'''
+        text = "%d files written, %d unchanged files kept" % (len(self.written), len(self.skipped))
+        if self.skipped:
+            names = self.skipped[:maxNames]+(["..."] if len(self.skipped) > maxNames else [])
+            text += ": "+", ".join(names)
+        if self.removed:
+            names = self.removed[:maxNames]+(["..."] if len(self.removed) > maxNames else [])
+            text += "; %d files of the last export removed: %s" % (len(self.removed), ", ".join(names))
+        return text
@@ -18,12 +18,13 @@
 # Co-Authors: Fabian Brinkmann, Robert Pelzer (Audio Communication Group, Technical University Berlin)
 
 import os
+import sys
 import bpy
-import datetime
-import math
-import shutil
+import tempfile
+import importlib.util
+import numpy as np
 from math import pi
-from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, FloatProperty
 from bpy_extras.io_utils import ExportHelper
 
 bl_info = {
@@ -40,6 +41,66 @@ bl_info = {
     "category": "Import-Export"}
 
 
+# ----------------------- Blender mesh access ----------------------------------
+def importMesh2HRTF(programPath):
+    '''Import the mesh2hrtf package (Mesh2HRTF-path) that writes the project files'''
+    module = sys.modules.get("mesh2hrtf")
+    if module is not None and os.path.abspath(programPath) in list(getattr(module, "__path__", [])):
+        return module
+    spec = importlib.util.spec_from_file_location("mesh2hrtf", os.path.join(programPath, "__init__.py"),
+                                                  submodule_search_locations=[os.path.abspath(programPath)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["mesh2hrtf"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def meshVertices(obj_data):
+    '''Return the vertex coordinates of a mesh as (N, 3) float64 array'''
+    vertices = np.empty(len(obj_data.vertices)*3, dtype=np.float32)
+    obj_data.vertices.foreach_get("co", vertices)
+    # float64 so that scaling by the unit factor matches Python float arithmetic
+    return vertices.reshape(-1, 3).astype(np.float64)
+
+
+def meshPolygons(obj_data):
+    '''Return the vertex indices of all polygons (flat) and their number of corners'''
+    numPolygons = len(obj_data.polygons)
+    loopStart = np.empty(numPolygons, dtype=np.int64)
+    loopTotal = np.empty(numPolygons, dtype=np.int64)
+    obj_data.polygons.foreach_get("loop_start", loopStart)
+    obj_data.polygons.foreach_get("loop_total", loopTotal)
+    loopVertices = np.empty(len(obj_data.loops), dtype=np.int64)
+    obj_data.loops.foreach_get("vertex_index", loopVertices)
+
+    # gather the loops polygon by polygon
+    offsets = np.cumsum(loopTotal)-loopTotal
+    loops = np.repeat(loopStart-offsets, loopTotal)+np.arange(loopTotal.sum())
+    return loopVertices[loops], loopTotal
+
+
+def meshMaterialIndices(obj_data):
+    '''Return the material index of all polygons of a mesh'''
+    materialIndices = np.empty(len(obj_data.polygons), dtype=np.int64)
+    obj_data.polygons.foreach_get("material_index", materialIndices)
+    return materialIndices
+
+
+def objectMesh(mesh2hrtf, obj):
+    '''Return a Blender mesh object as mesh2hrtf.ObjectMesh'''
+    obj_data = obj.data
+    polygonVertices, polygonSizes = meshPolygons(obj_data)
+    return mesh2hrtf.ObjectMesh(obj.name, meshVertices(obj_data), polygonVertices, polygonSizes,
+                                meshMaterialIndices(obj_data), [slot.name for slot in obj.material_slots])
+
+
+def evaluationGrid(mesh2hrtf, name, obj, offset):
+    '''Return a Blender mesh object as mesh2hrtf.EvaluationGrid'''
+    obj_data = obj.data
+    polygonVertices, polygonSizes = meshPolygons(obj_data)
+    return mesh2hrtf.EvaluationGrid(name, meshVertices(obj_data), polygonVertices, polygonSizes, offset=offset)
+
+
 class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
     '''Export an object as Mesh2HRTF input files'''
     bl_idname = "export_mesh2hrtf.inp"
@@ -72,27 +133,55 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         description="First 'CPU' used",
         default=1,
         min=1,
-        max=100,
+        max=10000,
         )
     cpuLast = IntProperty(
         name="CPU (last)",
         description="Last 'CPU' used",
         default=10,
         min=1,
-        max=100,
+        max=10000,
         )
     numCoresPerCPU = IntProperty(
         name="Num. of used cores",
         description="Number of used cores per CPU",
         default=8,
         min=1,
-        max=8,
+        max=1024,
         )
     pictures = BoolProperty(
         name="Pictures",
         description="Render pictures",
         default=True,
         )
+    pictureMode = EnumProperty(
+        name="Rendering",
+        description="When the pictures are rendered (pictures of unchanged meshes are taken from the cache in ~/.mesh2hrtf/Pictures)",
+        items=[('BACKGROUND', 'Background', 'Render in a separate Blender process after the export (log in Pictures/render.log)'),
+               ('FOREGROUND', 'Foreground', 'Render before the export finishes')],
+        default='BACKGROUND',
+        )
+    pictureResolution = EnumProperty(
+        name="Resolution",
+        description="Resolution of the pictures",
+        items=[('FULL', 'Full', '1440 x 1920'),
+               ('PREVIEW', 'Preview', '360 x 480, fast')],
+        default='FULL',
+        )
+    blendSnapshot = EnumProperty(
+        name=".blend",
+        description="Snapshot of the model saved as '3d Model.blend' in the project",
+        items=[('FULL', 'Scene', 'Save the whole scene (uncompressed)'),
+               ('COMPRESSED', 'Compressed', 'Save the whole scene compressed'),
+               ('MESHES', 'Meshes', 'Save only the mesh objects, compressed'),
+               ('SKIP', 'None', 'Do not save a .blend file')],
+        default='FULL',
+        )
+    blendDeferred = BoolProperty(
+        name="Save .blend last",
+        description="Save the .blend file after the NumCalc input files were written",
+        default=False,
+        )
     ear = EnumProperty(
         name="Ear",
         description="Selected ear",
@@ -187,6 +276,24 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
                ('None', 'None', 'None')],
         default='None',
         )
+    gridDeployment = EnumProperty(
+        name="Grid files",
+        description="How the evaluation grids are placed in the project",
+        items=[('HARDLINK', 'Hard link', 'Hard link from the grid cache (copy if not possible)'),
+               ('SYMLINK', 'Symbolic link', 'Symbolic link to the grid cache (copy if not possible)'),
+               ('COPY', 'Copy', 'Copy the grid files')],
+        default='HARDLINK',
+        )
+    gridCachePath = StringProperty(
+        name="Grid cache",
+        description="Folder of the content-addressed evaluation grid cache (empty: ~/.mesh2hrtf/EvaluationGrids)",
+        default="",
+        )
+    solveCachePath = StringProperty(
+        name="Solve cache",
+        description="Folder of the cache of solved frequencies shared by all projects (empty: no cache)",
+        default="",
+        )
     method = EnumProperty(
         name="Method",
         description="Choose the calculation method",
@@ -195,6 +302,27 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
                ('4', 'ML-FMM BEM', 'Multilevel fast-multipole method')],
         default='4',
         )
+    frequencyDistribution = EnumProperty(
+        name="Distribution",
+        description="Distribution of the frequencies over the CPUs and cores",
+        items=[('COST', 'Cost model', 'Balance the estimated solve time of the cores (longest first)'),
+               ('ROUND_ROBIN', 'Round robin', 'Deal the frequencies round-robin to the cores'),
+               ('QUEUE', 'Work queue', 'Write one task per frequency, solved by any number of workers (NumCalc/queueWorker.py)')],
+        default='COST',
+        )
+    memoryBudget = FloatProperty(
+        name="Memory (GB)",
+        description="Memory budget per CPU for the estimated NumCalc memory (0: no limit)",
+        default=0,
+        min=0,
+        )
+    memoryPolicy = EnumProperty(
+        name="Over budget",
+        description="What to do if the estimated memory of a CPU exceeds the memory budget",
+        items=[('SPLIT', 'Split', 'Use fewer cores per CPU until the memory budget is met'),
+               ('ERROR', 'Error', 'Stop the export')],
+        default='SPLIT',
+        )
     reciprocity = BoolProperty(
         name="Recip.",
         description="Calculation with reciprocity",
@@ -236,11 +364,35 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         description="Use frequency-dependent meshes",
         default=False,
         )
+    meshGrading = BoolProperty(
+        name="Mesh grading",
+        description="Generate the frequency-dependent meshes from the Reference mesh (coarser meshes for lower frequency bands, the ear is kept fine)",
+        default=False,
+        )
+    elementsPerWavelength = IntProperty(
+        name="Elem./wavel.",
+        description="Minimum number of elements per wavelength of the graded meshes",
+        default=6,
+        min=3,
+        )
+    resolutionPolicy = EnumProperty(
+        name="Mesh check",
+        description="Check of the Reference mesh resolution against the wavelength at the maximum frequency",
+        items=[('WARN', 'Report', 'Print the elements per wavelength and recommendations'),
+               ('ERROR', 'Error', 'Stop the export if the mesh is too coarse for the maximum frequency'),
+               ('OFF', 'Off', 'No check')],
+        default='WARN',
+        )
     nearFieldCalculation = BoolProperty(
         name="NF-Calc.",
         description="Calculate near-field HRTFs",
         default=False,
         )
+    nearFieldRadii = StringProperty(
+        name="NF-radii",
+        description="Radii of additional near-field spheres in the unit of the object, separated by commas (empty: only the sphere enclosing the Reference mesh)",
+        default="",
+        )
     programPath = StringProperty(
         name="Mesh2HRTF-path",
         description="Path to mesh2HRTF",
@@ -266,6 +418,14 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         row.prop(self, "ear")
         row = layout.row()
         row.prop(self, "pictures")
+        row = layout.row()
+        row.prop(self, "pictureMode")
+        row = layout.row()
+        row.prop(self, "pictureResolution")
+        row = layout.row()
+        row.prop(self, "blendSnapshot")
+        row = layout.row()
+        row.prop(self, "blendDeferred")
         layout.label("Point Source:")
         row = layout.row()
         row.prop(self, "sourceXPosition")
@@ -296,7 +456,15 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         row = layout.row()
         row.prop(self, "evaluationGrid5")
         row = layout.row()
+        row.prop(self, "gridDeployment")
+        row = layout.row()
+        row.prop(self, "gridCachePath")
+        row = layout.row()
+        row.prop(self, "solveCachePath")
+        row = layout.row()
         row.prop(self, "nearFieldCalculation")
+        row = layout.row()
+        row.prop(self, "nearFieldRadii")
         layout.label("Frequencies:")
         row = layout.row()
         row.prop(self, "frequencyStepSize")
@@ -305,7 +473,15 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         row = layout.row()
         row.prop(self, "frequencyDependency")
         row = layout.row()
+        row.prop(self, "meshGrading")
+        row = layout.row()
+        row.prop(self, "elementsPerWavelength")
+        row = layout.row()
+        row.prop(self, "resolutionPolicy")
+        row = layout.row()
         row.prop(self, "method")
+        row = layout.row()
+        row.prop(self, "frequencyDistribution")
         layout.label("Cluster:")
         row = layout.row()
         row.prop(self, "cpuFirst")
@@ -313,6 +489,10 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         row.prop(self, "cpuLast")
         row = layout.row()
         row.prop(self, "numCoresPerCPU")
+        row = layout.row()
+        row.prop(self, "memoryBudget")
+        row = layout.row()
+        row.prop(self, "memoryPolicy")
         layout.label("Mesh2HRTF:")
         row = layout.row()
         row.prop(self, "programPath")
@@ -327,13 +507,23 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
              cpuLast=10,
              numCoresPerCPU=8,
              pictures=True,
+             pictureMode='BACKGROUND',
+             pictureResolution='FULL',
+             blendSnapshot='FULL',
+             blendDeferred=False,
              ear='Both ears',
              evaluationGrid1='3_ARI',
              evaluationGrid2='None',
              evaluationGrid3='None',
              evaluationGrid4='None',
              evaluationGrid5='None',
+             gridDeployment='HARDLINK',
+             gridCachePath="",
              method='4',
+             frequencyDistribution='COST',
+             memoryBudget=0,
+             memoryPolicy='SPLIT',
+             solveCachePath="",
              reciprocity=True,
              sourceXPosition='0',
              sourceYPosition='101',
@@ -342,7 +532,11 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
              densityOfMedium='1.1839',
              unit='mm',
              frequencyDependency=False,
+             meshGrading=False,
+             elementsPerWavelength=6,
+             resolutionPolicy='WARN',
              nearFieldCalculation=False,
+             nearFieldRadii="",
              programPath="",
              ):
 
@@ -352,60 +546,6 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         def rvec2d(v):
             return round(v[0], 6), round(v[1], 6)
 
-        # for calculating the center and area of the receivers in reciprocal mode
-        def calculateReceiverProperties(obj, obj_data, unitFactor):
-
-            # allocate variables
-            earArea   = [0., 0.]
-            earCenter = [[[1e6,-1e6],
-                          [1e6,-1e6],
-                          [1e6,-1e6]
-                         ],
-                         [[1e6,-1e6],
-                          [1e6,-1e6],
-                          [1e6,-1e6]
-                         ]]
-
-            # loop elements in obj_data
-            for ii in range(len(obj_data.polygons[:])):
-                if obj.material_slots[obj_data.polygons[ii].material_index].name == obj.material_slots['Left ear'].name or obj.material_slots[obj_data.polygons[ii].material_index].name == obj.material_slots['Right ear'].name:
-
-                    # select the ear
-                    if obj.material_slots[obj_data.polygons[ii].material_index].name == obj.material_slots['Left ear'].name:
-                        ear = 0
-                    else:
-                        ear = 1
-
-                    # update min and max x,y,z-values
-                    for vertex in range(3):
-                        for coord in range (3):
-                            value = obj_data.vertices[obj_data.polygons[ii].vertices[vertex]].co[coord]
-                            if value < earCenter[ear][coord][0]: earCenter[ear][coord][0] = value
-                            if value > earCenter[ear][coord][1]: earCenter[ear][coord][1] = value
-
-                    ## to calculate the polygons (triangles) area first calculate the side lengths using euclidean distance and then use Heron´s formula to calculate the area
-                    # side_a = corner 0 to corner 1
-                    side_a=math.sqrt(((obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[0]-obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[0])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[1] - obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[1])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[2]-obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[2])**2)*unitFactor**2)
-
-                    # side_b = corner 1 to corner 2
-                    side_b=math.sqrt(((obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[0]-obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[0])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[1] - obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[1])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[1]].co[2]-obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[2])**2)*unitFactor**2)
-
-                    # side_c = corner 2 to corner 0
-                    side_c=math.sqrt(((obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[0]-obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[0])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[1] - obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[1])**2)*unitFactor**2 + ((obj_data.vertices[obj_data.polygons[ii].vertices[2]].co[2]-obj_data.vertices[obj_data.polygons[ii].vertices[0]].co[2])**2)*unitFactor**2)
-
-                    # increment area using Heron´s formula
-                    earArea[ear] += 0.25 * math.sqrt((side_a+side_b+side_c)*(-side_a+side_b+side_c)*(side_a-side_b+side_c)*(side_a+side_b-side_c))
-
-            # estimate the center from min and max x,y,z-values
-            earCenter  = [[( earCenter[0][0][0]  + earCenter[0][0][1]  ) / 2 * unitFactor,   # left ear center
-                           ( earCenter[0][1][0]  + earCenter[0][1][1]  ) / 2 * unitFactor,
-                           ( earCenter[0][2][0]  + earCenter[0][2][1]  ) / 2 * unitFactor],
-                          [( earCenter[1][0][0]  + earCenter[1][0][1]  ) / 2 * unitFactor,   # right ear center
-                           ( earCenter[1][1][0]  + earCenter[1][1][1]  ) / 2 * unitFactor,
-                           ( earCenter[1][2][0]  + earCenter[1][2][1]  ) / 2 * unitFactor]]
-
-
-            return earCenter, earArea
 # ----------------------- Initialize constants ---------------------------------
         bpy.ops.object.transform_apply(location=True)
         bpy.ops.object.transform_apply(rotation=True)
@@ -422,61 +562,23 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
         lamp.location = (0, lampradius, 0)
         bpy.data.lamps['Lamp'].energy = 800
         bpy.data.lamps['Lamp'].distance = 100
-        renderloc = [[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0.707, 0.707, 0], [-0.707, 0.707, 0], [0.707, -0.707, 0], [-0.707, -0.707, 0]]  # , [0.707, 0, 0.707], [-0.707, 0, 0.707], [0.707, 0,-0.707], [-0.707, 0,-0.707], [0, 0.707, 0.707], [0,-0.707, 0.707], [0, 0.707,-0.707], [0,-0.707,-0.707]]
-        renderrot = [[pi/2, 0, pi/2], [pi/2, 0, 3*pi/2], [pi/2, 0, pi], [3/2*pi, pi, pi], [pi/2, 0, 3/4*pi], [pi/2, 0, 5/4*pi], [pi/2, 0, pi/4], [pi/2, 0, -pi/4]]  # , [pi/4, 0, pi/2], [5/4*pi, pi, pi/2], [3/4*pi, 0, pi/2], [0, 4*5/pi, 0], [pi/4, 0, pi], [pi/4, 0, 0], [3/4*pi, 0, pi], [3/4*pi, 0, 0]]
-        rendernam = [[0, 0], [180, 0], [90, 0], [270, 0], [45, 0], [135, 0], [315, 0], [225, 0]]
 
         bpy.data.scenes['Scene'].render.pixel_aspect_x = 1
         bpy.data.scenes['Scene'].render.pixel_aspect_y = 1
         bpy.data.scenes['Scene'].render.resolution_x = 1440
         bpy.data.scenes['Scene'].render.resolution_y = 1920
 
-        tmp = open("%s/../VERSION" % programPath)
-        version = tmp.readline()
-
-        objects = ([])
+        mesh2hrtf = importMesh2HRTF(programPath)
 
         (filepath1, filename1) = os.path.split(filepath)
-        filename1 = "NC.inp"
-
-        temp = ("%s/ObjectMeshes/" % filepath1)
-        if not os.path.exists(temp):
-            os.mkdir(temp)
-
-        temp = ("%s/EvaluationGrids/" % filepath1)
-        if not os.path.exists(temp):
-            os.mkdir(temp)
-
-        temp = ("%s/NumCalc/" % filepath1)
-        if not os.path.exists(temp):
-            os.mkdir(temp)
-
-        numCPUs = cpuLast-cpuFirst+1
-
-        numEars = 1
-        if ear == 'Both ears':
-            numEars = 2
 
         unitFactor = 1
         if unit == 'mm':
             unitFactor = 0.001
 
-        lowFrequency = 0
-        lowFrequencyCores = 0
-        if not frequencyDependency:
-            obj = bpy.data.objects["Reference"]
-            obj.hide_render = False
-            obj_data = obj.data
-            if len(obj_data.vertices[:]) > 40000 and numCPUs/numEars > 1:
-                lowFrequency = frequencyStepSize*10
-                lowFrequencyCores = 1
-            else:
-                lowFrequency = 0
-                lowFrequencyCores = 0
-
-        evaluationGridPath = ("%s/Mesh2Input/EvaluationGrids" % programPath)
-
-# ------------------------ Write object data -----------------------------------
+# ------------------------ Collect object data ---------------------------------
+        objectMeshes = ([])
+        blendObjects = ([])
         for obj in bpy.context.scene.objects[:]:
             if obj.type == 'MESH' and not obj.name == 'User':
                 bpy.context.scene.objects.active = obj
@@ -487,605 +589,120 @@ class ExportMesh2HRTF(bpy.types.Operator, ExportHelper):
                 obj.hide_render = False
                 obj_data = obj.data
 
-                temp = ("%s/ObjectMeshes/%s/" % (filepath1, obj.name))
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
+                objectMeshes.append(objectMesh(mesh2hrtf, obj))
+                blendObjects.append(obj)
 
-                file = open(("%s/ObjectMeshes/%s/Nodes.txt" % (filepath1, obj.name)), "w", encoding="utf8", newline="\n")
-                fw = file.write
-                fw("%i\n" % len(obj_data.vertices[:]))
-                for ii in range(len(obj_data.vertices[:])):
-                    fw("%i " % ii)
-                    fw("%.6f %.6f %.6f\n" % (obj_data.vertices[ii].co[0]*unitFactor, obj_data.vertices[ii].co[1]*unitFactor, obj_data.vertices[ii].co[2]*unitFactor))
-                file.close
+        # the .blend file is saved again only if a mesh or the kind of snapshot changed since the last export
+        blendMeshes = objectMeshes
+        if 'User' in bpy.data.objects:
+            blendMeshes = objectMeshes+[objectMesh(mesh2hrtf, bpy.data.objects['User'])]
+            blendObjects.append(bpy.data.objects['User'])
 
-                file = open(("%s/ObjectMeshes/%s/Elements.txt" % (filepath1, obj.name)), "w", encoding="utf8", newline="\n")
-                fw = file.write
-                fw("%i\n" % len(obj_data.polygons[:]))
+        def saveBlend():
+            if blendSnapshot == 'SKIP':
+                return
+            manifest = mesh2hrtf.ExportManifest(filepath1)
+            manifest.update(["3d Model.blend"], mesh2hrtf.meshKey(blendMeshes)+blendSnapshot,
+                            lambda: saveBlendSnapshot("%s/3d Model.blend" % filepath1, blendSnapshot, blendObjects))
+            manifest.save()
 
-                for ii in range(len(obj_data.polygons[:])):
-                    fw("%i " % ii)
-                    if len(obj_data.polygons[ii].vertices[:]) == 3:
-                        fw("%d %d %d 0 0 0\n" % tuple(obj_data.polygons[ii].vertices[:]))
-                    else:
-                        fw("%d %d %d %d 0 0 0\n" % tuple(obj_data.polygons[ii].vertices[:]))
-                file.close
+        if not blendDeferred:
+            saveBlend()
 
-                objects.append(obj.name)
-
-        maxObjectFrequency = ([])
-        for ii in range(0, len(objects)):
-            if not objects[ii] == 'Reference' and not objects[ii] == 'User':
-                try:
-                    if maxObjectFrequency.count(int(objects[ii][1:len(objects[ii]):1])) == 0:
-                        maxObjectFrequency.append(int(objects[ii][1:len(objects[ii]):1]))
-                except:
-                    print('No maximum object frequency found.\nPlease change object names to L{maxobjfq}/R{maxobjfq} e.g. L20000 or R20000.')
-        maxObjectFrequency.sort()
-
-        bpy.ops.wm.save_as_mainfile(filepath=("%s/3d Model.blend" % filepath1), check_existing=False, filter_blender=True, filter_image=False, filter_movie=False, filter_python=False, filter_font=False, filter_sound=False, filter_text=False, filter_btx=False, filter_collada=False, filter_folder=True, filemode=8, compress=False, relative_remap=True, copy=False)
-
-# ------------------------ Write evaluation grid data --------------------------
+# ------------------------ Collect evaluation grid data ------------------------
+        nearFieldGrid = None
         if nearFieldCalculation:
-            radius = 0.0
-            for ii in range(len(obj_data.vertices[:])):
-                tmp = math.sqrt(math.pow(obj_data.vertices[ii].co[0], 2)+math.pow(obj_data.vertices[ii].co[1], 2)+math.pow(obj_data.vertices[ii].co[2], 2))
-                if tmp > radius:
-                    radius = tmp
-            # bpy.ops.mesh.primitive_ico_sphere_add(subdivisions=5, size=radius+5, location=(0,0,0), rotation=(0, 0, 0))
-            bpy.context.scene.cursor_location = (0.0, 0.0, 0.0)
-            bpy.ops.mesh.primitive_hyper_add(orderN=46, size=(radius*unitFactor)+0.005)
-            NFGrid = bpy.context.active_object
-            NFGrid.name = 'NFGrid'
-            NFGrid_data = NFGrid.data
-            temp = ("%s/EvaluationGrids/NF_Sphere" % (filepath1))
-            if not os.path.exists(temp):
-                os.mkdir(temp)
-
-            file = open(("%s/EvaluationGrids/NF_Sphere/Nodes.txt" % (filepath1)), "w", encoding="utf8", newline="\n")
-            fw = file.write
-            fw("%i\n" % len(NFGrid_data.vertices[:]))
-            for ii in range(len(NFGrid_data.vertices[:])):
-                fw("%i " % (ii+200000))
-                fw("%.6f %.6f %.6f\n" % (NFGrid_data.vertices[ii].co[0]*unitFactor, NFGrid_data.vertices[ii].co[1]*unitFactor, NFGrid_data.vertices[ii].co[2]*unitFactor))
-            file.close
-
-            file = open(("%s/EvaluationGrids/NF_Sphere/Elements.txt" % (filepath1)), "w", encoding="utf8", newline="\n")
-            fw = file.write
-            fw("%i\n" % len(NFGrid_data.polygons[:]))
-            for ii in range(len(NFGrid_data.polygons[:])):
-                fw("%i " % (ii+200000))
-                fw("%d %d %d" % (NFGrid_data.polygons[ii].vertices[0]+200000, NFGrid_data.polygons[ii].vertices[1]+200000, NFGrid_data.polygons[ii].vertices[2]+200000))
-                fw(" 2 0 1\n")
-            file.close
-
-        else:
-            if not evaluationGrid1 == 'None':
-                if not evaluationGrid1 == 'User':
-                    temp = ("%s/EvaluationGrids/%s" % (filepath1, evaluationGrid1))
-                    if not os.path.exists(temp):
-                        os.mkdir(temp)
-
-                    shutil.copyfile(("%s/%s/Nodes.txt" % (evaluationGridPath, evaluationGrid1)), ("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid1)))
-                    shutil.copyfile(("%s/%s/Elements.txt" % (evaluationGridPath, evaluationGrid1)), ("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid1)))
-                else:
-                    obj = bpy.data.objects['User']
-                    if obj.type == 'MESH':
-                        bpy.context.scene.objects.active = obj
-                        bpy.ops.object.transform_apply(location=True)
-                        bpy.ops.object.transform_apply(rotation=True)
-                        bpy.ops.object.transform_apply(scale=True)
-                        obj = context.active_object
-                        obj.hide_render = False
-                        obj_data = obj.data
-
-                        temp = ("%s/EvaluationGrids/User/" % filepath1)
-                        if not os.path.exists(temp):
-                            os.mkdir(temp)
-
-                        file = open(("%s/EvaluationGrids/User/Nodes.txt" % filepath1), "w", encoding="utf8", newline="\n")
-                        fw = file.write
-                        fw("%i\n" % len(obj_data.vertices[:]))
-                        for ii in range(len(obj_data.vertices[:])):
-                            fw("%i " % (ii+350000))
-                            fw("%.6f %.6f %.6f\n" % (obj_data.vertices[ii].co[0]*unitFactor, obj_data.vertices[ii].co[1]*unitFactor, obj_data.vertices[ii].co[2]*unitFactor))
-                        file.close
-
-                        file = open(("%s/EvaluationGrids/User/Elements.txt" % filepath1), "w", encoding="utf8", newline="\n")
-                        fw = file.write
-                        fw("%i\n" % len(obj_data.polygons[:]))
-                        if len(obj_data.polygons[0].vertices[:]) == 3:
-                            for ii in range(len(obj_data.polygons[:])):
-                                fw("%i " % (ii+350000))
-                                fw("%d %d %d 2 0 1\n" % (obj_data.polygons[ii].vertices[0]+350000, obj_data.polygons[ii].vertices[1]+350000, obj_data.polygons[ii].vertices[2]+350000))
-                        else:
-                            for ii in range(len(obj_data.polygons[:])):
-                                fw("%i " % (ii+350000))
-                                fw("%d %d %d %d 2 0 1\n" % (obj_data.polygons[ii].vertices[0]+350000, obj_data.polygons[ii].vertices[1]+350000, obj_data.polygons[ii].vertices[2]+350000, obj_data.polygons[ii].vertices[3]+350000))
-                        file.close
-
-            if not evaluationGrid2 == 'None':
-                temp = ("%s/EvaluationGrids/%s" % (filepath1, evaluationGrid2))
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
-
-                shutil.copyfile(("%s/%s/Nodes.txt" % (evaluationGridPath, evaluationGrid2)), ("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid2)))
-                shutil.copyfile(("%s/%s/Elements.txt" % (evaluationGridPath, evaluationGrid2)), ("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid2)))
-
-            if not evaluationGrid3 == 'None':
-                temp = ("%s/EvaluationGrids/%s" % (filepath1, evaluationGrid3))
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
-
-                shutil.copyfile(("%s/%s/Nodes.txt" % (evaluationGridPath, evaluationGrid3)), ("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid3)))
-                shutil.copyfile(("%s/%s/Elements.txt" % (evaluationGridPath, evaluationGrid3)), ("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid3)))
-
-            if not evaluationGrid4 == 'None':
-                temp = ("%s/EvaluationGrids/%s" % (filepath1, evaluationGrid4))
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
-
-                shutil.copyfile(("%s/%s/Nodes.txt" % (evaluationGridPath, evaluationGrid4)), ("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid4)))
-                shutil.copyfile(("%s/%s/Elements.txt" % (evaluationGridPath, evaluationGrid4)), ("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid4)))
-
-            if not evaluationGrid5 == 'None':
-                temp = ("%s/EvaluationGrids/%s" % (filepath1, evaluationGrid5))
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
-
-                shutil.copyfile(("%s/%s/Nodes.txt" % (evaluationGridPath, evaluationGrid5)), ("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid5)))
-                shutil.copyfile(("%s/%s/Elements.txt" % (evaluationGridPath, evaluationGrid5)), ("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid5)))
-
-# ------------------------ Calculate frequency information ---------------------
-        frequencySteps = divmod(maxFrequency-lowFrequency, frequencyStepSize)
-        if not frequencySteps[1] == 0:
-            raise Exception("Error, frequencyStepSize is not a divisor of maxFrequency-lowFrequency")
-
-        numCoresAvailable = (cpuLast-cpuFirst+1-lowFrequencyCores)*numCoresPerCPU
-        numCoresUsedPerEar = int((cpuLast-cpuFirst+1-lowFrequencyCores*numEars)*numCoresPerCPU/numEars)
-        frequencyStepsPerCore = divmod(frequencySteps[0], numCoresUsedPerEar)
-
-        cpusAndCores = ([])
-        tmp = ([])
-        for core in range(1, 9):
-            tmp.append(0)
-        for cpu in range(1, 11):
-            cpusAndCores.append(tmp[:])
-
-        frequencies = ([])
-        tmp = ([])
-        for core in range(1, 9):
-            tmp.append([])
-        for cpu in range(1, 11):
-            frequencies.append(tmp[:])
-
-        if not frequencyDependency:
-            coresteps = 0
-            for tmpEar in range(1, numEars+1):
-                count = 0
-                for core in range(1, numCoresPerCPU+1):
-                    if tmpEar == 2 and numCPUs == 1:
-                        core += numCoresUsedPerEar
-                    for cpu in range(cpuFirst+(int(numCPUs/2)*(tmpEar-1))*(numEars-1), cpuLast-(int(numCPUs/2)*(-(tmpEar-2)))*(numEars-1)+1):
-                        tmp = ([])
-                        if lowFrequencyCores > 0 and cpu == cpuFirst+(int(numCPUs/2)*(tmpEar-1))*(numEars-1):
-                            if core < 3:
-                                for ii in range(1, 6):
-                                    tmp.append(frequencyStepSize*ii+lowFrequency/2*(core-1))
-                        else:
-                            count = count + 1
-                            for ii in range(0, frequencyStepsPerCore[0]+1):
-                                if ((frequencyStepSize*count+frequencyStepSize*numCoresUsedPerEar*ii)+lowFrequency) <= maxFrequency:
-                                    tmp.append((frequencyStepSize*count+frequencyStepSize*numCoresUsedPerEar*ii)+lowFrequency)
-                                else:
-                                    break
-                        frequencies[cpu-1][core-1] = tmp
-                        if not frequencies[cpu-1][core-1] == ([]):
-							#case: both ears on one cpu
-                            if numCPUs == 1 and numEars == 2:
-                                if numCoresPerCPU < 4:
-                                    raise Exception('Please use at least 4 cores for calculation of 2 ears')
-                                for temp_ear in range(0, numCoresUsedPerEar):
-                                    if int((temp_ear+coresteps)/2) >= numCoresUsedPerEar:
-                                        break
-                                    else:
-                                        cpusAndCores[cpu-1][temp_ear+coresteps] = tmpEar
-                                coresteps += 1
-
-                            else:
-                                #general case
-                                cpusAndCores[cpu-1][core-1] = tmpEar
-
-                        if count == numCoresUsedPerEar:
-                            break
-                    if count == numCoresUsedPerEar:
-                        break
-        else:
-            for tmpEar in range(1, numEars+1):
-                countFreq = 0
-                countCores = 0
-                for core in range(1, numCoresPerCPU+1):
-                    for cpu in range(cpuFirst+(int(numCPUs/2)*(tmpEar-1))*(numEars-1), cpuLast-(int(numCPUs/2)*(-(tmpEar-2)))*(numEars-1)+1):
-                        countCores = countCores+1
-                        tmp = ([])
-                        if countCores <= frequencyStepsPerCore[1]:
-                            tmpNumFrequencies = frequencyStepsPerCore[0]+1
-                        else:
-                            tmpNumFrequencies = frequencyStepsPerCore[0]
-                        for ii in range(0, tmpNumFrequencies):
-                            if (frequencyStepSize*countFreq) <= maxFrequency:
-                                countFreq = countFreq + 1
-                                tmp.append(frequencyStepSize*countFreq)
-                            else:
-                                break
-                        frequencies[cpu-1][core-1] = tmp
-                        cpusAndCores[cpu-1][core-1] = tmpEar
-
-# ----------------------- Write general information ----------------------------
-        file = open(("%s/Info.txt" % filepath1), "w", encoding="utf8", newline="\n")
-        fw = file.write
-        fw("#####################################\n")
-        fw("######## General information ########\n")
-        fw("#####################################\n\n")
-        fw("Program: Mesh2HRTF\n")
-        fw("Title: %s\n" % title)
-        fw("Ear: %s\n" % ear)
-        fw("Evaluation Grids:\n")
-        fw("    %s\n" % evaluationGrid1)
-        fw("    %s\n" % evaluationGrid2)
-        fw("    %s\n" % evaluationGrid3)
-        fw("    %s\n" % evaluationGrid4)
-        fw("    %s\n\n" % evaluationGrid5)
-        fw("#####################################\n")
-        fw("####### Frequency information #######\n")
-        fw("#####################################\n\n")
-        fw("Highest evaluated Frequency: %d\n" % maxFrequency)
-        fw("Frequency Stepsize: %d\n" % frequencyStepSize)
-        fw("Frequency Steps: %d\n" % frequencySteps[0])
-        fw("Frequency steps per Core: %d\n\n" % frequencyStepsPerCore[0])
-        fw("#####################################\n")
-        fw("######## Cluster information ########\n")
-        fw("#####################################\n\n")
-        fw("Number of CPUs: %d\n" % (cpuLast-cpuFirst+1))
-        fw("First CPU: 'CPU_%d'\n" % cpuFirst)
-        fw("Last CPU: 'CPU_%d'\n" % cpuLast)
-        fw("Number of Cores (available): %d\n" % numCoresAvailable)
-        for core in range(1, 9):
-            for cpu in range(1, 11):
-                fw("CPU_%d (Core %d):\n" % (cpu, core))
-                for ii in range(0, len(frequencies[cpu-1][core-1])):
-                    fw("    %d\n" % frequencies[cpu-1][core-1][ii])
-            fw("\n")
-        file.close
-
-# ----------------------- Write Output2HRTF.m function -------------------------
-        file = open(("%s/Output2HRTF.m" % filepath1), "w", encoding="utf8", newline="\n")
-        fw = file.write
-        fw("close all\n")
-        fw("clear\n")
-        fw("\n")
-
-        fw("cpusAndCores=[")
-        for cpu in range(1, 11):
-            for core in range(1, 9):
-                fw("%i" % cpusAndCores[cpu-1][core-1])
-                if core < 8:
-                    fw(" ")
-            if cpu < 10:
-                fw("; ...\n")
-        fw("];\n")
-        fw("\n")
-
-        fw("objectMeshes={")
-        for cpu in range(1, 11):
-            for core in range(1, 9):
-                if not cpusAndCores[cpu-1][core-1] == 0:
-                    if frequencyDependency:
-                        if cpusAndCores[cpu-1][core-1] == 1:
-                            tmpEar = "L"
-                        if cpusAndCores[cpu-1][core-1] == 2:
-                            tmpEar = "R"
-                        tmpfmax = max(frequencies[cpu-1][core-1])
-                        tmpfdiff = 24000
-                        for ff in maxObjectFrequency:
-                            if (ff-tmpfmax) >= 0 and (ff-tmpfmax) < tmpfdiff:
-                                obj_name = ("%s%i" % (tmpEar, ff))
-                                tmpfdiff = ff-tmpfmax
-                    else:
-                        obj_name = "Reference"
-                else:
-                    obj_name = ""
-                fw("'%s'" % obj_name)
-                if core < 8:
-                    fw(" ")
-            if cpu < 10:
-                fw("; ...\n")
-        fw("};\n")
-        fw("\n")
-
-        fw("reciprocity=")
-        if reciprocity:
-            fw("1")
-        else:
-            fw("0")
-        fw(";\n")
-        fw("\n")
-
-        # add information about the reciever/point source
-        if reciprocity:
-
-            # get the receiver/ear centers and areas
-            obj                = bpy.data.objects['Reference']
-            obj_data           = obj.data
-            earCenter, earArea = calculateReceiverProperties(obj,obj_data,unitFactor)
-
-            # write left ear data
-            if ear=='Left ear' or ear=='Both ears':
-                fw("% left ear / receiver\n")
-                fw("receiverCenter(1,1:3)=[%f %f %f];\n" % (earCenter[0][0], earCenter[0][1], earCenter[0][2]))
-                fw("receiverArea(1,1)    =%g;\n" % earArea[0])
-
-            # write right ear data
-            if ear=='Right ear' or ear=='Both ears':
-                if ear=='Right ear':
-                    nn = 1
-                if ear=='Both ears':
-                    nn = 2
-
-                fw("% right ear / receiver\n")
-                fw("receiverCenter(%d,1:3) = [%f %f %f];\n" %(nn, earCenter[1][0], earCenter[1][1], earCenter[1][2]))
-                fw("receiverArea(%d,1)     = %g;\n" %(nn, earArea[1]))
-
-            fw("\n")
-        else:
-
-            fw("% point source / receiver\n")
-            fw("receiverCenter(1,1:3) = [%s %s %s];\n" % (sourceXPosition, sourceYPosition, sourceZPosition))
-            fw("receiverArea(1,1)     = 1;\n")
-
-        fw("frequencyDependency=")
-        if frequencyDependency:
-            fw("1")
-        else:
-            fw("0")
-        fw(";\n")
-        fw("\n")
-
-        fw("nearFieldCalculation=")
-        if nearFieldCalculation:
-            fw("1")
-        else:
-            fw("0")
-        fw(";\n")
-        fw("\n")
-
-        fw("% Reference to a point source in the origin\n")
-        fw("% accoring to the classical HRTF definition\n")
-        fw("reference    = false;\n")
-        fw("speedOfSound = " + speedOfSound + "; % [m/s]\n")
-        fw("densityOfAir = " + densityOfMedium + "; % [kg/m^3]\n\n")
-
-        fw("Output2HRTF_Main(cpusAndCores,objectMeshes,reciprocity,receiverCenter,frequencyDependency,nearFieldCalculation,receiverArea,reference,speedOfSound,densityOfAir);")
-        file.close
+            # hyperinterpolation sphere (N=46) 5 mm around the Reference mesh, generated once per radius in the grid cache
+            reference = [mesh.vertices for mesh in objectMeshes if mesh.name == 'Reference'] or [mesh.vertices for mesh in objectMeshes]
+            radii = [mesh2hrtf.nearFieldRadius(np.concatenate(reference), unitFactor)]
+            radii.extend(float(radius)*unitFactor for radius in nearFieldRadii.split(",") if radius.strip())
+            nearFieldGrid = [mesh2hrtf.nearFieldSphere(radius, offset=mesh2hrtf.nearFieldOffset(ii), cachePath=gridCachePath)
+                             for ii, radius in enumerate(radii)]
+
+        evaluationGrids = ([])
+        for grid in [evaluationGrid1, evaluationGrid2, evaluationGrid3, evaluationGrid4, evaluationGrid5]:
+            if grid == 'User' and not nearFieldCalculation:
+                obj = bpy.data.objects['User']
+                bpy.context.scene.objects.active = obj
+                bpy.ops.object.transform_apply(location=True)
+                bpy.ops.object.transform_apply(rotation=True)
+                bpy.ops.object.transform_apply(scale=True)
+                obj = context.active_object
+                obj.hide_render = False
+                grid = evaluationGrid(mesh2hrtf, 'User', obj, 350000)
+            evaluationGrids.append(grid)
+
+# ------------------------ Write project files ---------------------------------
+        mesh2hrtf.writeProject(filepath1, objectMeshes,
+                               evaluationGrids=evaluationGrids,
+                               nearFieldGrid=nearFieldGrid,
+                               title=title,
+                               frequencyStepSize=frequencyStepSize,
+                               maxFrequency=maxFrequency,
+                               cpuFirst=cpuFirst,
+                               cpuLast=cpuLast,
+                               numCoresPerCPU=numCoresPerCPU,
+                               ear=ear,
+                               gridDeployment=gridDeployment,
+                               gridCachePath=gridCachePath,
+                               method=method,
+                               frequencyDistribution=frequencyDistribution,
+                               memoryBudget=memoryBudget*1024**3,
+                               memoryPolicy=memoryPolicy,
+                               solveCachePath=solveCachePath,
+                               reciprocity=reciprocity,
+                               sourceXPosition=sourceXPosition,
+                               sourceYPosition=sourceYPosition,
+                               sourceZPosition=sourceZPosition,
+                               speedOfSound=speedOfSound,
+                               densityOfMedium=densityOfMedium,
+                               unit=unit,
+                               frequencyDependency=frequencyDependency,
+                               meshGrading=meshGrading,
+                               elementsPerWavelength=elementsPerWavelength,
+                               resolutionPolicy=resolutionPolicy,
+                               programPath=programPath)
+        if blendDeferred:
+            saveBlend()
 
 # ----------------------- Render pictures of the model -------------------------
+        # the views are in mesh2hrtf.Mesh2Input.pictures, rendered by renderPictures.py
         if pictures:
-            for ii in range(0, len(renderloc)):
-                cam.location = (renderloc[ii][0]*camradius, renderloc[ii][1]*camradius, renderloc[ii][2]*camradius)
-                cam.rotation_euler = (renderrot[ii][0], renderrot[ii][1], renderrot[ii][2])
-                lamp.location = (renderloc[ii][0]*lampradius, renderloc[ii][1]*lampradius, renderloc[ii][2]*lampradius)
-                bpy.ops.render.render()
-                temp = ("%s/Pictures/" % filepath1)
-                if not os.path.exists(temp):
-                    os.mkdir(temp)
-                temp = ("%d-%d" % (rendernam[ii][0], rendernam[ii][1]))
-                bpy.data.images['Render Result'].save_render("%s/Pictures/%s.png" % (filepath1, temp))
-
-# ----------------------- Write NumCalc input files for all CPUs and Cores -----
-        for core in range(1, 9):
-            for cpu in range(1, 11):
-                if not cpusAndCores[cpu-1][core-1] == 0:
-
-                    filepath2 = ("%s/NumCalc/CPU_%i_Core_%i/" % (filepath1, cpu, core))
-                    if not os.path.exists(filepath2):
-                        os.mkdir(filepath2)
-
-                    file = open(("%s%s" % (filepath2, filename1)), "w", encoding="utf8", newline="\n")
-                    fw = file.write
-
-                    if frequencyDependency:
-                        if cpusAndCores[cpu-1][core-1] == 1:
-                            tmpEar = "L"
-                        if cpusAndCores[cpu-1][core-1] == 2:
-                            tmpEar = "R"
-                        tmpfmax = max(frequencies[cpu-1][core-1])
-                        tmpfdiff = 24000
-                        for ff in maxObjectFrequency:
-                            if (ff-tmpfmax) >= 0 and (ff-tmpfmax) < tmpfdiff:
-                                obj_name = ("%s%i" % (tmpEar, ff))
-                                tmpfdiff = ff-tmpfmax
-                    else:
-                        obj_name = "Reference"
-
-                    obj = bpy.data.objects[obj_name]
-                    obj_data = obj.data
-
-                    fw("##-------------------------------------------\n")
-                    fw("## This file was created by export_mesh2hrtf\n")
-                    fw("## Date: %s\n" % datetime.date.today())
-                    fw("##-------------------------------------------\n")
-                    fw("Mesh2HRTF %s\n" % version)
-                    fw("##\n")
-                    fw("%s\n" % title)
-                    fw("##\n")
-                    fw("## Controlparameter I\n")
-                    fw("0 0 0 0 7 0\n")
-                    fw("##\n")
-                    fw("## Controlparameter II\n")
-                    fw("1 %d %fe+00 0.00e+00 1 0 0\n" % (len(frequencies[cpu-1][core-1]), 1/(len(frequencies[cpu-1][core-1]))))
-                    fw("##\n")
-                    fw("## Load Frequency Curve \n")
-                    fw("0 %d\n" % (len(frequencies[cpu-1][core-1])+1))
-                    fw("0.000000e+00 0.000000e+00 0.0\n")
-                    for ii in range(0, len(frequencies[cpu-1][core-1])):
-                        fw("%fe+00 %fe+04 0.0\n" % (1/(len(frequencies[cpu-1][core-1]))*(ii+1), frequencies[cpu-1][core-1][ii]/10000))
-                    fw("##\n")
-                    fw("## 1. Main Parameters I\n")
-                    numNodes = 0
-                    if nearFieldCalculation:
-                        numNodes = numNodes+len(NFGrid_data.vertices[:])
-                    else:
-                        if not evaluationGrid1 == 'None':
-                            nodes = open("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid1))
-                            line = nodes.readline()
-                            numNodes = numNodes+int(line)
-                        if not evaluationGrid2 == 'None':
-                            nodes = open("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid2))
-                            line = nodes.readline()
-                            numNodes = numNodes+int(line)
-                        if not evaluationGrid3 == 'None':
-                            nodes = open("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid3))
-                            line = nodes.readline()
-                            numNodes = numNodes+int(line)
-                        if not evaluationGrid4 == 'None':
-                            nodes = open("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid4))
-                            line = nodes.readline()
-                            numNodes = numNodes+int(line)
-                        if not evaluationGrid5 == 'None':
-                            nodes = open("%s/EvaluationGrids/%s/Nodes.txt" % (filepath1, evaluationGrid5))
-                            line = nodes.readline()
-                            numNodes = numNodes+int(line)
-                    numElements = 0
-                    if nearFieldCalculation:
-                        numElements = numElements+len(NFGrid_data.polygons[:])
-                    else:
-                        if not evaluationGrid1 == 'None':
-                            elements = open("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid1))
-                            line = elements.readline()
-                            numElements = numElements+int(line)
-                        if not evaluationGrid2 == 'None':
-                            elements = open("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid2))
-                            line = elements.readline()
-                            numElements = numElements+int(line)
-                        if not evaluationGrid3 == 'None':
-                            elements = open("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid3))
-                            line = elements.readline()
-                            numElements = numElements+int(line)
-                        if not evaluationGrid4 == 'None':
-                            elements = open("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid4))
-                            line = elements.readline()
-                            numElements = numElements+int(line)
-                        if not evaluationGrid5 == 'None':
-                            elements = open("%s/EvaluationGrids/%s/Elements.txt" % (filepath1, evaluationGrid5))
-                            line = elements.readline()
-                            numElements = numElements+int(line)
-                    fw("2 %d " % (len(obj_data.polygons[:])+numElements))
-                    fw("%d 0 " % (len(obj_data.vertices[:])+numNodes))
-                    fw("0")
-                    fw(" 2 1 %s 0\n" % (method))
-                    fw("##\n")
-                    fw("## 2. Main Parameters II\n")
-                    fw("0 ")
-                    if reciprocity:
-                        fw("0 ")
-                    else:
-                        fw("1 ")
-                    fw("0 0.0000e+00 0 0 0\n")
-                    fw("##\n")
-                    fw("## 3. Main Parameters III\n")
-                    fw("0 0 0 0\n")
-                    fw("##\n")
-                    fw("## 4. Main Parameters IV\n")
-                    fw("%s %se+00 1.0 0.0e+00 0.0 e+00 0.0e+00 0.0e+00\n" % (speedOfSound, densityOfMedium))
-                    fw("##\n")
-                    fw("NODES\n")
-                    if not frequencyDependency:
-                        fw("../../ObjectMeshes/Reference/Nodes.txt\n")
-                    else:
-                        fw("../../ObjectMeshes/%s/Nodes.txt\n" % obj_name)
-                    if nearFieldCalculation:
-                        fw("../../EvaluationGrids/NF_Sphere/Nodes.txt\n")
-                    else:
-                        # alphabetically sorted list of used evaluation grids
-                        evaluationGrids = []
-                        if not evaluationGrid1 == 'None':
-                            evaluationGrids.append(evaluationGrid1)
-                        if not evaluationGrid2 == 'None':
-                            evaluationGrids.append(evaluationGrid2)
-                        if not evaluationGrid3 == 'None':
-                            evaluationGrids.append(evaluationGrid3)
-                        if not evaluationGrid4 == 'None':
-                            evaluationGrids.append(evaluationGrid4)
-                        if not evaluationGrid5 == 'None':
-                            evaluationGrids.append(evaluationGrid5)
-                        evaluationGrids.sort()
-
-                        # write file path of nodes to input file
-                        for grid in evaluationGrids:
-                            fw("../../EvaluationGrids/%s/Nodes.txt\n" % grid)
-                    fw("##\n")
-                    fw("ELEMENTS\n")
-                    if not frequencyDependency:
-                        fw("../../ObjectMeshes/Reference/Elements.txt\n")
-                    else:
-                        fw("../../ObjectMeshes/%s/Elements.txt\n" % obj_name)
-                    if nearFieldCalculation:
-                        fw("../../EvaluationGrids/NF_Sphere/Elements.txt\n")
-                    else:
-                        # write file path of elements to input file
-                        for grid in evaluationGrids:
-                            fw("../../EvaluationGrids/%s/Elements.txt\n" % grid)
-                    fw("##\n")
-                    fw("# SYMMETRY\n")
-                    fw("# 0 0 0\n")
-                    fw("# 0.0000e+00 0.0000e+00 0.0000e+00\n")
-                    fw("##\n")
-                    if reciprocity:
-                        if cpusAndCores[cpu-1][core-1]==1 and ear!='Right ear':
-                            tmpEar='Left ear'
-                        else:
-                            tmpEar='Right ear'
-
-                        fw("BOUNDARY\n")
-                        for ii in range(len(obj_data.polygons[:])):
-                            if obj.material_slots[obj_data.polygons[ii].material_index].name == obj.material_slots[tmpEar].name:
-                                fw("ELEM %i TO %i VELO 0.1 IMAG 0.0\n" % (ii, ii))
-                        fw("RETU\n")
-                    else:
-                        fw("BOUNDARY\n")
-                        fw("# ELEM 0 TO 0 VELO 0.1 IMAG 0.0\n")
-                        fw("RETU\n")
-                    fw("##\n")
-                    fw("# PLANE WAVES\n")
-                    fw("# 0 0.0000e+00 -1.0000e+00 0.0000e+00 1.0000e-6 -1 0.0000e+00 -1\n")
-                    fw("##\n")
-                    if reciprocity:
-                        fw("# POINT SOURCES\n")
-                        if cpusAndCores[cpu-1][core-1] == 1:
-                            fw("# 0 0.0 0.101 0.0 0.1 -1 0.0 -1\n")
-                        if cpusAndCores[cpu-1][core-1] == 2:
-                            fw("# 0 0.0 -0.101 0.0 0.1 -1 0.0 -1\n")
-                    else:
-                        fw("POINT SOURCES\n")
-                        fw("0 %s %s %s 0.1 -1 0.0 -1\n" % (sourceXPosition, sourceYPosition, sourceZPosition))
-                    fw("##\n")
-                    fw("# CURVES\n")
-                    fw("# Frequency Factor 0.0\n")
-                    fw("##\n")
-                    fw("POST PROCESS\n")
-                    fw("##\n")
-                    fw("END\n")
-                    file.close()
+            key = mesh2hrtf.pictureKey(objectMeshes, pictureResolution)
+            picturePath = mesh2hrtf.cachedPictures(key)
+            if picturePath is not None:
+                mesh2hrtf.deployPictures(picturePath, filepath1, gridDeployment)
+            elif pictureMode == 'BACKGROUND':
+                if blendSnapshot in ('FULL', 'COMPRESSED'):
+                    blendFile, temporary = "%s/3d Model.blend" % filepath1, False
+                else:
+                    # the job needs the whole scene: compressed copy on the local disk, removed by the job
+                    blendFile, temporary = os.path.join(tempfile.mkdtemp(prefix="mesh2hrtf"), "3d Model.blend"), True
+                    bpy.ops.wm.save_as_mainfile(filepath=blendFile, check_existing=False, compress=True, copy=True)
+                mesh2hrtf.startRenderJob(bpy.app.binary_path, blendFile, filepath1, key, pictureResolution,
+                                         deployment=gridDeployment, temporaryBlendFile=temporary)
+            else:
+                spec = importlib.util.spec_from_file_location("renderPictures", os.path.join(os.path.dirname(mesh2hrtf.Mesh2Input.__file__), "renderPictures.py"))
+                renderPictures = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(renderPictures)
+                picturePath = renderPictures.renderPictures(os.path.join(mesh2hrtf.Mesh2Input.pictures.defaultPictureCachePath(), key),
+                                                            pictureResolution, camradius, lampradius)
+                mesh2hrtf.deployPictures(picturePath, filepath1, gridDeployment)
 
         for obj in bpy.context.scene.objects[:]:
             bpy.data.objects[obj.name].select = False
-        if nearFieldCalculation:
-            bpy.data.objects['NFGrid'].select = True
-            bpy.ops.object.delete()
 
         return {'FINISHED'}
 
 
+def saveBlendSnapshot(filepath, snapshot, meshObjects):
+    '''Save the scene ('FULL', 'COMPRESSED') or only meshObjects ('MESHES') as .blend file'''
+    if snapshot == 'MESHES':
+        bpy.data.libraries.write(filepath, set(meshObjects), compress=True)
+        return
+    bpy.ops.wm.save_as_mainfile(filepath=filepath, check_existing=False, filter_blender=True, filter_image=False, filter_movie=False, filter_python=False, filter_font=False, filter_sound=False, filter_text=False, filter_btx=False, filter_collada=False, filter_folder=True, filemode=8, compress=snapshot == 'COMPRESSED', relative_remap=True, copy=False)
+
+
 # ----------------------- Blender add-on registration --------------------------
 def menu_func_export(self, context):
     self.layout.operator(ExportMesh2HRTF.bl_idname, text="Mesh2HRTF")
@@ -0,0 +1,988 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+
+'''Export of Mesh2HRTF projects from NumPy arrays (no Blender required)
+
+writeProject() writes the complete project tree (ObjectMeshes,
+EvaluationGrids, NumCalc/CPU_*_Core_*/NC.inp, Info.txt and Output2HRTF.m)
+from object meshes given as arrays. The Blender add-on
+Mesh2Input/exportMesh2HRTF.py is a thin adapter around it.
+'''
+
+import os
+import re
+import shutil
+import bisect
+import datetime
+import numpy as np
+
+from .meshFiles import flattenFaces, writeNodes, writeElements, readMeshHeader, polygonAreas, elementRanges
+from .evaluationGrids import EvaluationGrid, deployEvaluationGrid
+from .exportManifest import ExportManifest, contentKey, meshKey
+from .frequencyScheduling import scheduleLongestFirst
+from .meshGrading import gradeMeshes, gradedMeshes, gradingFrequencies
+from .meshResolution import MeshResolution, reportFrequencies
+from ..NumCalc.resourceEstimator import ResourceEstimator
+from ..NumCalc.workQueue import WorkQueue
+from ..NumCalc.solveCache import SolveCache
+from ..NumCalc.numCalcLogs import renumberStep
+
+
+class ObjectMesh:
+    '''Boundary element mesh of the object (e.g. 'Reference', 'L20000')
+
+    vertices are given in the unit of the export. materials holds the
+    material index of each face and materialNames the name of each material
+    slot, from which the 'Left ear' and 'Right ear' elements are taken.
+    '''
+
+    def __init__(self, name, vertices, faces, faceSizes=None, materials=None, materialNames=()):
+        self.name = name
+        self.vertices = np.asarray(vertices, dtype=np.float64)
+        self.polygonVertices, self.polygonSizes = flattenFaces(faces, faceSizes)
+        if materials is None:
+            materials = np.zeros(len(self.polygonSizes), dtype=np.int64)
+        self.materials = np.asarray(materials, dtype=np.int64)
+        self.materialNames = list(materialNames)
+
+    @property
+    def numNodes(self):
+        return len(self.vertices)
+
+    @property
+    def numElements(self):
+        return len(self.polygonSizes)
+
+    def earElements(self):
+        '''Return the indices of the elements with the 'Left ear' and 'Right ear' materials'''
+        earElements = {}
+        for earName in ['Left ear', 'Right ear']:
+            earSlots = [ii for ii, name in enumerate(self.materialNames) if name == earName]
+            earElements[earName] = np.nonzero(np.isin(self.materials, earSlots))[0]
+        return earElements
+
+    def write(self, targetPath, unitFactor=1):
+        writeNodes(os.path.join(targetPath, "Nodes.txt"), self.vertices*unitFactor)
+        writeElements(os.path.join(targetPath, "Elements.txt"), self.polygonVertices, self.polygonSizes)
+
+
+# for calculating the center and area of the receivers in reciprocal mode
+def calculateReceiverProperties(objectMesh, unitFactor):
+    '''Return the bounding box centers and areas of the left and right ear elements'''
+    vertices = objectMesh.vertices*unitFactor
+    polygonVertices = objectMesh.polygonVertices
+    polygonSizes = objectMesh.polygonSizes
+    earElements = objectMesh.earElements()
+
+    earCenter = [[0., 0., 0.], [0., 0., 0.]]
+    earArea = [0., 0.]
+    for ear, earName in enumerate(['Left ear', 'Right ear']):
+        if not len(earElements[earName]):
+            continue
+        isEar = np.zeros(len(polygonSizes), dtype=bool)
+        isEar[earElements[earName]] = True
+
+        # estimate the center from min and max x,y,z-values of all ear corners
+        earPolygonVertices = polygonVertices[np.repeat(isEar, polygonSizes)]
+        earCorners = vertices[earPolygonVertices]
+        earCenter[ear] = ((earCorners.min(axis=0)+earCorners.max(axis=0))/2).tolist()
+
+        # sum the areas of the ear polygons
+        earArea[ear] = float(polygonAreas(vertices, earPolygonVertices, polygonSizes[isEar]).sum())
+
+    return earCenter, earArea
+
+
+def renderFrequencyCurve(frequencies):
+    '''Return the Controlparameter II and Load Frequency Curve blocks of NC.inp for the frequencies of one core'''
+    numFrequencies = len(frequencies)
+    lines = []
+    fw = lines.append
+
+    fw("## Controlparameter II\n")
+    fw("1 %d %fe+00 0.00e+00 1 0 0\n" % (numFrequencies, 1/numFrequencies))
+    fw("##\n")
+    fw("## Load Frequency Curve \n")
+    fw("0 %d\n" % (numFrequencies+1))
+    fw("0.000000e+00 0.000000e+00 0.0\n")
+    for ii in range(0, numFrequencies):
+        fw("%fe+00 %fe+04 0.0\n" % (1/numFrequencies*(ii+1), frequencies[ii]/10000))
+    return "".join(lines)
+
+
+class ExportPlan:
+    '''Data shared by all NumCalc input files of one export, computed once'''
+
+    def __init__(self, title, version, method, reciprocity, ear, speedOfSound,
+                 densityOfMedium, sourcePosition):
+        self.title = title
+        self.version = version
+        self.date = datetime.date.today()
+        self.method = method
+        self.reciprocity = reciprocity
+        self.ear = ear
+        self.speedOfSound = speedOfSound
+        self.densityOfMedium = densityOfMedium
+        self.sourcePosition = sourcePosition
+        # object name -> number of nodes/elements and ear element ranges
+        self.objectMeshes = {}
+        # evaluation grid name -> (number of nodes, number of elements)
+        self.evaluationGrids = {}
+
+    def addObjectMesh(self, name, numNodes, numElements, earElements):
+        earRanges = {}
+        for earName in earElements:
+            earRanges[earName] = elementRanges(np.sort(earElements[earName]))
+        self.objectMeshes[name] = {'numNodes': numNodes,
+                                   'numElements': numElements,
+                                   'earRanges': earRanges}
+
+    def addEvaluationGrid(self, name, numNodes, numElements):
+        self.evaluationGrids[name] = (numNodes, numElements)
+
+    def toDict(self):
+        '''Return the plan as a JSON-serializable dict (job description of a work queue)'''
+        data = dict(self.__dict__)
+        data['date'] = str(self.date)
+        return data
+
+    @classmethod
+    def fromDict(cls, data):
+        plan = cls.__new__(cls)
+        plan.__dict__.update(data)
+        plan.sourcePosition = tuple(plan.sourcePosition)
+        plan.evaluationGrids = dict((name, tuple(grid)) for name, grid in data['evaluationGrids'].items())
+        return plan
+
+    @property
+    def sortedEvaluationGrids(self):
+        '''alphabetically sorted list of used evaluation grids'''
+        return sorted(self.evaluationGrids)
+
+    @property
+    def numGridNodes(self):
+        return sum(grid[0] for grid in self.evaluationGrids.values())
+
+    @property
+    def numGridElements(self):
+        return sum(grid[1] for grid in self.evaluationGrids.values())
+
+    def radiatingEar(self, objectName, earSide):
+        '''Return the name of the ear material that radiates in reciprocal calculations
+
+        earSide is 1 (left) or 2 (right) as used in cpusAndCores. Raises an
+        exception if the object mesh has no elements of this ear.
+        '''
+        if earSide == 1 and self.ear != 'Right ear':
+            earName = 'Left ear'
+        else:
+            earName = 'Right ear'
+        if not self.objectMeshes[objectName]['earRanges'].get(earName):
+            raise Exception("Error, the object mesh %s has no elements with the material '%s' (required for the reciprocal calculation)" % (objectName, earName))
+        return earName
+
+    def renderNumCalcInput(self, objectName, earSide, frequencies):
+        '''Return the content of NC.inp for one core
+
+        earSide is 1 (left) or 2 (right) as used in cpusAndCores.
+        '''
+        objectMesh = self.objectMeshes[objectName]
+        lines = []
+        fw = lines.append
+
+        fw("##-------------------------------------------\n")
+        fw("## This file was created by export_mesh2hrtf\n")
+        fw("## Date: %s\n" % self.date)
+        fw("##-------------------------------------------\n")
+        fw("Mesh2HRTF %s\n" % self.version)
+        fw("##\n")
+        fw("%s\n" % self.title)
+        fw("##\n")
+        fw("## Controlparameter I\n")
+        fw("0 0 0 0 7 0\n")
+        fw("##\n")
+        fw(renderFrequencyCurve(frequencies))
+        fw("##\n")
+        fw("## 1. Main Parameters I\n")
+        fw("2 %d " % (objectMesh['numElements']+self.numGridElements))
+        fw("%d 0 " % (objectMesh['numNodes']+self.numGridNodes))
+        fw("0")
+        fw(" 2 1 %s 0\n" % (self.method))
+        fw("##\n")
+        fw("## 2. Main Parameters II\n")
+        fw("0 ")
+        if self.reciprocity:
+            fw("0 ")
+        else:
+            fw("1 ")
+        fw("0 0.0000e+00 0 0 0\n")
+        fw("##\n")
+        fw("## 3. Main Parameters III\n")
+        fw("0 0 0 0\n")
+        fw("##\n")
+        fw("## 4. Main Parameters IV\n")
+        fw("%s %se+00 1.0 0.0e+00 0.0 e+00 0.0e+00 0.0e+00\n" % (self.speedOfSound, self.densityOfMedium))
+        fw("##\n")
+        fw("NODES\n")
+        fw("../../ObjectMeshes/%s/Nodes.txt\n" % objectName)
+        for grid in self.sortedEvaluationGrids:
+            fw("../../EvaluationGrids/%s/Nodes.txt\n" % grid)
+        fw("##\n")
+        fw("ELEMENTS\n")
+        fw("../../ObjectMeshes/%s/Elements.txt\n" % objectName)
+        for grid in self.sortedEvaluationGrids:
+            fw("../../EvaluationGrids/%s/Elements.txt\n" % grid)
+        fw("##\n")
+        fw("# SYMMETRY\n")
+        fw("# 0 0 0\n")
+        fw("# 0.0000e+00 0.0000e+00 0.0000e+00\n")
+        fw("##\n")
+        if self.reciprocity:
+            tmpEar = self.radiatingEar(objectName, earSide)
+
+            fw("BOUNDARY\n")
+            for first, last in objectMesh['earRanges'][tmpEar]:
+                fw("ELEM %i TO %i VELO 0.1 IMAG 0.0\n" % (first, last))
+            fw("RETU\n")
+        else:
+            fw("BOUNDARY\n")
+            fw("# ELEM 0 TO 0 VELO 0.1 IMAG 0.0\n")
+            fw("RETU\n")
+        fw("##\n")
+        fw("# PLANE WAVES\n")
+        fw("# 0 0.0000e+00 -1.0000e+00 0.0000e+00 1.0000e-6 -1 0.0000e+00 -1\n")
+        fw("##\n")
+        if self.reciprocity:
+            fw("# POINT SOURCES\n")
+            if earSide == 1:
+                fw("# 0 0.0 0.101 0.0 0.1 -1 0.0 -1\n")
+            if earSide == 2:
+                fw("# 0 0.0 -0.101 0.0 0.1 -1 0.0 -1\n")
+        else:
+            fw("POINT SOURCES\n")
+            fw("0 %s %s %s 0.1 -1 0.0 -1\n" % tuple(self.sourcePosition))
+        fw("##\n")
+        fw("# CURVES\n")
+        fw("# Frequency Factor 0.0\n")
+        fw("##\n")
+        fw("POST PROCESS\n")
+        fw("##\n")
+        fw("END\n")
+        return "".join(lines)
+
+
+def earWorkers(cpuFirst, cpuLast, numCoresPerCPU, numEars):
+    '''Return the (cpu, core) workers of each ear
+
+    If the CPUs can be split evenly, the first ear gets the first half of
+    the CPUs, its workers ordered by core and CPU; otherwise the cores of all
+    CPUs are split into numEars contiguous parts of the same size and the
+    remaining cores are not used, so that all ears get the same layout.
+    '''
+    numCPUs = cpuLast-cpuFirst+1
+    if numCPUs*numCoresPerCPU < numEars:
+        raise Exception('Please use at least %d cores for calculation of %d ears' % (numEars, numEars))
+    if numCPUs % numEars == 0:
+        numCPUsPerEar = numCPUs//numEars
+        return [[(cpu, core) for core in range(1, numCoresPerCPU+1)
+                 for cpu in range(cpuFirst+ear*numCPUsPerEar, cpuFirst+(ear+1)*numCPUsPerEar)]
+                for ear in range(numEars)]
+    workers = [(cpu, core) for cpu in range(cpuFirst, cpuLast+1) for core in range(1, numCoresPerCPU+1)]
+    numWorkersPerEar = len(workers)//numEars
+    return [workers[ear*numWorkersPerEar:(ear+1)*numWorkersPerEar] for ear in range(numEars)]
+
+
+def contiguousBlocks(values, numBlocks):
+    '''Split values into numBlocks contiguous blocks whose sizes differ by at most one (larger first)'''
+    size = divmod(len(values), numBlocks)
+    blocks = []
+    start = 0
+    for ii in range(numBlocks):
+        blocks.append(values[start:start+size[0]+(ii < size[1])])
+        start += len(blocks[-1])
+    return blocks
+
+
+def bandBlocks(values, bandFrequencies, numBlocks):
+    '''Split the sorted values into numBlocks contiguous blocks within the bands up to bandFrequencies
+
+    Each non-empty band gets at least one block and the remaining blocks go
+    to the bands with the most values per block. If there are fewer blocks
+    than bands, the blocks span several bands.
+    '''
+    bands = []
+    lower = 0
+    for ii, upper in enumerate(sorted(bandFrequencies)):
+        if ii == len(bandFrequencies)-1:
+            upper = max(values+[upper])
+        band = [value for value in values if lower < value <= upper]
+        if band:
+            bands.append(band)
+        lower = upper
+    if numBlocks < len(bands):
+        return contiguousBlocks(values, numBlocks)
+    numBandBlocks = [1]*len(bands)
+    for ii in range(numBlocks-len(bands)):
+        band = max(range(len(bands)), key=lambda band: len(bands[band])/numBandBlocks[band])
+        numBandBlocks[band] += 1
+    return [block for band, num in zip(bands, numBandBlocks) for block in contiguousBlocks(band, num)]
+
+
+def distributeFrequencies(frequencyStepSize, maxFrequency, cpuFirst, cpuLast, numCoresPerCPU,
+                          numEars, frequencyDependency, lowFrequency=0, lowFrequencyCores=0,
+                          bandFrequencies=None, excludedFrequencies=None):
+    '''Distribute the frequencies over the CPUs and cores
+
+    The cores are split between the ears (see earWorkers). The frequencies
+    of each ear are dealt round-robin to its cores or, with
+    frequencyDependency, split into contiguous blocks so that each core uses
+    a single mesh (within the bands up to the mesh frequencies
+    bandFrequencies, see bandBlocks). With lowFrequencyCores, the first CPU
+    of each ear solves the frequencies up to lowFrequency on two cores and
+    the other CPUs the remaining frequencies, if the CPUs can be split
+    evenly between the ears and each ear has more than one CPU.
+    Frequencies in excludedFrequencies[ear] are left out.
+
+    Returns cpusAndCores (ear calculated on each CPU/core, 0 if unused),
+    the frequencies of each CPU/core, the number of frequency steps, the
+    number of frequency steps per core and the number of available cores.
+    '''
+    numCPUs = cpuLast-cpuFirst+1
+    if not numCPUs % numEars == 0:
+        # the ears would get different layouts
+        lowFrequency, lowFrequencyCores = 0, 0
+
+    frequencySteps = divmod(maxFrequency-lowFrequency, frequencyStepSize)
+    if not frequencySteps[1] == 0 or not lowFrequency % frequencyStepSize == 0:
+        raise Exception("Error, frequencyStepSize is not a divisor of maxFrequency-lowFrequency")
+    stepFrequencies = [frequencyStepSize*ii for ii in range(1, maxFrequency//frequencyStepSize+1)]
+
+    cpusAndCores = [[0]*numCoresPerCPU for cpu in range(cpuLast)]
+    frequencies = [[[] for core in range(numCoresPerCPU)] for cpu in range(cpuLast)]
+    allWorkers = earWorkers(cpuFirst, cpuLast, numCoresPerCPU, numEars)
+    numCoresAvailable = sum(len(workers) for workers in allWorkers)
+    numCoresUsedPerEar = numCoresAvailable
+    for tmpEar, workers in enumerate(allWorkers, 1):
+        assignments = []
+        earFrequencies = [frequency for frequency in stepFrequencies
+                          if not excludedFrequencies or frequency not in excludedFrequencies.get(tmpEar, ())]
+        allFrequencies = earFrequencies
+        lowWorkers = [worker for worker in workers if worker[0] == workers[0][0]]
+        if lowFrequencyCores > 0 and len(lowWorkers) < len(workers):
+            workers = [worker for worker in workers if worker not in lowWorkers]
+            lowFrequencies = [frequency for frequency in allFrequencies if frequency <= lowFrequency]
+            earFrequencies = [frequency for frequency in allFrequencies if frequency > lowFrequency]
+            assignments.extend(zip(lowWorkers, contiguousBlocks(lowFrequencies, min(2, len(lowWorkers)))))
+            numCoresAvailable -= len(lowWorkers)
+        if frequencyDependency and bandFrequencies:
+            assignments.extend(zip(workers, bandBlocks(earFrequencies, bandFrequencies, len(workers))))
+        elif frequencyDependency:
+            assignments.extend(zip(workers, contiguousBlocks(earFrequencies, len(workers))))
+        else:
+            assignments.extend(zip(workers, [earFrequencies[ii::len(workers)] for ii in range(len(workers))]))
+        numCoresUsedPerEar = min(numCoresUsedPerEar, len(workers))
+
+        if not sorted(frequency for worker, tmp in assignments for frequency in tmp) == allFrequencies:
+            raise Exception("Error, the frequencies of ear %d are not distributed completely" % tmpEar)
+        for (cpu, core), tmp in assignments:
+            if tmp:
+                frequencies[cpu-1][core-1] = tmp
+                cpusAndCores[cpu-1][core-1] = tmpEar
+
+    frequencyStepsPerCore = divmod(frequencySteps[0], numCoresUsedPerEar)
+    return cpusAndCores, frequencies, frequencySteps[0], frequencyStepsPerCore[0], numCoresAvailable
+
+
+def balanceFrequencies(frequencyStepSize, maxFrequency, cpuFirst, cpuLast, numCoresPerCPU,
+                       numEars, cost, scheduler=scheduleLongestFirst, excludedFrequencies=None):
+    '''Distribute the frequencies over the CPUs and cores by their estimated solve time
+
+    The cores are split between the ears (left ear on the first half of the
+    CPUs) and scheduler assigns the frequencies of each ear to its cores
+    using cost(frequency). Frequencies in excludedFrequencies[ear] are left
+    out. Returns the same as distributeFrequencies.
+    '''
+    frequencySteps = divmod(maxFrequency, frequencyStepSize)
+    if not frequencySteps[1] == 0:
+        raise Exception("Error, frequencyStepSize is not a divisor of maxFrequency")
+    stepFrequencies = [frequencyStepSize*ii for ii in range(1, frequencySteps[0]+1)]
+
+    workers = [(cpu, core) for cpu in range(cpuFirst, cpuLast+1) for core in range(1, numCoresPerCPU+1)]
+    numCoresUsedPerEar = int(len(workers)/numEars)
+    if numCoresUsedPerEar < 1:
+        raise Exception('Please use at least %d cores for calculation of %d ears' % (numEars, numEars))
+
+    cpusAndCores = [[0]*numCoresPerCPU for cpu in range(cpuLast)]
+    frequencies = [[[] for core in range(numCoresPerCPU)] for cpu in range(cpuLast)]
+    for tmpEar in range(1, numEars+1):
+        earWorkers = workers[(tmpEar-1)*numCoresUsedPerEar:tmpEar*numCoresUsedPerEar]
+        earFrequencies = [frequency for frequency in stepFrequencies
+                          if not excludedFrequencies or frequency not in excludedFrequencies.get(tmpEar, ())]
+        assignments = scheduler(earFrequencies, len(earWorkers), cost)[0]
+        for (cpu, core), tmp in zip(earWorkers, assignments):
+            if tmp:
+                frequencies[cpu-1][core-1] = tmp
+                cpusAndCores[cpu-1][core-1] = tmpEar
+
+    frequencyStepsPerCore = max(len(tmp) for row in frequencies for tmp in row)
+    return cpusAndCores, frequencies, frequencySteps[0], frequencyStepsPerCore, len(workers)
+
+
+def objectMeshName(earSide, frequencies, maxObjectFrequency, frequencyDependency):
+    '''Return the name of the object mesh used for a core
+
+    With frequency-dependent meshes this is the L/R mesh with the smallest
+    maximum frequency that still covers the highest frequency of the core
+    (maxObjectFrequency is sorted).
+    '''
+    if not frequencyDependency:
+        return "Reference"
+
+    if earSide == 1:
+        tmpEar = "L"
+    if earSide == 2:
+        tmpEar = "R"
+    tmpfmax = max(frequencies)
+    index = bisect.bisect_left(maxObjectFrequency, tmpfmax)
+    if index < len(maxObjectFrequency):
+        return ("%s%i" % (tmpEar, maxObjectFrequency[index]))
+    raise Exception("No object mesh for frequencies up to %d Hz found.\nPlease add an object %s{maxobjfq} with maxobjfq >= %d." % (tmpfmax, tmpEar, tmpfmax))
+
+
+def maxObjectFrequencies(objectNames):
+    '''Return the sorted maximum frequencies encoded in object names such as L20000 or R20000'''
+    maxObjectFrequency = set()
+    for name in objectNames:
+        if not name == 'Reference' and not name == 'User':
+            try:
+                maxObjectFrequency.add(int(name[1:]))
+            except ValueError:
+                print('No maximum object frequency found.\nPlease change object names to L{maxobjfq}/R{maxobjfq} e.g. L20000 or R20000.')
+    return sorted(maxObjectFrequency)
+
+
+def writeInfo(filename, title, ear, gridNames, maxFrequency, frequencyStepSize, frequencySteps,
+              frequencyStepsPerCore, cpuFirst, cpuLast, numCoresAvailable, frequencies, estimates=None):
+    '''Write Info.txt with the general, frequency and cluster information
+
+    estimates holds the estimated (peak memory, run time) of each CPU/core.
+    '''
+    with open(filename, "w", encoding="utf8", newline="\n") as file:
+        fw = file.write
+        fw("#####################################\n")
+        fw("######## General information ########\n")
+        fw("#####################################\n\n")
+        fw("Program: Mesh2HRTF\n")
+        fw("Title: %s\n" % title)
+        fw("Ear: %s\n" % ear)
+        fw("Evaluation Grids:\n")
+        for gridName in gridNames:
+            fw("    %s\n" % gridName)
+        fw("\n")
+        fw("#####################################\n")
+        fw("####### Frequency information #######\n")
+        fw("#####################################\n\n")
+        fw("Highest evaluated Frequency: %d\n" % maxFrequency)
+        fw("Frequency Stepsize: %d\n" % frequencyStepSize)
+        fw("Frequency Steps: %d\n" % frequencySteps)
+        fw("Frequency steps per Core: %d\n\n" % frequencyStepsPerCore)
+        fw("#####################################\n")
+        fw("######## Cluster information ########\n")
+        fw("#####################################\n\n")
+        fw("Number of CPUs: %d\n" % (cpuLast-cpuFirst+1))
+        fw("First CPU: 'CPU_%d'\n" % cpuFirst)
+        fw("Last CPU: 'CPU_%d'\n" % cpuLast)
+        fw("Number of Cores (available): %d\n" % numCoresAvailable)
+        for core in range(1, len(frequencies[0])+1):
+            for cpu in range(1, len(frequencies)+1):
+                fw("CPU_%d (Core %d):\n" % (cpu, core))
+                for ii in range(0, len(frequencies[cpu-1][core-1])):
+                    fw("    %d\n" % frequencies[cpu-1][core-1][ii])
+            fw("\n")
+
+        if estimates is not None:
+            fw("#####################################\n")
+            fw("######## Resource estimates #########\n")
+            fw("#####################################\n\n")
+            fw("Estimated run time and peak memory of NumCalc:\n")
+            for core in range(1, len(frequencies[0])+1):
+                for cpu in range(1, len(frequencies)+1):
+                    if frequencies[cpu-1][core-1]:
+                        fw("CPU_%d (Core %d): %.0f s, %.0f MB\n" % (cpu, core, estimates[cpu-1][core-1][1], estimates[cpu-1][core-1][0]/1024**2))
+            fw("\n")
+            for cpu in range(1, len(frequencies)+1):
+                cpuMemory = sum(estimate[0] for estimate in estimates[cpu-1])
+                if cpuMemory > 0:
+                    fw("CPU_%d: %.0f MB\n" % (cpu, cpuMemory/1024**2))
+
+
+def matlabMatrix(name, rows, format, brackets):
+    '''Return the assignment of a CPU x core matrix (brackets "[]") or cell array ("{}") in Output2HRTF.m'''
+    return "%s=%s%s%s;\n" % (name, brackets[0], "; ...\n".join(" ".join(format % value for value in row) for row in rows), brackets[1])
+
+
+def readMatlabMatrix(text, name):
+    '''Return the rows of a matrix or cell array written by matlabMatrix and the match of its assignment'''
+    match = re.search(r"^%s=[\[{](.*?)[\]}];$" % name, text, re.M | re.S)
+    if "'" in match.group(1):
+        return [re.findall(r"'([^']*)'", row) for row in match.group(1).split("; ...\n")], match
+    return [[int(value) for value in row.split()] for row in match.group(1).split("; ...\n")], match
+
+
+def writeOutput2HRTF(filename, cpusAndCores, objectNames, reciprocity, ear, earCenter, earArea,
+                     sourcePosition, frequencyDependency, nearFieldCalculation, speedOfSound,
+                     densityOfMedium):
+    '''Write the Output2HRTF.m script that calls Output2HRTF_Main
+
+    objectNames holds the object mesh of each CPU/core ('' if unused).
+    '''
+    with open(filename, "w", encoding="utf8", newline="\n") as file:
+        fw = file.write
+        fw("close all\n")
+        fw("clear\n")
+        fw("\n")
+
+        fw(matlabMatrix("cpusAndCores", cpusAndCores, "%i", "[]"))
+        fw("\n")
+
+        fw(matlabMatrix("objectMeshes", objectNames, "'%s'", "{}"))
+        fw("\n")
+
+        fw("reciprocity=")
+        if reciprocity:
+            fw("1")
+        else:
+            fw("0")
+        fw(";\n")
+        fw("\n")
+
+        # add information about the reciever/point source
+        if reciprocity:
+
+            # write left ear data
+            if ear == 'Left ear' or ear == 'Both ears':
+                fw("% left ear / receiver\n")
+                fw("receiverCenter(1,1:3)=[%f %f %f];\n" % (earCenter[0][0], earCenter[0][1], earCenter[0][2]))
+                fw("receiverArea(1,1)    =%g;\n" % earArea[0])
+
+            # write right ear data
+            if ear == 'Right ear' or ear == 'Both ears':
+                if ear == 'Right ear':
+                    nn = 1
+                if ear == 'Both ears':
+                    nn = 2
+
+                fw("% right ear / receiver\n")
+                fw("receiverCenter(%d,1:3) = [%f %f %f];\n" % (nn, earCenter[1][0], earCenter[1][1], earCenter[1][2]))
+                fw("receiverArea(%d,1)     = %g;\n" % (nn, earArea[1]))
+
+            fw("\n")
+        else:
+
+            fw("% point source / receiver\n")
+            fw("receiverCenter(1,1:3) = [%s %s %s];\n" % tuple(sourcePosition))
+            fw("receiverArea(1,1)     = 1;\n")
+
+        fw("frequencyDependency=")
+        if frequencyDependency:
+            fw("1")
+        else:
+            fw("0")
+        fw(";\n")
+        fw("\n")
+
+        fw("nearFieldCalculation=")
+        if nearFieldCalculation:
+            fw("1")
+        else:
+            fw("0")
+        fw(";\n")
+        fw("\n")
+
+        fw("% Reference to a point source in the origin\n")
+        fw("% accoring to the classical HRTF definition\n")
+        fw("reference    = false;\n")
+        fw("speedOfSound = " + speedOfSound + "; % [m/s]\n")
+        fw("densityOfAir = " + densityOfMedium + "; % [kg/m^3]\n\n")
+
+        fw("Output2HRTF_Main(cpusAndCores,objectMeshes,reciprocity,receiverCenter,frequencyDependency,nearFieldCalculation,receiverArea,reference,speedOfSound,densityOfAir);")
+
+
+def writeProject(projectPath,
+                 objectMeshes,
+                 evaluationGrids=('3_ARI',),
+                 nearFieldGrid=None,
+                 title="head-related transfer functions",
+                 frequencyStepSize=100,
+                 maxFrequency=20000,
+                 cpuFirst=1,
+                 cpuLast=10,
+                 numCoresPerCPU=8,
+                 ear='Both ears',
+                 gridDeployment='HARDLINK',
+                 gridCachePath="",
+                 method='4',
+                 frequencyDistribution='COST',
+                 costModel=None,
+                 resourceEstimator=None,
+                 memoryBudget=0,
+                 memoryPolicy='SPLIT',
+                 solveCachePath="",
+                 reciprocity=True,
+                 sourceXPosition='0',
+                 sourceYPosition='101',
+                 sourceZPosition='0',
+                 speedOfSound='346.18',
+                 densityOfMedium='1.1839',
+                 unit='mm',
+                 frequencyDependency=False,
+                 meshGrading=False,
+                 meshGradingFrequencies=None,
+                 elementsPerWavelength=6,
+                 fineRadius=0.02,
+                 resolutionPolicy='WARN',
+                 programPath="",
+                 ):
+    '''Write a complete Mesh2HRTF project to the folder projectPath
+
+    objectMeshes is a list of ObjectMesh ('Reference' or L{maxobjfq} and
+    R{maxobjfq} for frequency-dependent meshes). With meshGrading, the
+    L/R meshes are generated from the Reference mesh instead (see
+    Mesh2Input/meshGrading.py): one per upper band frequency in
+    meshGradingFrequencies (default: maxFrequency halved three times), with
+    elementsPerWavelength elements per wavelength and the radiating ear kept
+    fine within fineRadius (m); only the meshes used by a core are graded
+    and written. evaluationGrids holds names
+    of grids in Mesh2Input/EvaluationGrids ('None' is skipped) or
+    EvaluationGrid objects. If nearFieldGrid is given (an EvaluationGrid,
+    the folder of a grid such as returned by nearFieldSphere, or a list of
+    them for several radii), it replaces the evaluation grids and near-field
+    HRTFs are calculated.
+
+    The cluster consists of the CPUs (machines) cpuFirst ... cpuLast with
+    numCoresPerCPU cores each; a flat pool of K workers is cpuFirst=cpuLast=1
+    and numCoresPerCPU=K.
+
+    frequencyDistribution 'COST' balances the frequencies by their estimated
+    solve time (costModel, default: run time of resourceEstimator for the
+    Reference mesh), 'ROUND_ROBIN' deals them round-robin. 'QUEUE' writes
+    one CPU_1_Core_<ear> folder per ear (with NC.inp.done, so that it is not
+    run by StartNumCalc or runNumCalc.py) and a work queue with one task per
+    frequency (NumCalc/Queue, most expensive first) that is solved by any
+    number of workers (NumCalc/queueWorker.py; a re-export keeps the solved
+    tasks that did not change); the CPUs and cores are not used then.
+    Frequency-dependent meshes are always distributed in contiguous bands
+    so that each core uses a single mesh (see bandBlocks).
+
+    resourceEstimator (default ResourceEstimator()) estimates the memory and
+    run time of each core, which are written to Info.txt. If the memory of a
+    CPU exceeds memoryBudget (bytes, 0: no limit), the export fails
+    (memoryPolicy 'ERROR') or the frequencies are split over fewer cores per
+    CPU until the budget is met ('SPLIT'). Work queues are not checked.
+
+    Before any file is written, the resolution of the Reference mesh (or
+    the finest object mesh if there is none) is compared to the wavelength
+    (see MeshResolution, elementsPerWavelength): resolutionPolicy 'WARN'
+    prints the report and recommendations, 'ERROR' also stops the export if
+    the mesh is too coarse for maxFrequency and 'OFF' skips the check.
+
+    Frequencies whose results are in the solve cache in solveCachePath (see
+    NumCalc/solveCache.py, empty: no cache) are not scheduled; their results
+    are deployed to NumCalc/CPU_<cpuLast+1>_Core_*, one folder per ear and
+    object mesh.
+
+    Meshes, grids and NC.inp files whose data did not change since the last
+    export are not written again (see ExportManifest).
+    '''
+
+# ----------------------- Initialize constants ---------------------------------
+    if not programPath:
+        programPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    tmp = open("%s/../VERSION" % programPath)
+    version = tmp.readline()
+    tmp.close()
+
+    plan = ExportPlan(title, version, method, reciprocity, ear, speedOfSound, densityOfMedium,
+                      (sourceXPosition, sourceYPosition, sourceZPosition))
+
+    for temp in ["%s/ObjectMeshes/" % projectPath, "%s/EvaluationGrids/" % projectPath, "%s/NumCalc/" % projectPath]:
+        if not os.path.exists(temp):
+            os.mkdir(temp)
+    # files whose data did not change since the last export are kept
+    manifest = ExportManifest(projectPath)
+
+    if cpuFirst < 1 or cpuLast < cpuFirst or numCoresPerCPU < 1:
+        raise Exception("Error, invalid CPUs/cores (cpuFirst=%d, cpuLast=%d, numCoresPerCPU=%d)" % (cpuFirst, cpuLast, numCoresPerCPU))
+    numCPUs = cpuLast-cpuFirst+1
+
+    numEars = 1
+    if ear == 'Both ears':
+        numEars = 2
+
+    unitFactor = 1
+    if unit == 'mm':
+        unitFactor = 0.001
+
+    objectMeshes = dict((objectMesh.name, objectMesh) for objectMesh in objectMeshes)
+
+    gradedMeshNames = {}
+    if meshGrading:
+        frequencyDependency = True
+        if meshGradingFrequencies is None:
+            meshGradingFrequencies = gradingFrequencies(frequencyStepSize, maxFrequency)
+        # the graded meshes replace given L/R meshes and are graded when they are used first (see objectMesh)
+        gradedMeshNames = gradedMeshes(meshGradingFrequencies, ear, reciprocity)
+        objectMeshes = dict((name, objectMesh) for name, objectMesh in objectMeshes.items() if name not in gradedMeshNames)
+
+    workQueue = frequencyDistribution == 'QUEUE' and not frequencyDependency
+    balanceCost = (frequencyDistribution == 'COST' and not frequencyDependency) or workQueue
+    if workQueue:
+        # one folder per ear collects the results of the workers
+        cpuFirst, cpuLast, numCoresPerCPU = 1, 1, numEars
+        numCPUs = 1
+
+    lowFrequency = 0
+    lowFrequencyCores = 0
+    if not frequencyDependency and not balanceCost:
+        if objectMeshes['Reference'].numNodes > 40000 and numCPUs/numEars > 1:
+            lowFrequency = frequencyStepSize*10
+            lowFrequencyCores = 1
+
+    evaluationGridPath = ("%s/Mesh2Input/EvaluationGrids" % programPath)
+
+# ------------------------ Check the mesh resolution ---------------------------
+    if not resolutionPolicy == 'OFF':
+        # without a Reference mesh (frequency-dependent meshes only) the finest mesh is checked
+        checkedMesh = objectMeshes.get('Reference')
+        if checkedMesh is None and objectMeshes:
+            checkedMesh = max(objectMeshes.values(), key=lambda tmp: tmp.numElements)
+        if checkedMesh is None:
+            print("No object mesh, the mesh resolution is not checked.")
+        else:
+            resolution = MeshResolution(checkedMesh, speedOfSound, unitFactor, elementsPerWavelength)
+            print("%s mesh:\n%s" % (checkedMesh.name, resolution.report(reportFrequencies(maxFrequency), maxFrequency, frequencyStepSize)), end="")
+            if resolutionPolicy == 'ERROR' and resolution.maxFrequency < maxFrequency:
+                raise Exception("Error, the %s mesh supports frequencies up to %d Hz only (maxFrequency=%d Hz)" % (checkedMesh.name, resolution.maxFrequency, maxFrequency))
+
+# ------------------------ Write object data -----------------------------------
+    def writeObjectMesh(objectMesh):
+        temp = ("%s/ObjectMeshes/%s/" % (projectPath, objectMesh.name))
+        if not os.path.exists(temp):
+            os.mkdir(temp)
+
+        manifest.update(["ObjectMeshes/%s/Nodes.txt" % objectMesh.name, "ObjectMeshes/%s/Elements.txt" % objectMesh.name],
+                        meshKey([objectMesh], unitFactor), lambda: objectMesh.write(temp, unitFactor))
+        plan.addObjectMesh(objectMesh.name, objectMesh.numNodes, objectMesh.numElements, objectMesh.earElements())
+
+    def objectMesh(name):
+        '''Return the object mesh name, grading and writing graded meshes when they are used first'''
+        if name in gradedMeshNames and name not in objectMeshes:
+            objectMeshes[name] = gradeMeshes(objectMeshes['Reference'], meshGradingFrequencies, ear, reciprocity, speedOfSound,
+                                             unitFactor, elementsPerWavelength, fineRadius, names=[name])[0]
+            writeObjectMesh(objectMeshes[name])
+        return objectMeshes[name]
+
+    for tmp in objectMeshes.values():
+        writeObjectMesh(tmp)
+
+    maxObjectFrequency = maxObjectFrequencies(list(objectMeshes)+list(gradedMeshNames))
+
+# ------------------------ Write evaluation grid data --------------------------
+    if nearFieldGrid is not None:
+        grids = list(nearFieldGrid) if isinstance(nearFieldGrid, (list, tuple)) else [nearFieldGrid]
+    else:
+        grids = [grid for grid in evaluationGrids if not grid == 'None']
+
+    for grid in grids:
+        if isinstance(grid, EvaluationGrid):
+            temp = ("%s/EvaluationGrids/%s/" % (projectPath, grid.name))
+            if not os.path.exists(temp):
+                os.mkdir(temp)
+            manifest.update(["EvaluationGrids/%s/Nodes.txt" % grid.name, "EvaluationGrids/%s/Elements.txt" % grid.name],
+                            meshKey([grid], unitFactor), lambda: grid.write(temp, unitFactor))
+            plan.addEvaluationGrid(grid.name, grid.numNodes, grid.numElements)
+        else:
+            # names of grids in Mesh2Input/EvaluationGrids or folders (e.g. from nearFieldSphere)
+            sourcePath = grid if os.path.isabs(grid) else ("%s/%s" % (evaluationGridPath, grid))
+            grid = os.path.basename(os.path.normpath(grid))
+            temp = ("%s/EvaluationGrids/%s/" % (projectPath, grid))
+            if not os.path.exists(temp):
+                os.mkdir(temp)
+            paths = ["EvaluationGrids/%s/Nodes.txt" % grid, "EvaluationGrids/%s/Elements.txt" % grid]
+            sourceStamps = [(os.stat(name).st_size, os.stat(name).st_mtime_ns) for name in
+                            [os.path.join(sourcePath, "Nodes.txt"), os.path.join(sourcePath, "Elements.txt")]]
+            manifest.update(paths, contentKey(os.path.abspath(sourcePath), sourceStamps, gridCachePath, gridDeployment),
+                            lambda: deployEvaluationGrid(sourcePath, temp, gridCachePath, gridDeployment))
+            # the counts are kept in the manifest (manifests of older exports do not have them)
+            if manifest.value(paths[0]) is not None:
+                numNodes, numElements = manifest.value(paths[0])
+            else:
+                numNodes, numElements = [readMeshHeader(os.path.join(projectPath, path)) for path in paths]
+            plan.addEvaluationGrid(grid, numNodes, numElements)
+
+# ------------------------ Look up solved frequencies --------------------------
+    solveCache = None
+    # ear -> frequency -> (object name, cache key)
+    cachedFrequencies = dict((tmpEar, {}) for tmpEar in range(1, numEars+1))
+    if solveCachePath:
+        solveCache = SolveCache(solveCachePath)
+        jobPath = "%s/NumCalc/CPU_1_Core_1" % projectPath
+        inputKeys = {}
+        for tmpEar in range(1, numEars+1):
+            for frequency in range(frequencyStepSize, maxFrequency+1, frequencyStepSize):
+                objectName = objectMeshName(tmpEar, [frequency], maxObjectFrequency, frequencyDependency)
+                if (tmpEar, objectName) not in inputKeys:
+                    objectMesh(objectName)
+                    inputKeys[(tmpEar, objectName)] = solveCache.inputKey(plan.renderNumCalcInput(objectName, tmpEar, [frequency]), jobPath)
+                key = solveCache.frequencyKey(inputKeys[(tmpEar, objectName)], frequency)
+                if solveCache.contains(key):
+                    cachedFrequencies[tmpEar][frequency] = (objectName, key)
+
+# ------------------------ Calculate frequency information ---------------------
+    if resourceEstimator is None:
+        resourceEstimator = ResourceEstimator()
+    if balanceCost and costModel is None:
+        costModel = resourceEstimator.costModel(objectMeshes['Reference'].numElements, method)
+
+    for numCoresUsed in range(numCoresPerCPU, 0, -1):
+        if balanceCost:
+            cpusAndCores, frequencies, frequencySteps, frequencyStepsPerCore, numCoresAvailable = balanceFrequencies(
+                frequencyStepSize, maxFrequency, cpuFirst, cpuLast, numCoresUsed, numEars, costModel,
+                excludedFrequencies=cachedFrequencies)
+        else:
+            cpusAndCores, frequencies, frequencySteps, frequencyStepsPerCore, numCoresAvailable = distributeFrequencies(
+                frequencyStepSize, maxFrequency, cpuFirst, cpuLast, numCoresUsed, numEars,
+                frequencyDependency, lowFrequency, lowFrequencyCores, maxObjectFrequency, cachedFrequencies)
+
+        objectNames = ([])
+        estimates = ([])
+        for cpu in range(1, cpuLast+1):
+            tmp = ([])
+            tmpEstimates = ([])
+            for core in range(1, numCoresUsed+1):
+                if not cpusAndCores[cpu-1][core-1] == 0:
+                    tmp.append(objectMeshName(cpusAndCores[cpu-1][core-1], frequencies[cpu-1][core-1], maxObjectFrequency, frequencyDependency))
+                    tmpEstimates.append(resourceEstimator.estimateCore(objectMesh(tmp[-1]).numElements, method, frequencies[cpu-1][core-1]))
+                else:
+                    tmp.append("")
+                    tmpEstimates.append((0., 0.))
+            objectNames.append(tmp)
+            estimates.append(tmpEstimates)
+
+        if reciprocity:
+            for cpu in range(1, cpuLast+1):
+                for core in range(1, numCoresUsed+1):
+                    if cpusAndCores[cpu-1][core-1]:
+                        plan.radiatingEar(objectNames[cpu-1][core-1], cpusAndCores[cpu-1][core-1])
+
+        # estimated memory of each CPU if all its cores run at the same time
+        cpuMemory = [sum(estimate[0] for estimate in row) for row in estimates]
+        if not memoryBudget or workQueue or max(cpuMemory) <= memoryBudget:
+            break
+        cpu = cpuMemory.index(max(cpuMemory))+1
+        if memoryPolicy == 'ERROR' or numCoresUsed == 1:
+            raise Exception("Error, the estimated memory of CPU_%d (%.3g GB) exceeds the memory budget of %.3g GB" % (cpu, max(cpuMemory)/1024**3, memoryBudget/1024**3))
+    if numCoresUsed < numCoresPerCPU:
+        print("Estimated memory exceeds the memory budget with %d cores per CPU, using %d cores per CPU." % (numCoresPerCPU, numCoresUsed))
+        numCoresPerCPU = numCoresUsed
+
+# ----------------------- Deploy cached results --------------------------------
+    if any(cachedFrequencies.values()):
+        # one folder per ear and object mesh (with frequency-dependent meshes the bands use different meshes)
+        cachedGroups = {}
+        for tmpEar, cached in cachedFrequencies.items():
+            for frequency in sorted(cached):
+                cachedGroups.setdefault((tmpEar, cached[frequency][0]), []).append(frequency)
+        cacheCPU = cpuLast+1
+        numColumns = max(numCoresPerCPU, len(cachedGroups))
+        cpusAndCores = [row+[0]*(numColumns-len(row)) for row in cpusAndCores]+[[0]*numColumns]
+        objectNames = [row+[""]*(numColumns-len(row)) for row in objectNames]+[[""]*numColumns]
+        frequencies = [row+[[]]*(numColumns-len(row)) for row in frequencies]+[[[] for core in range(numColumns)]]
+        estimates = [row+[(0., 0.)]*(numColumns-len(row)) for row in estimates]+[[(0., 0.)]*numColumns]
+        for core, ((tmpEar, objectName), tmp) in enumerate(sorted(cachedGroups.items(), key=lambda group: (group[0][0], group[1][0])), 1):
+            filepath2 = ("%s/NumCalc/CPU_%i_Core_%i/" % (projectPath, cacheCPU, core))
+            for temp in ["%sbe.out" % filepath2, "%sfe.out" % filepath2]:
+                if os.path.exists(temp):
+                    shutil.rmtree(temp)
+            stepOutputs = []
+            for index, frequency in enumerate(tmp, 1):
+                stepOutputs.append(renumberStep(solveCache.materialize(
+                    cachedFrequencies[tmpEar][frequency][1], "%sbe.out/be.%d" % (filepath2, index), "%sfe.out/fe.%d" % (filepath2, index)), index))
+            # NC.out with the step statistics (read by Output2HRTF_Main.m)
+            with open(("%sNC.out" % filepath2), "w", encoding="utf8", newline="\n") as file:
+                file.write("".join(stepOutputs))
+
+            # NC.inp.done: the folder is not run by StartNumCalc and runNumCalc.py
+            with open(("%sNC.inp.done" % filepath2), "w", encoding="utf8", newline="\n") as file:
+                file.write(plan.renderNumCalcInput(objectName, tmpEar, tmp))
+            cpusAndCores[cacheCPU-1][core-1] = tmpEar
+            objectNames[cacheCPU-1][core-1] = objectName
+            frequencies[cacheCPU-1][core-1] = tmp
+        print("%d frequencies taken from the solve cache (NumCalc/CPU_%d_Core_*)." % (
+            sum(len(cached) for cached in cachedFrequencies.values()), cacheCPU))
+
+# ----------------------- Write general information ----------------------------
+    # the deployed grids (the near-field spheres in near-field calculations)
+    writeInfo(("%s/Info.txt" % projectPath), title, ear, list(plan.evaluationGrids), maxFrequency, frequencyStepSize,
+              frequencySteps, frequencyStepsPerCore, cpuFirst, cpuLast, numCoresAvailable, frequencies,
+              estimates)
+
+# ----------------------- Write Output2HRTF.m function -------------------------
+    earCenter, earArea = None, None
+    if reciprocity:
+        earCenter, earArea = calculateReceiverProperties(objectMeshes['Reference'], unitFactor)
+    writeOutput2HRTF(("%s/Output2HRTF.m" % projectPath), cpusAndCores, objectNames, reciprocity, ear,
+                     earCenter, earArea, (sourceXPosition, sourceYPosition, sourceZPosition),
+                     frequencyDependency, nearFieldGrid is not None, speedOfSound, densityOfMedium)
+
+# ----------------------- Write NumCalc input files for all CPUs and Cores -----
+    for core in range(1, numCoresPerCPU+1):
+        for cpu in range(1, cpuLast+1):
+            if not cpusAndCores[cpu-1][core-1] == 0:
+
+                filepath2 = ("%s/NumCalc/CPU_%i_Core_%i/" % (projectPath, cpu, core))
+                if not os.path.exists(filepath2):
+                    os.mkdir(filepath2)
+
+                # work queue: the folder only collects the results (NC.inp.done is not run by StartNumCalc and runNumCalc.py)
+                # the key excludes the date so that an unchanged input is kept on later days
+                text = plan.renderNumCalcInput(objectNames[cpu-1][core-1], cpusAndCores[cpu-1][core-1], frequencies[cpu-1][core-1])
+                manifest.writeText("NumCalc/CPU_%i_Core_%i/%s" % (cpu, core, "NC.inp.done" if workQueue else "NC.inp"),
+                                   text, contentKey(re.sub(r"^## Date: .*\n", "", text, flags=re.M)))
+
+# ----------------------- Write the work queue ---------------------------------
+    if workQueue:
+        tasks = []
+        for core in range(1, numCoresPerCPU+1):
+            for index, frequency in enumerate(frequencies[0][core-1]):
+                tasks.append({'id': "%d_%d" % (core, index+1), 'ear': cpusAndCores[0][core-1],
+                              'object': objectNames[0][core-1], 'frequency': frequency,
+                              'folder': "CPU_1_Core_%d" % core, 'index': index+1})
+        tasks.sort(key=lambda task: -costModel(task['frequency']))
+        # solved tasks are kept if neither they nor the meshes and grids changed
+        paths = ["%s/%s/%s" % (folder, name, fileName)
+                 for folder, names in (("ObjectMeshes", plan.objectMeshes), ("EvaluationGrids", plan.evaluationGrids))
+                 for name in sorted(names) for fileName in ("Nodes.txt", "Elements.txt")]
+        WorkQueue.create(projectPath, plan.toDict(), tasks, contentKey([(path, manifest.key(path)) for path in paths]))
+
+    # input files of a previous export with other CPUs and cores would be run by StartNumCalc
+    manifest.removeStale(r"NumCalc/CPU_\d+_Core_\d+/NC\.inp(\.done)?$")
+    # graded meshes of a previous export with other bands or cores
+    manifest.removeStale(r"ObjectMeshes/[LR]\d+/(Nodes|Elements)\.txt$")
+    manifest.save()
+    print("Export: %s." % manifest.report())
+    return cpusAndCores, frequencies
@@ -0,0 +1,43 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Assignment of frequency steps to cores by their estimated solve time'''
+
+import heapq
+
+
+def scheduleLongestFirst(frequencies, numWorkers, cost):
+    '''Greedy longest-processing-time (LPT) assignment of frequencies to workers
+
+    Frequencies are taken in order of decreasing cost and each is given to
+    the worker that currently finishes first. Returns the ascending
+    frequencies of each worker and the predicted finish time of each worker.
+    '''
+    if numWorkers < 1:
+        raise ValueError("At least one worker is required")
+    assignments = [[] for worker in range(numWorkers)]
+    finishTimes = [0.]*numWorkers
+
+    # (finish time, worker) - ties go to the worker with the lower index
+    heap = [(0., worker) for worker in range(numWorkers)]
+    for frequency in sorted(frequencies, key=lambda f: (-cost(f), f)):
+        finishTime, worker = heapq.heappop(heap)
+        assignments[worker].append(frequency)
+        finishTimes[worker] = finishTime+cost(frequency)
+        heapq.heappush(heap, (finishTimes[worker], worker))
+
+    for worker in range(numWorkers):
+        assignments[worker].sort()
+    return assignments, finishTimes
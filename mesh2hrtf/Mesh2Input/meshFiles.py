@@ -0,0 +1,133 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+
+'''Reading and writing of Mesh2HRTF Nodes.txt and Elements.txt files'''
+
+import numpy as np
+
+
+def flattenFaces(faces, faceSizes=None):
+    '''Return faces as flat vertex indices and number of corners per face
+
+    faces is either a 2-D array (all faces with the same number of corners)
+    or a flat array of vertex indices together with faceSizes.
+    '''
+    faces = np.asarray(faces, dtype=np.int64)
+    if faceSizes is None:
+        if faces.ndim != 2:
+            raise ValueError("faceSizes is required for a flat list of face vertices")
+        return faces.reshape(-1), np.full(len(faces), faces.shape[1], dtype=np.int64)
+    faceSizes = np.asarray(faceSizes, dtype=np.int64)
+    if faces.size != faceSizes.sum():
+        raise ValueError("faceSizes does not match the number of face vertices")
+    return faces.reshape(-1), faceSizes
+
+
+def writeNodes(filename, vertices, offset=0):
+    '''Write (N, 3) coordinates as Mesh2HRTF Nodes.txt with a single write call'''
+    vertices = np.asarray(vertices, dtype=np.float64)
+    numNodes = len(vertices)
+    values = [None]*(4*numNodes)
+    values[0::4] = range(offset, offset+numNodes)
+    values[1::4] = vertices[:, 0].tolist()
+    values[2::4] = vertices[:, 1].tolist()
+    values[3::4] = vertices[:, 2].tolist()
+
+    with open(filename, "w", encoding="utf8", newline="\n") as file:
+        file.write(("%i\n" % numNodes)+("%i %.6f %.6f %.6f\n"*numNodes) % tuple(values))
+
+
+def writeElements(filename, polygonVertices, polygonSizes, offset=0, suffix=" 0 0 0"):
+    '''Write polygons as Mesh2HRTF Elements.txt with a single write call'''
+    numPolygons = len(polygonSizes)
+    rowSizes = polygonSizes+1
+    rowStart = np.cumsum(rowSizes)-rowSizes
+    isIndex = np.zeros(numPolygons+len(polygonVertices), dtype=bool)
+    isIndex[rowStart] = True
+    values = np.empty(len(isIndex), dtype=np.int64)
+    values[isIndex] = np.arange(offset, offset+numPolygons)
+    values[~isIndex] = polygonVertices+offset
+
+    # one row format per polygon size (triangles, quads, ...)
+    rowFormats = {}
+    for size in np.unique(polygonSizes).tolist():
+        rowFormats[size] = "%i"+" %d"*size+suffix+"\n"
+    if len(rowFormats) == 1:
+        fmt = rowFormats[int(polygonSizes[0])]*numPolygons
+    else:
+        fmt = "".join([rowFormats[size] for size in polygonSizes.tolist()])
+
+    with open(filename, "w", encoding="utf8", newline="\n") as file:
+        file.write(("%i\n" % numPolygons)+fmt % tuple(values.tolist()))
+
+
+def readMeshHeader(filename):
+    '''Return the number of entries from the first line of a Nodes.txt or Elements.txt'''
+    with open(filename) as file:
+        return int(file.readline())
+
+
+def readNodes(filename):
+    '''Return the node numbers and (N, 3) coordinates of a Nodes.txt'''
+    with open(filename, "rb") as file:
+        file.readline()
+        values = np.fromstring(file.read(), sep=" ").reshape(-1, 4)
+    return values[:, 0].astype(np.int64), values[:, 1:]
+
+
+def readElements(filename):
+    '''Return the element numbers and the node numbers of each element of an Elements.txt
+
+    The node numbers of triangles are padded with -1 to the number of
+    corners of the largest element; the three trailing properties are
+    dropped.
+    '''
+    with open(filename) as file:
+        file.readline()
+        rows = [line.split() for line in file if line.strip()]
+    numCorners = max(len(row) for row in rows)-4 if rows else 0
+    values = np.full((len(rows), numCorners+1), -1, dtype=np.int64)
+    for ii, row in enumerate(rows):
+        values[ii, :len(row)-3] = row[:-3]
+    return values[:, 0], values[:, 1:]
+
+
+def polygonAreas(vertices, polygonVertices, polygonSizes):
+    '''Return the area of each polygon from a fan triangulation (triangles and quads)'''
+    numPolygons = len(polygonSizes)
+    polygonIds = np.repeat(np.arange(numPolygons), polygonSizes)
+    firstCorner = np.repeat(np.cumsum(polygonSizes)-polygonSizes, polygonSizes)
+    corner = np.arange(len(polygonVertices))-firstCorner
+    # triangles (0, k, k+1) for k = 1 ... polygonSize-2
+    isFan = (corner >= 1) & (corner <= np.repeat(polygonSizes, polygonSizes)-2)
+    fan = np.nonzero(isFan)[0]
+
+    p0 = vertices[polygonVertices[firstCorner[fan]]]
+    p1 = vertices[polygonVertices[fan]]
+    p2 = vertices[polygonVertices[fan+1]]
+    triangleAreas = 0.5*np.linalg.norm(np.cross(p1-p0, p2-p0), axis=1)
+    return np.bincount(polygonIds[fan], weights=triangleAreas, minlength=numPolygons)
+
+
+def elementRanges(indices):
+    '''Merge sorted element indices into contiguous (first, last) ranges'''
+    indices = np.asarray(indices)
+    if not len(indices):
+        return []
+    breaks = np.nonzero(np.diff(indices) != 1)[0]
+    first = np.concatenate(([indices[0]], indices[breaks+1]))
+    last = np.concatenate((indices[breaks], [indices[-1]]))
+    return list(zip(first.tolist(), last.tolist()))
@@ -0,0 +1,157 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+
+'''Frequency-dependent grading of the Reference mesh
+
+gradeMeshes() derives the L{maxobjfq}/R{maxobjfq} meshes used with
+frequency-dependent meshes from the Reference mesh: for each frequency band
+the mesh is decimated by vertex clustering to the coarsest mesh whose edges
+are not longer than 1/elementsPerWavelength of the wavelength at the upper
+frequency of the band. The ear elements and their surroundings are kept as
+they are. The graded meshes consist of triangles only.
+'''
+
+import numpy as np
+
+
+def gradingFrequencies(frequencyStepSize, maxFrequency, numBands=4):
+    '''Return the upper frequencies of numBands bands, halving from maxFrequency
+
+    The frequencies are rounded up to multiples of frequencyStepSize.
+    '''
+    frequencies = set()
+    for band in range(numBands):
+        frequency = maxFrequency/2**band
+        frequencies.add(int(min(maxFrequency, -(-frequency//frequencyStepSize)*frequencyStepSize)))
+    return sorted(frequencies)
+
+
+def triangulate(polygonVertices, polygonSizes, materials):
+    '''Return (M, 3) triangles of a fan triangulation of the polygons and their materials'''
+    firstCorner = np.repeat(np.cumsum(polygonSizes)-polygonSizes, polygonSizes)
+    corner = np.arange(len(polygonVertices))-firstCorner
+    fan = np.nonzero((corner >= 1) & (corner <= np.repeat(polygonSizes, polygonSizes)-2))[0]
+    triangles = np.stack((polygonVertices[firstCorner[fan]], polygonVertices[fan], polygonVertices[fan+1]), axis=1)
+    return triangles, np.repeat(materials, polygonSizes-2)
+
+
+def edgeLengths(vertices, triangles):
+    '''Return the lengths of the three edges of each triangle'''
+    corners = vertices[triangles]
+    return np.linalg.norm(corners-np.roll(corners, -1, axis=1), axis=2)
+
+
+def clusterVertices(vertices, triangles, isFine, cellSize):
+    '''Merge the vertices in each cube of size cellSize into their mean
+
+    Vertices with isFine are not merged. Triangles that collapse are removed,
+    as are pairs of triangles with the same corners (folded pockets).
+    Returns the vertices, the triangles and the indices of the kept input
+    triangles.
+    '''
+    cells = np.floor((vertices-vertices.min(axis=0))/cellSize).astype(np.int64)
+    cluster = np.unique(cells, axis=0, return_inverse=True)[1].reshape(-1)
+    cluster[isFine] = cluster.max()+1+np.arange(np.count_nonzero(isFine))
+    numClusters = cluster.max()+1
+
+    counts = np.bincount(cluster, minlength=numClusters)
+    clusterVertices = np.stack([np.bincount(cluster, weights=vertices[:, ii], minlength=numClusters)
+                                for ii in range(3)], axis=1)/np.maximum(counts, 1)[:, np.newaxis]
+
+    mapped = cluster[triangles]
+    keep = ((mapped[:, 0] != mapped[:, 1]) & (mapped[:, 1] != mapped[:, 2]) & (mapped[:, 2] != mapped[:, 0]))
+    kept = np.nonzero(keep)[0]
+    _, first, inverse, groupSizes = np.unique(np.sort(mapped[kept], axis=1), axis=0, return_index=True,
+                                              return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    isFirst = np.zeros(len(kept), dtype=bool)
+    isFirst[first] = True
+    kept = kept[isFirst & (groupSizes[inverse] != 2)]
+
+    # drop the clusters that are not used by any triangle
+    used, triangles = np.unique(mapped[kept], return_inverse=True)
+    return clusterVertices[used], triangles.reshape(-1, 3), kept
+
+
+def gradeMesh(objectMesh, name, maxFrequency, speedOfSound=346.18, unitFactor=1,
+              elementsPerWavelength=6, fineMaterials=('Left ear', 'Right ear'), fineRadius=0.02):
+    '''Return objectMesh decimated for frequencies up to maxFrequency as a new mesh called name
+
+    The target edge length is speedOfSound/maxFrequency/elementsPerWavelength
+    (m). The elements with fineMaterials and all vertices within fineRadius
+    (m) of them are kept. The cell size of the clustering is reduced until
+    no edge is longer than the target (or the longest edge of objectMesh).
+    If decimation does not reduce the number of elements, the triangulated
+    objectMesh is returned.
+    '''
+    vertices = objectMesh.vertices
+    triangles, materials = triangulate(objectMesh.polygonVertices, objectMesh.polygonSizes, objectMesh.materials)
+    targetLength = float(speedOfSound)/maxFrequency/elementsPerWavelength/unitFactor
+    maxLength = max(targetLength, edgeLengths(vertices, triangles).max())
+
+    fineSlots = [ii for ii, slot in enumerate(objectMesh.materialNames) if slot in fineMaterials]
+    fineTriangles = triangles[np.isin(materials, fineSlots)]
+    isFine = np.zeros(len(vertices), dtype=bool)
+    if len(fineTriangles):
+        fineCorners = vertices[np.unique(fineTriangles)]
+        center = (fineCorners.min(axis=0)+fineCorners.max(axis=0))/2
+        radius = np.linalg.norm(fineCorners-center, axis=1).max()+fineRadius/unitFactor
+        isFine = np.linalg.norm(vertices-center, axis=1) <= radius
+        isFine[fineTriangles] = True
+
+    cellSize = targetLength
+    for iteration in range(20):
+        gradedVertices, gradedTriangles, kept = clusterVertices(vertices, triangles, isFine, cellSize)
+        if not len(gradedTriangles) or edgeLengths(gradedVertices, gradedTriangles).max() <= maxLength:
+            break
+        cellSize *= 0.8
+    if not len(gradedTriangles) or len(gradedTriangles) >= len(triangles):
+        gradedVertices, gradedTriangles, kept = vertices, triangles, np.arange(len(triangles))
+
+    return type(objectMesh)(name, gradedVertices, gradedTriangles, materials=materials[kept],
+                            materialNames=objectMesh.materialNames)
+
+
+def gradedMeshes(frequencies, ear='Both ears', reciprocity=True):
+    '''Return the names of the graded meshes with their upper frequency and fine materials
+
+    One mesh per ear (L: cores of the first ear, R: of the second) and upper
+    frequency in frequencies. In reciprocal calculations only the radiating
+    ear is kept fine.
+    '''
+    sides = {'Both ears': [('L', 'Left ear'), ('R', 'Right ear')],
+             'Left ear': [('L', 'Left ear')],
+             'Right ear': [('L', 'Right ear')]}[ear]
+    meshes = {}
+    for prefix, earName in sides:
+        fineMaterials = (earName,) if reciprocity else ('Left ear', 'Right ear')
+        for frequency in frequencies:
+            meshes["%s%d" % (prefix, frequency)] = (frequency, fineMaterials)
+    return meshes
+
+
+def gradeMeshes(reference, frequencies, ear='Both ears', reciprocity=True, speedOfSound=346.18,
+                unitFactor=1, elementsPerWavelength=6, fineRadius=0.02, names=None):
+    '''Return the graded L{maxobjfq}/R{maxobjfq} meshes of the Reference mesh (see gradedMeshes)
+
+    If names is given, only the meshes with these names are graded.
+    '''
+    meshes = []
+    for name, (frequency, fineMaterials) in gradedMeshes(frequencies, ear, reciprocity).items():
+        if names is None or name in names:
+            meshes.append(gradeMesh(reference, name, frequency, speedOfSound, unitFactor,
+                                    elementsPerWavelength, fineMaterials, fineRadius))
+    return meshes
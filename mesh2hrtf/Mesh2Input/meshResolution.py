@@ -0,0 +1,102 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+
+'''Resolution of an object mesh compared to the wavelength
+
+MeshResolution computes the edge lengths and element sizes of a mesh in one
+pass and from them the elements per wavelength at each frequency, the
+highest frequency the mesh supports and a recommendation (refine, decimate
+or limit maxFrequency). writeProject() checks the Reference mesh with it
+before any NC.inp is written.
+'''
+
+import numpy as np
+
+from .meshFiles import polygonAreas
+from .meshGrading import triangulate, edgeLengths
+
+
+class MeshResolution:
+    '''Edge length and element size statistics of objectMesh (in m)
+
+    The mesh supports frequencies up to speedOfSound/(elementsPerWavelength*L)
+    where L is the quantile of the edge lengths (default: 95 % of the edges
+    are short enough, the longest edges are usually at the neck or the
+    cutting plane).
+    '''
+
+    def __init__(self, objectMesh, speedOfSound=346.18, unitFactor=1, elementsPerWavelength=6, quantile=0.95):
+        self.speedOfSound = float(speedOfSound)
+        self.elementsPerWavelength = elementsPerWavelength
+        self.numElements = objectMesh.numElements
+        vertices = objectMesh.vertices*unitFactor
+        triangles = triangulate(objectMesh.polygonVertices, objectMesh.polygonSizes, objectMesh.materials)[0]
+        self.edgeLengths = edgeLengths(vertices, triangles).reshape(-1)
+        self.elementSizes = np.sqrt(polygonAreas(vertices, objectMesh.polygonVertices, objectMesh.polygonSizes))
+        self.edgeLength = float(np.quantile(self.edgeLengths, quantile))
+
+    @property
+    def maxFrequency(self):
+        '''Highest frequency (Hz) with elementsPerWavelength elements per wavelength'''
+        return self.speedOfSound/(self.elementsPerWavelength*self.edgeLength)
+
+    def elementsPerWavelengthAt(self, frequencies):
+        '''Return the number of elements per wavelength at each frequency'''
+        return self.speedOfSound/(np.asarray(frequencies, dtype=np.float64)*self.edgeLength)
+
+    def recommend(self, maxFrequency, frequencyStepSize=100):
+        '''Return a list of recommendations for a calculation up to maxFrequency
+
+        The mesh is too coarse if it does not support maxFrequency and
+        needlessly fine if it supports twice maxFrequency.
+        '''
+        recommendations = []
+        supported = int(self.maxFrequency//frequencyStepSize*frequencyStepSize)
+        if supported < maxFrequency:
+            targetLength = self.speedOfSound/(self.elementsPerWavelength*maxFrequency)
+            recommendations.append("Mesh too coarse for %d Hz: refine to edges of %.1f mm or limit maxFrequency to %d Hz" % (
+                maxFrequency, targetLength*1000, supported))
+        elif self.maxFrequency > 2*maxFrequency:
+            targetLength = self.speedOfSound/(self.elementsPerWavelength*maxFrequency)
+            numElements = int(self.numElements*(self.edgeLength/targetLength)**2)
+            recommendations.append("Mesh finer than needed for %d Hz: decimate to edges of %.1f mm (about %d instead of %d elements) or use mesh grading" % (
+                maxFrequency, targetLength*1000, numElements, self.numElements))
+        return recommendations
+
+    def report(self, frequencies, maxFrequency=None, frequencyStepSize=100):
+        '''Return the statistics, the elements per wavelength at frequencies and the recommendations as text'''
+        lines = []
+        fw = lines.append
+        for label, values in [("Edge length", self.edgeLengths), ("Element size", self.elementSizes)]:
+            fw("%s (mm): min %.2f, median %.2f, 95%% %.2f, max %.2f\n" % ((label,)+tuple(
+                np.quantile(values, [0, 0.5, 0.95, 1])*1000)))
+        fw("Elements per wavelength: %s\n" % ", ".join(
+            "%d Hz: %.1f" % (frequency, value) for frequency, value in zip(frequencies, self.elementsPerWavelengthAt(frequencies))))
+        fw("Highest frequency with %d elements per wavelength: %d Hz\n" % (self.elementsPerWavelength, self.maxFrequency))
+        if maxFrequency is not None:
+            for recommendation in self.recommend(maxFrequency, frequencyStepSize):
+                fw("%s.\n" % recommendation)
+        return "".join(lines)
+
+
+def reportFrequencies(maxFrequency):
+    '''Return the octave frequencies 1000, 2000, ... below maxFrequency and maxFrequency'''
+    frequencies = []
+    frequency = 1000
+    while frequency < maxFrequency:
+        frequencies.append(frequency)
+        frequency *= 2
+    return frequencies+[maxFrequency]
@@ -0,0 +1,107 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Pictures of the object meshes: content-addressed cache and background rendering
+
+The pictures of a project (Pictures/<azimuth>-<elevation>.png) are rendered
+by renderPictures.py inside Blender, either in the add-on or in a separate
+"blender -b" process started by startRenderJob after the project was
+written. They are stored in a cache keyed by the hash of the object meshes
+and the resolution and linked into the projects, so an unchanged model is
+never rendered twice.
+'''
+
+import os
+import sys
+import hashlib
+import subprocess
+import numpy as np
+
+from .evaluationGrids import deployFile
+
+# camera direction, camera rotation (Euler angles) and name (azimuth, elevation) of the pictures
+pi = np.pi
+renderViews = [([1, 0, 0], [pi/2, 0, pi/2], (0, 0)),
+               ([-1, 0, 0], [pi/2, 0, 3*pi/2], (180, 0)),
+               ([0, 1, 0], [pi/2, 0, pi], (90, 0)),
+               ([0, -1, 0], [3/2*pi, pi, pi], (270, 0)),
+               ([0.707, 0.707, 0], [pi/2, 0, 3/4*pi], (45, 0)),
+               ([-0.707, 0.707, 0], [pi/2, 0, 5/4*pi], (135, 0)),
+               ([0.707, -0.707, 0], [pi/2, 0, pi/4], (315, 0)),
+               ([-0.707, -0.707, 0], [pi/2, 0, -pi/4], (225, 0))]
+
+# width and height of the pictures
+resolutions = {'FULL': (1440, 1920), 'PREVIEW': (360, 480)}
+
+
+def pictureNames():
+    return ["%d-%d.png" % name for location, rotation, name in renderViews]
+
+
+def defaultPictureCachePath():
+    return os.path.join(os.path.expanduser("~"), ".mesh2hrtf", "Pictures")
+
+
+def pictureKey(objectMeshes, resolution='FULL'):
+    '''Return the cache key of the pictures of object meshes (ObjectMesh) at a resolution'''
+    key = hashlib.sha1()
+    key.update(repr((resolutions[resolution], renderViews)).encode("utf8"))
+    for objectMesh in sorted(objectMeshes, key=lambda objectMesh: objectMesh.name):
+        key.update(objectMesh.name.encode("utf8"))
+        for values in (objectMesh.vertices, objectMesh.polygonVertices, objectMesh.polygonSizes, objectMesh.materials):
+            key.update(np.ascontiguousarray(values).tobytes())
+    return "%s_%s" % (key.hexdigest(), resolution)
+
+
+def cachedPictures(key, cachePath=""):
+    '''Return the folder of the cached pictures of key, None if they were not rendered yet'''
+    picturePath = os.path.join(cachePath or defaultPictureCachePath(), key)
+    if all(os.path.isfile(os.path.join(picturePath, name)) for name in pictureNames()):
+        return picturePath
+    return None
+
+
+def deployPictures(picturePath, projectPath, deployment='HARDLINK'):
+    '''Link (or copy) the pictures in picturePath into <projectPath>/Pictures'''
+    targetPath = os.path.join(projectPath, "Pictures")
+    if not os.path.exists(targetPath):
+        os.mkdir(targetPath)
+    for name in pictureNames():
+        deployFile(os.path.join(picturePath, name), os.path.join(targetPath, name), deployment)
+
+
+def startRenderJob(blender, blendFile, projectPath, key, resolution='FULL', cachePath="", deployment='HARDLINK',
+                   temporaryBlendFile=False):
+    '''Start a detached Blender process that renders the pictures of blendFile and return it
+
+    The pictures are written to the cache and deployed to the project when
+    they are complete; the output of Blender is written to
+    <projectPath>/Pictures/render.log. A temporaryBlendFile (and its
+    folder) is deleted by the job.
+    '''
+    picturePath = os.path.join(os.path.abspath(cachePath or defaultPictureCachePath()), key)
+    logPath = os.path.join(projectPath, "Pictures")
+    if not os.path.exists(logPath):
+        os.mkdir(logPath)
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "renderPictures.py")
+    command = [blender, "-b", os.path.abspath(blendFile), "--python", script, "--",
+               picturePath, os.path.abspath(projectPath), resolution, deployment]+(["remove"] if temporaryBlendFile else [])
+    options = {}
+    if sys.platform.startswith("win"):
+        options['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options['start_new_session'] = True
+    with open(os.path.join(logPath, "render.log"), "w") as log:
+        return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, **options)
@@ -0,0 +1,95 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Render the pictures of the model in Blender (see pictures.py)
+
+Used by the add-on exportMesh2HRTF.py and as script of the background job:
+
+    blender -b "3d Model.blend" --python renderPictures.py -- <cache folder> <project> <FULL|PREVIEW> <deployment> [remove]
+
+With "remove", the .blend file (a temporary copy) and its folder, if empty, are deleted afterwards.
+'''
+
+import os
+import sys
+import shutil
+import importlib.util
+import bpy
+
+
+def importMesh2HRTF():
+    '''Import the mesh2hrtf package this script belongs to'''
+    module = sys.modules.get("mesh2hrtf")
+    if module is not None:
+        return module
+    programPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    spec = importlib.util.spec_from_file_location("mesh2hrtf", os.path.join(programPath, "__init__.py"),
+                                                  submodule_search_locations=[programPath])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["mesh2hrtf"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def renderPictures(picturePath, resolution='FULL', cameraRadius=400, lampRadius=300):
+    '''Render the pictures of the current scene into the folder picturePath and return it
+
+    The pictures are rendered into a temporary folder that is renamed when
+    all of them are written, so the cache never holds partial results.
+    '''
+    pictures = importMesh2HRTF().Mesh2Input.pictures
+    scene = bpy.data.scenes['Scene']
+    scene.render.pixel_aspect_x = 1
+    scene.render.pixel_aspect_y = 1
+    scene.render.resolution_x, scene.render.resolution_y = pictures.resolutions[resolution]
+    scene.render.resolution_percentage = 100
+    cam = bpy.data.objects['Camera']
+    lamp = bpy.data.objects['Lamp']
+
+    temp = "%s.%d.tmp" % (picturePath, os.getpid())
+    shutil.rmtree(temp, ignore_errors=True)
+    os.makedirs(temp)
+    for location, rotation, name in pictures.renderViews:
+        cam.location = [value*cameraRadius for value in location]
+        cam.rotation_euler = rotation
+        lamp.location = [value*lampRadius for value in location]
+        bpy.ops.render.render()
+        bpy.data.images['Render Result'].save_render(os.path.join(temp, "%d-%d.png" % name))
+    try:
+        os.rename(temp, picturePath)
+    except OSError:
+        # rendered by another export in the meantime
+        shutil.rmtree(temp, ignore_errors=True)
+    return picturePath
+
+
+def main(argv):
+    arguments = argv[argv.index("--")+1:]
+    picturePath, projectPath, resolution, deployment = arguments[:4]
+    try:
+        renderPictures(picturePath, resolution)
+        importMesh2HRTF().Mesh2Input.pictures.deployPictures(picturePath, projectPath, deployment)
+    finally:
+        if arguments[4:] == ["remove"]:
+            os.remove(bpy.data.filepath)
+            try:
+                os.rmdir(os.path.dirname(bpy.data.filepath))
+            except OSError:
+                pass
+    print("Pictures written to %s" % os.path.join(projectPath, "Pictures"))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
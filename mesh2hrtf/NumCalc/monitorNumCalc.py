@@ -0,0 +1,364 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Live progress of all NumCalc jobs (NumCalc/CPU_*_Core_*) of a project
+
+The NumCalc.txt of each job is read incrementally (only the bytes appended
+since the last update), be.out is only listed if it changed. Changes are
+detected with inotify (optional package inotify_simple) or by polling the
+file sizes. The state of all jobs and the projected finish time of the
+project are written to a JSON file (and optionally a CSV file) that other
+tools can read. In work queue projects (see workQueue.py) the progress of
+the folders that collect the results is taken from the queue state.
+
+    python -m mesh2hrtf.NumCalc.monitorNumCalc <project> [--interval 10] [--once]
+'''
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+import datetime
+
+from .numCalcLogs import stepPatterns, readNumCalcInput
+from .resourceEstimator import ResourceEstimator
+from .workQueue import WorkQueue
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+class JobProgress:
+    '''Progress of one NumCalc job, updated from the new lines of its NumCalc.txt
+
+    queued: the folder collects the results of work queue tasks, whose
+    status is set by updateQueue.
+    '''
+
+    def __init__(self, path, queued=False):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.frequencies = []
+        self.method = None
+        self.numBoundaryElements = None
+        self.inputStamp = None
+        self.resumed = False
+        self.queued = queued
+        # status of the work queue tasks of the folder
+        self.taskStatus = []
+        # read position in NumCalc.txt and the incomplete last line
+        self.offset = 0
+        self.partialLine = ""
+        self.logSize = None
+        self.lastStepEnd = None
+        self.currentStep = None
+        # (frequency, total time in seconds) of the finished steps
+        self.stepTimes = []
+        self.resultStamp = None
+        self.numResults = 0
+
+    @property
+    def numFinished(self):
+        if self.queued:
+            return self.taskStatus.count('DONE')
+        if self.resumed:
+            return self.numResults
+        return max(len(self.stepTimes), self.numResults)
+
+    @property
+    def status(self):
+        if self.queued:
+            if self.taskStatus and all(status in ('DONE', 'FAILED') for status in self.taskStatus):
+                return 'DONE'
+            if any(status in ('CLAIMED', 'DONE', 'FAILED') for status in self.taskStatus):
+                return 'RUNNING'
+            return 'PENDING'
+        if self.resumed:
+            return 'DONE'
+        if self.frequencies and self.numFinished >= len(self.frequencies):
+            return 'DONE'
+        if self.logSize or self.numResults:
+            return 'RUNNING'
+        return 'PENDING'
+
+    def updateQueue(self, taskStatus):
+        self.taskStatus = taskStatus
+
+    def updateInput(self):
+        # NC.inp.done lists the kept frequencies of a resumed job (see resumeNumCalc.py)
+        # or all frequencies of a work queue folder
+        for inputFile in (os.path.join(self.path, "NC.inp"), os.path.join(self.path, "NC.inp.done")):
+            try:
+                stat = os.stat(inputFile)
+                break
+            except OSError:
+                pass
+        else:
+            return
+        if self.inputStamp == (inputFile, stat.st_size, stat.st_mtime_ns):
+            return
+        self.inputStamp = (inputFile, stat.st_size, stat.st_mtime_ns)
+        self.resumed = inputFile.endswith(".done") and not self.queued
+        try:
+            numCalcInput = readNumCalcInput(inputFile)
+        except (OSError, ValueError, IndexError):
+            return
+        self.frequencies = numCalcInput['frequencies']
+        self.method = numCalcInput['method']
+        self.numBoundaryElements = numCalcInput['numBoundaryElements']
+
+    def updateLog(self):
+        '''Parse the lines appended to NumCalc.txt since the last call'''
+        logFile = os.path.join(self.path, "NumCalc.txt")
+        try:
+            stat = os.stat(logFile)
+        except OSError:
+            return
+        if stat.st_size < self.offset:
+            # NumCalc was restarted and the log rewritten
+            self.offset = 0
+            self.partialLine = ""
+            self.currentStep = None
+            self.stepTimes = []
+        if stat.st_size == self.offset:
+            self.logSize = stat.st_size
+            return
+        with open(logFile, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(stat.st_size-self.offset)
+        self.offset += len(data)
+        self.logSize = self.offset
+        lines = (self.partialLine+data.decode("utf8", errors="replace")).split("\n")
+        self.partialLine = lines.pop()
+        for line in lines:
+            self.parseLine(line, stat.st_mtime)
+
+    def parseLine(self, line, modificationTime):
+        for pattern, key in stepPatterns:
+            match = pattern.search(line)
+            if not match:
+                continue
+            if key is None:
+                self.currentStep = {'step': int(match.group(1)), 'frequency': float(match.group(2))}
+            elif key == 'totalTime' and self.currentStep is not None:
+                self.stepTimes.append((self.currentStep['frequency'], float(match.group(1))))
+                self.currentStep = None
+                self.lastStepEnd = modificationTime
+            break
+
+    def updateResults(self):
+        '''Count the be.N folders if be.out changed'''
+        try:
+            stat = os.stat(os.path.join(self.path, "be.out"))
+        except OSError:
+            self.numResults = 0
+            return
+        if self.resultStamp == stat.st_mtime_ns:
+            return
+        self.resultStamp = stat.st_mtime_ns
+        self.numResults = sum(1 for name in os.listdir(os.path.join(self.path, "be.out")) if name.startswith("be."))
+
+    def update(self):
+        self.updateInput()
+        self.updateLog()
+        self.updateResults()
+
+    def remainingTime(self, resourceEstimator, now):
+        '''Return the projected remaining run time in seconds (None if unknown)
+
+        The estimated run time of the remaining frequencies is scaled by the
+        ratio of the measured and the estimated time of the finished steps.
+        '''
+        if self.status == 'DONE':
+            return 0.
+        if self.method is None or not self.numBoundaryElements:
+            return None
+        estimate = lambda frequency: resourceEstimator.runTime(self.numBoundaryElements, self.method, frequency)
+        finished = set(frequency for frequency, totalTime in self.stepTimes)
+        remaining = sum(estimate(frequency) for frequency in self.frequencies if frequency not in finished)
+        measured = sum(totalTime for frequency, totalTime in self.stepTimes)
+        estimated = sum(estimate(frequency) for frequency, totalTime in self.stepTimes)
+        if measured > 0 and estimated > 0:
+            remaining *= measured/estimated
+        if self.lastStepEnd is not None and self.status == 'RUNNING':
+            # time already spent on the current step
+            remaining = max(remaining-(now-self.lastStepEnd), 0.)
+        return remaining
+
+    def state(self, resourceEstimator, now):
+        remaining = self.remainingTime(resourceEstimator, now)
+        return {'job': self.name,
+                'status': self.status,
+                'finished': self.numFinished,
+                'total': len(self.frequencies),
+                'currentFrequency': self.currentStep['frequency'] if self.currentStep else None,
+                'stepTimes': self.stepTimes,
+                'remainingTime': remaining}
+
+
+class ProjectMonitor:
+    '''Progress of all NumCalc jobs of a project'''
+
+    def __init__(self, projectPath, resourceEstimator=None):
+        self.projectPath = os.path.abspath(projectPath)
+        self.numCalcPath = os.path.join(self.projectPath, "NumCalc")
+        self.resourceEstimator = resourceEstimator or ResourceEstimator()
+        self.jobs = {}
+        self.folderStamp = None
+        self.inotify = None
+        self.watches = {}
+        if inotify_simple is not None:
+            self.inotify = inotify_simple.INotify()
+            flags = inotify_simple.flags
+            self.watchFlags = flags.MODIFY | flags.CREATE | flags.MOVED_TO | flags.DELETE
+            self.watches[self.inotify.add_watch(self.numCalcPath, self.watchFlags)] = None
+        self.queue = None
+        if os.path.isfile(os.path.join(self.numCalcPath, "Queue", "job.json")):
+            self.queue = WorkQueue(self.projectPath)
+
+    def findJobs(self):
+        '''Add the jobs of new CPU_x_Core_y folders (only if NumCalc/ changed)'''
+        stamp = os.stat(self.numCalcPath).st_mtime_ns
+        if stamp == self.folderStamp:
+            return
+        self.folderStamp = stamp
+        for name in os.listdir(self.numCalcPath):
+            if name not in self.jobs and re.match(r"CPU_\d+_Core_\d+$", name):
+                queued = self.queue is not None and any(task['folder'] == name for task in self.queue.tasks)
+                job = JobProgress(os.path.join(self.numCalcPath, name), queued)
+                self.jobs[name] = job
+                job.update()
+                if self.inotify is not None:
+                    self.watches[self.inotify.add_watch(job.path, self.watchFlags)] = name
+
+    def wait(self, timeout):
+        '''Wait for changes and return the names of the changed jobs (None: check all jobs)'''
+        if self.inotify is None:
+            time.sleep(timeout)
+            return None
+        changed = set()
+        for event in self.inotify.read(timeout=int(timeout*1000)):
+            name = self.watches.get(event.wd)
+            if name is None:
+                self.folderStamp = None
+            else:
+                changed.add(name)
+        return changed
+
+    def update(self, changed=None):
+        self.findJobs()
+        for name, job in self.jobs.items():
+            if changed is None or name in changed:
+                job.update()
+        if self.queue is not None:
+            # state.json is replaced atomically, it can be read without the lock
+            state = self.queue.readJSON("state.json")
+            for name, job in self.jobs.items():
+                if job.queued:
+                    job.updateQueue([state[task['id']]['status'] for task in self.queue.tasks if task['folder'] == name])
+
+    def sortedJobs(self):
+        key = lambda name: tuple(int(number) for number in re.findall(r"\d+", name))
+        return [self.jobs[name] for name in sorted(self.jobs, key=key)]
+
+    def state(self):
+        now = time.time()
+        jobs = [job.state(self.resourceEstimator, now) for job in self.sortedJobs()]
+        remaining = [job['remainingTime'] for job in jobs]
+        projectRemaining = None
+        if jobs and all(value is not None for value in remaining):
+            # the jobs run in parallel
+            projectRemaining = max(remaining)
+        return {'project': self.projectPath,
+                'time': datetime.datetime.fromtimestamp(now).isoformat(timespec='seconds'),
+                'jobsDone': sum(1 for job in jobs if job['status'] == 'DONE'),
+                'jobs': len(jobs),
+                'frequenciesDone': sum(job['finished'] for job in jobs),
+                'frequencies': sum(job['total'] for job in jobs),
+                'remainingTime': projectRemaining,
+                'finishTime': None if projectRemaining is None else
+                datetime.datetime.fromtimestamp(now+projectRemaining).isoformat(timespec='seconds'),
+                'cores': jobs}
+
+
+def writeState(state, jsonFile, csvFile=None):
+    '''Write the monitor state as JSON (and one row per core as CSV), replacing the files atomically'''
+    temp = jsonFile+".tmp"
+    with open(temp, "w") as file:
+        json.dump(state, file, indent=1)
+    os.replace(temp, jsonFile)
+    if csvFile:
+        temp = csvFile+".tmp"
+        with open(temp, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["job", "status", "finished", "total", "currentFrequency", "lastStepTime", "remainingTime"])
+            for job in state['cores']:
+                writer.writerow([job['job'], job['status'], job['finished'], job['total'],
+                                 "" if job['currentFrequency'] is None else job['currentFrequency'],
+                                 job['stepTimes'][-1][1] if job['stepTimes'] else "",
+                                 "" if job['remainingTime'] is None else round(job['remainingTime'])])
+        os.replace(temp, csvFile)
+
+
+def formatState(state, verbose=False):
+    '''Return a short progress report'''
+    lines = []
+    if verbose:
+        for job in state['cores']:
+            lastStep = " (last step %.0f s)" % job['stepTimes'][-1][1] if job['stepTimes'] else ""
+            lines.append("%-24s %-8s %5d/%-5d%s" % (job['job'], job['status'], job['finished'], job['total'], lastStep))
+    finish = "unknown"
+    if state['finishTime'] is not None:
+        finish = "%s (in %s)" % (state['finishTime'], datetime.timedelta(seconds=round(state['remainingTime'])))
+    lines.append("%s: %d/%d jobs done, %d/%d frequencies, projected finish %s" % (
+        state['time'], state['jobsDone'], state['jobs'], state['frequenciesDone'], state['frequencies'], finish))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor the NumCalc jobs of a Mesh2HRTF project")
+    parser.add_argument("project", help="project folder (containing NumCalc/CPU_*_Core_*)")
+    parser.add_argument("--interval", type=float, default=10., help="update interval in seconds")
+    parser.add_argument("--json", default=None, help="state file (default: <project>/NumCalc/progress.json)")
+    parser.add_argument("--csv", default=None, help="additional state file with one row per core")
+    parser.add_argument("--estimator", default=None, help="JSON file of a fitted ResourceEstimator")
+    parser.add_argument("--once", action="store_true", help="update once and exit")
+    parser.add_argument("--verbose", action="store_true", help="show every core")
+    args = parser.parse_args(argv)
+
+    resourceEstimator = None
+    if args.estimator:
+        resourceEstimator = ResourceEstimator.load(args.estimator)
+    monitor = ProjectMonitor(args.project, resourceEstimator)
+    jsonFile = args.json or os.path.join(monitor.numCalcPath, "progress.json")
+
+    changed = None
+    while True:
+        monitor.update(changed)
+        state = monitor.state()
+        writeState(state, jsonFile, args.csv)
+        print(formatState(state, args.verbose))
+        if args.once or (state['jobs'] and state['jobsDone'] == state['jobs']):
+            return 0
+        changed = monitor.wait(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
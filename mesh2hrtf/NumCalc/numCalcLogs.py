@@ -0,0 +1,146 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Reading of NumCalc input files (NC.inp) and logged statistics (NC.out)'''
+
+import os
+import re
+
+
+def readNumCalcInput(filename):
+    '''Return the method, the frequencies and the number of boundary elements of an NC.inp
+
+    The number of boundary elements is read from the header of the first
+    Elements.txt listed in the ELEMENTS block (the object mesh). 'nodeFiles'
+    and 'elementFiles' list the mesh files (object mesh first, then the
+    evaluation grids) relative to the folder of the NC.inp.
+    '''
+    with open(filename) as file:
+        lines = [line.strip() for line in file]
+
+    frequencies = []
+    method = None
+    nodeFiles = []
+    elementFiles = []
+    ii = 0
+    while ii < len(lines):
+        line = lines[ii]
+        if line == "## Load Frequency Curve":
+            numFrequencies = int(lines[ii+1].split()[1])-1
+            for row in lines[ii+3:ii+3+numFrequencies]:
+                frequencies.append(float(row.split()[1]))
+            ii += 3+numFrequencies
+            continue
+        if line == "## 1. Main Parameters I":
+            method = lines[ii+1].split()[7]
+        if line in ("NODES", "ELEMENTS"):
+            jj = ii+1
+            while not lines[jj].startswith("#"):
+                (nodeFiles if line == "NODES" else elementFiles).append(lines[jj])
+                jj += 1
+        ii += 1
+
+    numBoundaryElements = None
+    if elementFiles:
+        with open(os.path.join(os.path.dirname(filename), elementFiles[0])) as file:
+            numBoundaryElements = int(file.readline())
+
+    return {'method': method,
+            'frequencies': frequencies,
+            'numBoundaryElements': numBoundaryElements,
+            'nodeFiles': nodeFiles,
+            'elementFiles': elementFiles}
+
+
+def splitNumCalcInput(text):
+    '''Return the parts of an NC.inp before and after its frequency curve'''
+    start = text.index("## Controlparameter II\n")
+    end = text.index("##\n## 1. Main Parameters I")
+    return text[:start], text[end:]
+
+
+# lines of one frequency step in NC.out and NumCalc.txt -> key
+stepPatterns = [(re.compile(r"Step (\d+), Frequency = ([-+.\deE]+) Hz"), None),
+                (re.compile(r"Sum of nonzeros of the FMBEM matrices \.* = (\d+)"), 'nonzeros'),
+                (re.compile(r"CGS solver: number of iterations = (\d+)"), 'iterations'),
+                (re.compile(r"Assembling the equation system +: ([-+.\deE]+)"), 'assemblingTime'),
+                (re.compile(r"Solving the equation system +: ([-+.\deE]+)"), 'solvingTime'),
+                (re.compile(r"Post processing +: ([-+.\deE]+)"), 'postProcessingTime'),
+                (re.compile(r"Total +: ([-+.\deE]+)"), 'totalTime')]
+
+
+def iterNumCalcSteps(lines, info=None):
+    '''Yield the statistics of each frequency step from the lines of an NC.out or NumCalc.txt
+
+    Steps are dicts with 'step', 'frequency' and, if logged, 'nonzeros'
+    (FMM matrices, NC.out only), 'iterations' (NC.out only) and the times
+    in seconds; 'totalTime' is missing if the step did not finish. The
+    number of boundary elements and nodes (NC.out only) are stored in info.
+    '''
+    step = None
+    for line in lines:
+        if info is not None and line.startswith("Number of boundary elements"):
+            info['numBoundaryElements'] = int(line.split("=")[1])
+        elif info is not None and line.startswith("Number of nodes of the boundary elements"):
+            info['numBoundaryNodes'] = int(line.split("=")[1])
+        elif line.startswith(">> T I M E   S T A T I S T I C") or line.startswith("Time Statistic for the job"):
+            # job totals follow, NC.out uses the same labels as for the steps
+            break
+        for pattern, key in stepPatterns:
+            match = pattern.search(line)
+            if not match:
+                continue
+            if key is None:
+                if step is not None:
+                    yield step
+                step = {'step': int(match.group(1)), 'frequency': float(match.group(2))}
+            elif step is not None:
+                step[key] = float(match.group(1)) if key.endswith("Time") else int(match.group(1))
+            break
+    if step is not None:
+        yield step
+
+
+def numCalcOutputSteps(text):
+    '''Return the text of each frequency step of an NC.out (step number -> text)
+
+    The text of a step starts with its "Step N, Frequency = f Hz" line and
+    ends before the next step or the job totals.
+    '''
+    steps = {}
+    step = None
+    for line in text.splitlines(True):
+        if line.startswith(">> T I M E   S T A T I S T I C"):
+            break
+        match = stepPatterns[0][0].search(line)
+        if match:
+            step = int(match.group(1))
+            steps[step] = ""
+        if step is not None:
+            steps[step] += line
+    return steps
+
+
+def renumberStep(text, step):
+    '''Return the text of a frequency step of an NC.out with the step number replaced by step'''
+    return stepPatterns[0][0].sub(lambda match: "Step %d, Frequency = %s Hz" % (step, match.group(2)), text, count=1)
+
+
+def readNumCalcOutput(filename):
+    '''Return the mesh information and the statistics of each frequency step from an NC.out or NumCalc.txt'''
+    info = {'numBoundaryElements': None, 'numBoundaryNodes': None}
+    with open(filename, errors="replace") as file:
+        info['steps'] = list(iterNumCalcSteps(file, info))
+    return info
@@ -0,0 +1,53 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Checks of the NumCalc results of a job (be.out/be.N and fe.out/fe.N)'''
+
+import os
+
+
+def completedSteps(jobPath, numSteps):
+    '''Return the numbers of the steps (1 ... numSteps) with complete results
+
+    A step is complete if be.out/be.N has all files that any step of the job
+    has, each file ends with a line break and has the size of the largest
+    such file of the job (the files of all frequencies have the same
+    fixed-width format), and fe.out/fe.N/load ends with a line break.
+    '''
+    steps = [step for step in range(1, numSteps+1)
+             if os.path.isdir(os.path.join(jobPath, "be.out", "be.%d" % step))
+             and os.path.isdir(os.path.join(jobPath, "fe.out", "fe.%d" % step))]
+    sizes = {}
+    for step in steps:
+        for entry in os.scandir(os.path.join(jobPath, "be.out", "be.%d" % step)):
+            sizes[entry.name] = max(sizes.get(entry.name, 0), entry.stat().st_size)
+
+    def endsWithLineBreak(filename, size):
+        with open(filename, "rb") as file:
+            file.seek(size-1)
+            return file.read(1) == b"\n"
+
+    completed = []
+    for step in steps:
+        complete = True
+        for name, size in sizes.items():
+            filename = os.path.join(jobPath, "be.out", "be.%d" % step, name)
+            if not os.path.isfile(filename) or os.path.getsize(filename) != size or not endsWithLineBreak(filename, size):
+                complete = False
+                break
+        load = os.path.join(jobPath, "fe.out", "fe.%d" % step, "load")
+        if complete and os.path.isfile(load) and os.path.getsize(load) and endsWithLineBreak(load, os.path.getsize(load)):
+            completed.append(step)
+    return completed
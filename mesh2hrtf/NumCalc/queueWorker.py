@@ -0,0 +1,167 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Worker of the NumCalc work queue of a project (see workQueue.py)
+
+Each worker claims the next pending frequency, renders a single-frequency
+NC.inp into NumCalc/Task_<id>, runs NumCalc there and moves the result to
+be.out/be.N and fe.out/fe.N of the CPU_x_Core_y folder of the task and its
+step statistics to the NC.out there, i.e. the layout that Output2HRTF.m
+reads. Start as many workers on as many
+machines as desired; they stop when no task is left.
+
+    python -m mesh2hrtf.NumCalc.queueWorker <project> [--workers N] [--numcalc path]
+    python -m mesh2hrtf.NumCalc.queueWorker <project> --status
+'''
+
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import threading
+import subprocess
+
+from .workQueue import WorkQueue
+from .solveCache import SolveCache
+from .numCalcLogs import numCalcOutputSteps, renumberStep
+from ..Mesh2Input.exportProject import ExportPlan
+
+
+def moveResult(source, target):
+    '''Move a be.N/fe.N folder, replacing an older result'''
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    targetPath = os.path.dirname(target)
+    if not os.path.exists(targetPath):
+        os.makedirs(targetPath, exist_ok=True)
+    os.replace(source, target)
+
+
+class QueueWorker:
+    '''Solves tasks of a WorkQueue until no task is pending
+
+    Failed tasks are handed out again up to retries times; tasks claimed
+    more than staleTimeout seconds ago (None: never) are considered lost.
+    Solved frequencies are added to solveCache (SolveCache, optional).
+    '''
+
+    def __init__(self, queue, numCalc="NumCalc", retries=1, staleTimeout=None, name=None, solveCache=None,
+                 log=print):
+        self.queue = queue
+        self.numCalc = numCalc
+        self.retries = retries
+        self.staleTimeout = staleTimeout
+        self.solveCache = solveCache
+        self.name = name or "%s:%d" % (socket.gethostname(), os.getpid())
+        self.log = log
+        self.plan = ExportPlan.fromDict(queue.plan)
+        self.numSolved = 0
+
+    def solve(self, task):
+        '''Run NumCalc for one task and return True if it produced a result'''
+        numCalcPath = os.path.join(self.queue.projectPath, "NumCalc")
+        workPath = os.path.join(numCalcPath, "Task_%s" % task['id'])
+        if not os.path.exists(workPath):
+            os.mkdir(workPath)
+        with open(os.path.join(workPath, "NC.inp"), "w", encoding="utf8", newline="\n") as file:
+            file.write(self.plan.renderNumCalcInput(task['object'], task['ear'], [task['frequency']]))
+        with open(os.path.join(workPath, "NumCalc.txt"), "w") as output:
+            returnCode = subprocess.call([self.numCalc], cwd=workPath, stdout=output, stderr=subprocess.STDOUT)
+        if returnCode != 0 or not os.path.isdir(os.path.join(workPath, "be.out", "be.1")):
+            self.log("%s: task %s (%g Hz) failed with exit status %d" % (self.name, task['id'], task['frequency'], returnCode))
+            return False
+
+        if self.solveCache is not None:
+            self.solveCache.storeJob(workPath)
+        targetPath = os.path.join(numCalcPath, task['folder'])
+        moveResult(os.path.join(workPath, "be.out", "be.1"), os.path.join(targetPath, "be.out", "be.%d" % task['index']))
+        moveResult(os.path.join(workPath, "fe.out", "fe.1"), os.path.join(targetPath, "fe.out", "fe.%d" % task['index']))
+
+        # the NC.out of the folder collects the steps of all its tasks (read by Output2HRTF_Main.m)
+        if os.path.isfile(os.path.join(workPath, "NC.out")):
+            with open(os.path.join(workPath, "NC.out"), errors="replace") as file:
+                steps = numCalcOutputSteps(file.read())
+            with self.queue.lock():
+                with open(os.path.join(targetPath, "NC.out"), "a") as file:
+                    file.write("".join(renumberStep(text, task['index']) for text in steps.values()))
+        return True
+
+    def run(self):
+        '''Solve tasks until the queue has no pending task and return the number of solved tasks'''
+        while True:
+            task = self.queue.claim(self.name, self.staleTimeout)
+            if task is None:
+                return self.numSolved
+            startTime = time.time()
+            try:
+                success = self.solve(task)
+            except Exception as error:
+                # e.g. NumCalc not found: the task must not stay claimed
+                self.log("%s: task %s (%g Hz) failed: %s" % (self.name, task['id'], task['frequency'], error))
+                success = False
+            workPath = os.path.join(self.queue.projectPath, "NumCalc", "Task_%s" % task['id'])
+            log = None
+            if success:
+                with open(os.path.join(workPath, "NumCalc.txt"), errors="replace") as file:
+                    log = file.read()
+            self.queue.complete(task, self.name, success, time.time()-startTime, self.retries, log)
+            if success:
+                self.numSolved += 1
+                shutil.rmtree(workPath)
+
+
+def runWorkers(projectPath, numWorkers=1, log=print, **kwargs):
+    '''Run numWorkers QueueWorker threads (one NumCalc process each) and return the task counts'''
+    queue = WorkQueue(projectPath)
+    workers = []
+    for ii in range(numWorkers):
+        name = "%s:%d:%d" % (socket.gethostname(), os.getpid(), ii+1)
+        workers.append(QueueWorker(WorkQueue(projectPath), name=name, log=log, **kwargs))
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return queue.counts()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve the frequencies of a Mesh2HRTF work queue")
+    parser.add_argument("project", help="project folder (containing NumCalc/Queue)")
+    parser.add_argument("--numcalc", default="NumCalc", help="NumCalc executable")
+    parser.add_argument("--workers", type=int, default=1, help="number of NumCalc processes on this machine")
+    parser.add_argument("--retries", type=int, default=1, help="restarts of a failed frequency")
+    parser.add_argument("--stale-timeout", type=float, default=None,
+                        help="hand out frequencies again that were claimed more than this many seconds ago")
+    parser.add_argument("--cache", default=None, help="folder of the solve cache")
+    parser.add_argument("--status", action="store_true", help="print the number of tasks per status and exit")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        counts = WorkQueue(args.project).counts()
+    else:
+        solveCache = None
+        if args.cache:
+            solveCache = SolveCache(args.cache)
+        counts = runWorkers(args.project, args.workers, numCalc=args.numcalc, retries=args.retries,
+                            staleTimeout=args.stale_timeout, solveCache=solveCache)
+    print(", ".join("%d %s" % (counts[status], status.lower()) for status in ('DONE', 'CLAIMED', 'PENDING', 'FAILED')))
+    return 1 if counts['FAILED'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Memory and run time estimates of NumCalc per frequency step
+
+Both are modeled as k * N^b * (1 + f/1000 Hz)^c with the number of boundary
+elements N and the frequency f, separately for each method ('0' BEM,
+'1' SL-FMM, '4' ML-FMM). The default coefficients are rough values; fit
+them to the NC.out files of finished projects with fitResourceEstimator().
+'''
+
+import os
+import glob
+import json
+import numpy as np
+
+from .numCalcLogs import readNumCalcInput, readNumCalcOutput
+
+# bytes per nonzero of the FMM matrices (complex double and column index)
+bytesPerNonzero = 20
+# reference frequency of the model in Hz
+referenceFrequency = 1000.
+
+
+class ResourceEstimator:
+    '''Memory (bytes) and run time (seconds) of one NumCalc frequency step'''
+
+    # method -> (k, b, c)
+    defaultCoefficients = {
+        'memory': {'0': (16., 2., 0.),          # dense complex system matrix
+                   '1': (6000., 1.1, 0.7),
+                   '4': (6000., 1., 0.7)},
+        'runTime': {'0': (1e-6, 2., 0.5),
+                    '1': (2e-5, 1.5, 1.2),
+                    '4': (5e-5, 1.2, 1.5)}}
+
+    def __init__(self, coefficients=None):
+        self.coefficients = {'memory': dict(self.defaultCoefficients['memory']),
+                             'runTime': dict(self.defaultCoefficients['runTime'])}
+        if coefficients:
+            for quantity in coefficients:
+                for method, value in coefficients[quantity].items():
+                    self.coefficients[quantity][method] = tuple(value)
+
+    def evaluate(self, quantity, numElements, method, frequency):
+        k, b, c = self.coefficients[quantity][method]
+        return k*float(numElements)**b*(1+frequency/referenceFrequency)**c
+
+    def memory(self, numElements, method, frequency):
+        '''Estimated peak memory in bytes of NumCalc at one frequency'''
+        return self.evaluate('memory', numElements, method, frequency)
+
+    def runTime(self, numElements, method, frequency):
+        '''Estimated run time in seconds of one frequency step'''
+        return self.evaluate('runTime', numElements, method, frequency)
+
+    def costModel(self, numElements, method):
+        '''Return the run time as function of the frequency (cost for the frequency scheduler)'''
+        return lambda frequency: self.runTime(numElements, method, frequency)
+
+    def estimateCore(self, numElements, method, frequencies):
+        '''Return the peak memory (bytes) and the run time (seconds) of a core calculating frequencies'''
+        if not len(frequencies):
+            return 0., 0.
+        memory = max(self.memory(numElements, method, frequency) for frequency in frequencies)
+        runTime = sum(self.runTime(numElements, method, frequency) for frequency in frequencies)
+        return memory, runTime
+
+    def save(self, filename):
+        with open(filename, "w") as file:
+            json.dump(self.coefficients, file, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as file:
+            return cls(json.load(file))
+
+    @classmethod
+    def fit(cls, records, base=None):
+        '''Fit the coefficients to records (method, numElements, frequency, memory, runTime)
+
+        memory or runTime may be None if not logged. The element exponent b
+        is only fitted if the records contain different mesh sizes, otherwise
+        it is kept from base (default coefficients). Methods without records
+        keep the coefficients of base.
+        '''
+        estimator = cls(base.coefficients if base is not None else None)
+        for quantity, column in [('memory', 3), ('runTime', 4)]:
+            for method in sorted(set(record[0] for record in records)):
+                data = np.array([(record[1], record[2], record[column]) for record in records
+                                 if record[0] == method and record[column] is not None and record[column] > 0],
+                                dtype=np.float64).reshape(-1, 3)
+                if len(data) < 2:
+                    continue
+                logElements = np.log(data[:, 0])
+                logFrequency = np.log(1+data[:, 1]/referenceFrequency)
+                logValue = np.log(data[:, 2])
+                k, b, c = estimator.coefficients[quantity][method]
+                if len(np.unique(data[:, 0])) > 1:
+                    A = np.column_stack((np.ones(len(data)), logElements, logFrequency))
+                    logK, b, c = np.linalg.lstsq(A, logValue, rcond=None)[0]
+                else:
+                    A = np.column_stack((np.ones(len(data)), logFrequency))
+                    logK, c = np.linalg.lstsq(A, logValue-b*logElements, rcond=None)[0]
+                estimator.coefficients[quantity][method] = (float(np.exp(logK)), float(b), float(c))
+        return estimator
+
+
+def stepRecords(projectPath):
+    '''Return the records (method, numElements, frequency, memory, runTime) of all NC.out of a project
+
+    The memory is taken from the logged nonzeros of the FMM matrices (BEM:
+    dense system matrix), the run time is the total time of the step.
+    '''
+    records = []
+    for folder in sorted(glob.glob(os.path.join(projectPath, "NumCalc", "CPU_*_Core_*"))):
+        if not os.path.isfile(os.path.join(folder, "NC.out")) or not os.path.isfile(os.path.join(folder, "NC.inp")):
+            continue
+        method = readNumCalcInput(os.path.join(folder, "NC.inp"))['method']
+        output = readNumCalcOutput(os.path.join(folder, "NC.out"))
+        numElements = output['numBoundaryElements']
+        for step in output['steps']:
+            if 'totalTime' not in step:
+                # step not finished
+                continue
+            if method == '0':
+                memory = 16.*numElements**2
+            elif 'nonzeros' in step:
+                memory = float(bytesPerNonzero*step['nonzeros'])
+            else:
+                memory = None
+            records.append((method, numElements, step['frequency'], memory, step['totalTime']))
+    return records
+
+
+def fitResourceEstimator(projectPaths, filename=None):
+    '''Fit a ResourceEstimator to the NumCalc logs of finished projects and optionally save it as JSON'''
+    records = []
+    for projectPath in projectPaths:
+        records.extend(stepRecords(projectPath))
+    estimator = ResourceEstimator.fit(records)
+    if filename is not None:
+        estimator.save(filename)
+    return estimator
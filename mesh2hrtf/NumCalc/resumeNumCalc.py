@@ -0,0 +1,184 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Resume an interrupted project: solve only the frequencies without complete results
+
+For each NumCalc/CPU_x_Core_y folder listed in Output2HRTF.m, the complete
+results be.out/be.N and fe.out/fe.N are kept (renumbered to be.1 ... be.M)
+and its NC.inp is renamed to NC.inp.done, listing the kept frequencies.
+The missing frequencies are balanced over the cores available now, which
+are written as new folders CPU_<n+1>_Core_1 ... after the n existing CPUs,
+and added to cpusAndCores in Output2HRTF.m. Folders without NC.inp are
+skipped by StartNumCalc and runNumCalc.py. Stop all NumCalc processes of
+the project before resuming.
+
+    python -m mesh2hrtf.NumCalc.resumeNumCalc <project> --cpus 2 --cores 8
+'''
+
+import os
+import sys
+import shutil
+import argparse
+
+from .numCalcLogs import readNumCalcInput, splitNumCalcInput, numCalcOutputSteps, renumberStep
+from .numCalcResults import completedSteps
+from .resourceEstimator import ResourceEstimator
+from ..Mesh2Input.exportProject import renderFrequencyCurve, matlabMatrix, readMatlabMatrix
+from ..Mesh2Input.frequencyScheduling import scheduleLongestFirst
+
+
+def keepCompleted(jobPath, numSteps, completed):
+    '''Renumber the complete results to be.1/fe.1 ... and delete incomplete ones
+
+    NC.out keeps the statistics of the complete steps only, renumbered in
+    the same way (read by Output2HRTF_Main.m).
+    '''
+    for kind in ("be", "fe"):
+        for step in range(1, numSteps+1):
+            if step not in completed:
+                shutil.rmtree(os.path.join(jobPath, "%s.out" % kind, "%s.%d" % (kind, step)), ignore_errors=True)
+        for index, step in enumerate(completed):
+            if step != index+1:
+                os.rename(os.path.join(jobPath, "%s.out" % kind, "%s.%d" % (kind, step)),
+                          os.path.join(jobPath, "%s.out" % kind, "%s.%d" % (kind, index+1)))
+
+    outputFile = os.path.join(jobPath, "NC.out")
+    if os.path.isfile(outputFile):
+        with open(outputFile, errors="replace") as file:
+            steps = numCalcOutputSteps(file.read())
+        with open(outputFile, "w", encoding="utf8", newline="\n") as file:
+            file.write("".join(renumberStep(steps[step], index) for index, step in enumerate(completed, 1) if step in steps))
+
+
+def resumeProject(projectPath, numCPUs, numCoresPerCPU, resourceEstimator=None,
+                  scheduler=scheduleLongestFirst, log=print):
+    '''Write NumCalc jobs for the missing frequencies of a project
+
+    The missing frequencies of each ear (and object mesh) are distributed
+    over numCPUs x numCoresPerCPU new cores by scheduler using the run time
+    estimated by resourceEstimator. Returns the names of the new folders.
+    '''
+    numCalcPath = os.path.join(projectPath, "NumCalc")
+    resourceEstimator = resourceEstimator or ResourceEstimator()
+    with open(os.path.join(projectPath, "Output2HRTF.m")) as file:
+        output2HRTF = file.read()
+    cpusAndCores, cpusAndCoresMatch = readMatlabMatrix(output2HRTF, "cpusAndCores")
+    objectNames, objectNamesMatch = readMatlabMatrix(output2HRTF, "objectMeshes")
+
+# ------------------------ Keep complete results -------------------------------
+    # (ear, NC.inp without frequencies) -> missing frequencies and cost model
+    groups = {}
+    numFrequencies = 0
+    numCompleted = 0
+    for cpu, row in enumerate(cpusAndCores, 1):
+        for core, ear in enumerate(row, 1):
+            jobPath = os.path.join(numCalcPath, "CPU_%d_Core_%d" % (cpu, core))
+            inputFile = os.path.join(jobPath, "NC.inp")
+            if not ear or not os.path.isfile(inputFile):
+                continue
+            numCalcInput = readNumCalcInput(inputFile)
+            frequencies = numCalcInput['frequencies']
+            completed = completedSteps(jobPath, len(frequencies))
+            keepCompleted(jobPath, len(frequencies), completed)
+            numFrequencies += len(frequencies)
+            numCompleted += len(completed)
+
+            with open(inputFile) as file:
+                before, after = splitNumCalcInput(file.read())
+            key = (ear, objectNames[cpu-1][core-1], before, after)
+            if key not in groups:
+                groups[key] = ([], resourceEstimator.costModel(numCalcInput['numBoundaryElements'], numCalcInput['method']))
+            groups[key][0].extend(frequency for step, frequency in enumerate(frequencies, 1) if step not in completed)
+
+            keptFrequencies = [frequencies[step-1] for step in completed]
+            with open(os.path.join(jobPath, "NC.inp.done"), "w", encoding="utf8", newline="\n") as file:
+                file.write(before+renderFrequencyCurve(keptFrequencies)+after if keptFrequencies else before+after)
+            os.remove(inputFile)
+            if not keptFrequencies:
+                cpusAndCores[cpu-1][core-1] = 0
+                objectNames[cpu-1][core-1] = ""
+
+    groups = dict((key, group) for key, group in groups.items() if group[0])
+    numMissing = sum(len(group[0]) for group in groups.values())
+    log("%d of %d frequencies complete, %d missing" % (numCompleted, numFrequencies, numMissing))
+
+# ------------------------ Distribute the missing frequencies ------------------
+    workers = [(cpu, core) for cpu in range(len(cpusAndCores)+1, len(cpusAndCores)+numCPUs+1)
+               for core in range(1, numCoresPerCPU+1)]
+    if len(workers) < len(groups):
+        raise Exception("Error, at least %d cores are needed to resume the project" % len(groups))
+
+    # at least one core per group, the others go to the group with the highest cost per core
+    totalCosts = dict((key, sum(group[1](frequency) for frequency in group[0])) for key, group in groups.items())
+    numWorkers = dict((key, 1) for key in groups)
+    for ii in range(len(workers)-len(groups) if groups else 0):
+        key = max(groups, key=lambda key: totalCosts[key]/numWorkers[key])
+        numWorkers[key] += 1
+
+    if groups:
+        numColumns = max(len(cpusAndCores[0]), numCoresPerCPU)
+        cpusAndCores = [row+[0]*(numColumns-len(row)) for row in cpusAndCores]+[[0]*numColumns for cpu in range(numCPUs)]
+        objectNames = [row+[""]*(numColumns-len(row)) for row in objectNames]+[[""]*numColumns for cpu in range(numCPUs)]
+
+    newFolders = []
+    first = 0
+    for key, (frequencies, cost) in groups.items():
+        ear, objectName, before, after = key
+        groupWorkers = workers[first:first+numWorkers[key]]
+        first += numWorkers[key]
+        assignments = scheduler(sorted(frequencies), len(groupWorkers), cost)[0]
+        for (cpu, core), tmp in zip(groupWorkers, assignments):
+            if not tmp:
+                continue
+            jobPath = os.path.join(numCalcPath, "CPU_%d_Core_%d" % (cpu, core))
+            if not os.path.exists(jobPath):
+                os.mkdir(jobPath)
+            with open(os.path.join(jobPath, "NC.inp"), "w", encoding="utf8", newline="\n") as file:
+                file.write(before+renderFrequencyCurve(tmp)+after)
+            cpusAndCores[cpu-1][core-1] = ear
+            objectNames[cpu-1][core-1] = objectName
+            newFolders.append("CPU_%d_Core_%d" % (cpu, core))
+
+# ------------------------ Update Output2HRTF.m --------------------------------
+    output2HRTF = (output2HRTF[:cpusAndCoresMatch.start()]+matlabMatrix("cpusAndCores", cpusAndCores, "%i", "[]").rstrip("\n")
+                   + output2HRTF[cpusAndCoresMatch.end():objectNamesMatch.start()]
+                   + matlabMatrix("objectMeshes", objectNames, "'%s'", "{}").rstrip("\n")+output2HRTF[objectNamesMatch.end():])
+    with open(os.path.join(projectPath, "Output2HRTF.m"), "w") as file:
+        file.write(output2HRTF)
+
+    if newFolders:
+        firstCPU = len(cpusAndCores)-numCPUs+1
+        log("%d missing frequencies written to CPU_%d ... CPU_%d (start with: StartNumCalc <project> %d %d %d)" % (
+            numMissing, firstCPU, len(cpusAndCores), firstCPU, len(cpusAndCores), 1-firstCPU))
+    return newFolders
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write NumCalc jobs for the missing frequencies of a Mesh2HRTF project")
+    parser.add_argument("project", help="project folder")
+    parser.add_argument("--cpus", type=int, default=1, help="number of CPUs (machines) available now")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1, help="number of cores per CPU available now")
+    parser.add_argument("--estimator", default=None, help="JSON file of a fitted ResourceEstimator")
+    args = parser.parse_args(argv)
+
+    resourceEstimator = None
+    if args.estimator:
+        resourceEstimator = ResourceEstimator.load(args.estimator)
+    resumeProject(args.project, args.cpus, args.cores, resourceEstimator)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
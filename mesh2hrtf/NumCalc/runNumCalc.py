@@ -0,0 +1,268 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Run all NumCalc jobs (NumCalc/CPU_*_Core_*) of a project on the local machine
+
+The jobs are started in a bounded pool of NumCalc processes. A job is only
+started if the load average leaves a free core, enough memory is free and
+the estimated memory of the running jobs stays within the memory budget.
+Crashed jobs are restarted and a summary is printed at the end.
+
+    python -m mesh2hrtf.NumCalc.runNumCalc <project> [--jobs N] [--numcalc path]
+'''
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+from .numCalcLogs import readNumCalcInput
+from .resourceEstimator import ResourceEstimator
+from .solveCache import SolveCache
+
+
+class NumCalcJob:
+    '''One NumCalc/CPU_x_Core_y folder and its run state'''
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.status = 'PENDING'     # PENDING, RUNNING, DONE, FAILED or REFUSED
+        self.attempts = 0
+        self.returnCode = None
+        self.startTime = None
+        self.runTime = 0.
+        self.process = None
+        # estimated peak memory in bytes
+        self.memory = 0.
+
+
+def findJobs(projectPath):
+    '''Return the jobs of all NumCalc/CPU_x_Core_y folders with an NC.inp, sorted by CPU and core'''
+    numCalcPath = os.path.join(projectPath, "NumCalc")
+    jobs = []
+    for name in os.listdir(numCalcPath):
+        match = re.match(r"CPU_(\d+)_Core_(\d+)$", name)
+        if match and os.path.isfile(os.path.join(numCalcPath, name, "NC.inp")):
+            jobs.append(((int(match.group(1)), int(match.group(2))), NumCalcJob(os.path.join(numCalcPath, name))))
+    return [job for key, job in sorted(jobs, key=lambda item: item[0])]
+
+
+def availableMemory():
+    '''Return the available memory in bytes (None if unknown)'''
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    return None
+
+
+def freeCores():
+    '''Return the number of cores not used according to the 1 minute load average (None if unknown)'''
+    try:
+        return os.cpu_count()-os.getloadavg()[0]
+    except (AttributeError, OSError, TypeError):
+        return None
+
+
+class NumCalcRunner:
+    '''Bounded pool of local NumCalc processes
+
+    maxJobs is the maximum number of concurrent NumCalc processes (default:
+    number of cores). A new job is started only if at least minFreeMemory
+    bytes are available and, with checkLoad, the load average leaves a free
+    core. With a memoryBudget (bytes), the memory of each job is estimated
+    with resourceEstimator and jobs are only started while the estimates of
+    the running jobs fit into the budget; jobs that do not fit alone are
+    refused. Jobs that exit with an error are restarted up to retries times.
+    With a solveCache (SolveCache), jobs whose frequencies are all cached
+    are not run and the results of finished jobs are added to the cache.
+    '''
+
+    def __init__(self, numCalc="NumCalc", maxJobs=None, minFreeMemory=0, checkLoad=True,
+                 retries=1, pollInterval=1., memoryBudget=0, resourceEstimator=None, solveCache=None,
+                 log=print):
+        self.numCalc = numCalc
+        self.maxJobs = maxJobs or os.cpu_count() or 1
+        self.minFreeMemory = minFreeMemory
+        self.memoryBudget = memoryBudget
+        self.resourceEstimator = resourceEstimator or ResourceEstimator()
+        self.checkLoad = checkLoad
+        self.retries = retries
+        self.pollInterval = pollInterval
+        self.solveCache = solveCache
+        self.log = log
+
+    def estimate(self, job):
+        '''Set the estimated peak memory of a job from its NC.inp'''
+        try:
+            numCalcInput = readNumCalcInput(os.path.join(job.path, "NC.inp"))
+            job.memory = self.resourceEstimator.estimateCore(numCalcInput['numBoundaryElements'], numCalcInput['method'],
+                                                             numCalcInput['frequencies'])[0]
+        except (OSError, ValueError, IndexError, KeyError, TypeError):
+            job.memory = 0.
+
+    def admit(self, job, running):
+        '''Return True if job can be started next to the running jobs'''
+        if running >= self.maxJobs:
+            return False
+        if self.memoryBudget:
+            runningMemory = sum(other.memory for other in self.jobs if other.status == 'RUNNING')
+            if runningMemory+job.memory > self.memoryBudget:
+                return False
+        # the first job is always started so that the run cannot stall
+        if running == 0:
+            return True
+        memory = availableMemory()
+        if memory is not None and memory < self.minFreeMemory:
+            return False
+        if self.checkLoad:
+            # jobs started within the last minute are not in the load average yet
+            cores = freeCores()
+            if cores is not None and cores-self.recentlyStarted() < 1:
+                return False
+        return True
+
+    def recentlyStarted(self):
+        now = time.time()
+        return sum(1 for job in self.jobs if job.status == 'RUNNING' and now-job.startTime < 60)
+
+    def start(self, job):
+        job.attempts += 1
+        job.status = 'RUNNING'
+        job.startTime = time.time()
+        with open(os.path.join(job.path, "NumCalc.txt"), "w") as output:
+            job.process = subprocess.Popen([self.numCalc], cwd=job.path, stdout=output,
+                                           stderr=subprocess.STDOUT)
+        self.log("%s: started (attempt %d)" % (job.name, job.attempts))
+
+    def finish(self, job, returnCode):
+        job.returnCode = returnCode
+        job.runTime += time.time()-job.startTime
+        job.process = None
+        if returnCode == 0:
+            job.status = 'DONE'
+            self.log("%s: done" % job.name)
+            if self.solveCache is not None:
+                self.solveCache.storeJob(job.path)
+        elif job.attempts <= self.retries:
+            job.status = 'PENDING'
+            self.log("%s: exit status %d, retrying" % (job.name, returnCode))
+        else:
+            job.status = 'FAILED'
+            self.log("%s: failed with exit status %d" % (job.name, returnCode))
+
+    def run(self, jobs):
+        '''Run the jobs and return them with their final status'''
+        self.jobs = jobs
+        if self.solveCache is not None:
+            for job in jobs:
+                if self.solveCache.materializeJob(job.path):
+                    job.status = 'DONE'
+                    self.log("%s: results taken from the solve cache" % job.name)
+        if self.memoryBudget:
+            for job in jobs:
+                if job.status == 'DONE':
+                    continue
+                self.estimate(job)
+                if job.memory > self.memoryBudget:
+                    job.status = 'REFUSED'
+                    self.log("%s: refused, estimated memory %.1f GB exceeds the memory budget" % (job.name, job.memory/1024**3))
+        try:
+            while True:
+                for job in jobs:
+                    if job.status == 'RUNNING':
+                        returnCode = job.process.poll()
+                        if returnCode is not None:
+                            self.finish(job, returnCode)
+
+                pending = [job for job in jobs if job.status == 'PENDING']
+                running = sum(1 for job in jobs if job.status == 'RUNNING')
+                if not pending and not running:
+                    break
+                for job in pending:
+                    if running >= self.maxJobs:
+                        break
+                    if self.admit(job, running):
+                        self.start(job)
+                        running += 1
+
+                time.sleep(self.pollInterval)
+        except KeyboardInterrupt:
+            for job in jobs:
+                if job.status == 'RUNNING':
+                    job.process.terminate()
+                    self.finish(job, job.process.wait())
+            raise
+        return jobs
+
+
+def summary(jobs):
+    '''Return a table with the status, attempts, exit status and run time of all jobs'''
+    lines = ["%-24s %-8s %8s %6s %10s" % ("Job", "Status", "Attempts", "Exit", "Time (s)")]
+    for job in jobs:
+        lines.append("%-24s %-8s %8d %6s %10.1f" % (job.name, job.status, job.attempts,
+                                                     "" if job.returnCode is None else job.returnCode, job.runTime))
+    numDone = sum(1 for job in jobs if job.status == 'DONE')
+    lines.append("%d of %d jobs done, %d failed, %d refused" % (numDone, len(jobs), sum(1 for job in jobs if job.status == 'FAILED'),
+                                                                 sum(1 for job in jobs if job.status == 'REFUSED')))
+    return "\n".join(lines)
+
+
+def runProject(projectPath, **kwargs):
+    '''Run all NumCalc jobs of a project (see NumCalcRunner for the options) and print a summary'''
+    jobs = NumCalcRunner(**kwargs).run(findJobs(projectPath))
+    print(summary(jobs))
+    return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the NumCalc jobs of a Mesh2HRTF project on this machine")
+    parser.add_argument("project", help="project folder (containing NumCalc/CPU_*_Core_*)")
+    parser.add_argument("--numcalc", default="NumCalc", help="NumCalc executable (default: NumCalc)")
+    parser.add_argument("--jobs", type=int, default=None, help="maximum number of parallel jobs (default: number of cores)")
+    parser.add_argument("--min-free-memory", type=float, default=0., help="free memory in GB required to start a job")
+    parser.add_argument("--no-load-check", action="store_true", help="do not wait for free cores (load average)")
+    parser.add_argument("--retries", type=int, default=1, help="restarts of crashed jobs")
+    parser.add_argument("--memory-budget", type=float, default=0., help="memory budget in GB for the estimated memory of the running jobs")
+    parser.add_argument("--estimator", default=None, help="JSON file of a fitted ResourceEstimator")
+    parser.add_argument("--cache", default=None, help="folder of the solve cache")
+    args = parser.parse_args(argv)
+
+    resourceEstimator = None
+    if args.estimator:
+        resourceEstimator = ResourceEstimator.load(args.estimator)
+    solveCache = None
+    if args.cache:
+        solveCache = SolveCache(args.cache)
+    jobs = runProject(args.project, numCalc=args.numcalc, maxJobs=args.jobs,
+                      minFreeMemory=args.min_free_memory*1024**3, checkLoad=not args.no_load_check,
+                      retries=args.retries, memoryBudget=args.memory_budget*1024**3,
+                      resourceEstimator=resourceEstimator, solveCache=solveCache)
+    return 0 if all(job.status == 'DONE' for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
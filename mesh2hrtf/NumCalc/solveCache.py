@@ -0,0 +1,163 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Cross-project cache of solved frequencies
+
+A frequency is identified by the SHA-256 of its NC.inp without date, title
+and frequency curve, in which the mesh files (object mesh and evaluation
+grids) are replaced by the hashes of their content, i.e. by the meshes,
+the boundary conditions, the evaluation grids, the speed of sound, the
+density and the method, together with the frequency. NumCalc evaluates all
+grids of a project in one solve, so the key covers the complete set of
+evaluation grids.
+
+The cache holds the result folders be.N and fe.N of each frequency in
+<cachePath>/<key[:2]>/<key>/be and fe and the statistics of its step from
+NC.out in NC.out (read by Output2HRTF_Main.m). Results are stored and deployed as
+hard links (copies across file systems) and must not be edited in place.
+'''
+
+import os
+import shutil
+import hashlib
+
+from .numCalcLogs import readNumCalcInput, splitNumCalcInput, numCalcOutputSteps, renumberStep
+from .numCalcResults import completedSteps
+from ..Mesh2Input.evaluationGrids import deployFile
+
+
+class SolveCache:
+    '''Results of single frequencies, shared by all projects'''
+
+    def __init__(self, path, deployment='HARDLINK'):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.deployment = deployment
+        # file name -> (size, modification time, SHA-256)
+        self.fileHashes = {}
+
+    def fileHash(self, filename):
+        stat = os.stat(filename)
+        cached = self.fileHashes.get(filename)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        self.fileHashes[filename] = (stat.st_size, stat.st_mtime_ns, digest.hexdigest())
+        return digest.hexdigest()
+
+    def inputKey(self, text, jobPath):
+        '''Return the key of an NC.inp (text) without its frequencies
+
+        The mesh files are resolved relative to jobPath (the folder of the
+        NC.inp), which need not exist.
+        '''
+        before, after = splitNumCalcInput(text)
+        lines = [line for line in before.split("\n") if line.startswith("Mesh2HRTF ")]
+        lines.append(before[before.index("## Controlparameter I\n"):])
+        meshFiles = False
+        for line in after.split("\n"):
+            if line in ("NODES", "ELEMENTS"):
+                meshFiles = True
+            elif line.startswith("#"):
+                meshFiles = False
+            elif meshFiles:
+                line = self.fileHash(os.path.normpath(os.path.join(jobPath, line)))
+            lines.append(line)
+        return hashlib.sha256("\n".join(lines).encode("utf8")).hexdigest()
+
+    @staticmethod
+    def frequencyKey(inputKey, frequency):
+        # the frequency as written to the NC.inp
+        return hashlib.sha256(("%s %fe+04" % (inputKey, frequency/10000)).encode("utf8")).hexdigest()
+
+    def jobKeys(self, jobPath, inputFile="NC.inp"):
+        '''Return the frequencies of a NumCalc job and their keys'''
+        with open(os.path.join(jobPath, inputFile)) as file:
+            inputKey = self.inputKey(file.read(), jobPath)
+        frequencies = readNumCalcInput(os.path.join(jobPath, inputFile))['frequencies']
+        return [(frequency, self.frequencyKey(inputKey, frequency)) for frequency in frequencies]
+
+    def entryPath(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def contains(self, key):
+        return os.path.isdir(self.entryPath(key))
+
+    def deployFolder(self, source, target):
+        if not os.path.exists(target):
+            os.makedirs(target)
+        for name in os.listdir(source):
+            deployFile(os.path.join(source, name), os.path.join(target, name), self.deployment)
+
+    def store(self, key, bePath, fePath, stepOutput=""):
+        '''Add the result folders be.N and fe.N and the NC.out text of one frequency (no-op if cached)'''
+        entryPath = self.entryPath(key)
+        if os.path.isdir(entryPath):
+            return
+        temp = "%s.%d.tmp" % (entryPath, os.getpid())
+        self.deployFolder(bePath, os.path.join(temp, "be"))
+        self.deployFolder(fePath, os.path.join(temp, "fe"))
+        if stepOutput:
+            with open(os.path.join(temp, "NC.out"), "w") as file:
+                file.write(stepOutput)
+        try:
+            os.rename(temp, entryPath)
+        except OSError:
+            # stored by another process meanwhile
+            shutil.rmtree(temp, ignore_errors=True)
+
+    def materialize(self, key, bePath, fePath):
+        '''Deploy the cached results of one frequency as the folders bePath (be.N) and fePath (fe.N)
+
+        Returns the NC.out text of the step ("" for entries stored without).
+        '''
+        entryPath = self.entryPath(key)
+        for path in (bePath, fePath):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        self.deployFolder(os.path.join(entryPath, "be"), bePath)
+        self.deployFolder(os.path.join(entryPath, "fe"), fePath)
+        if not os.path.isfile(os.path.join(entryPath, "NC.out")):
+            return ""
+        with open(os.path.join(entryPath, "NC.out")) as file:
+            return file.read()
+
+    def storeJob(self, jobPath):
+        '''Add the complete results of a NumCalc job and return their number'''
+        keys = self.jobKeys(jobPath)
+        completed = completedSteps(jobPath, len(keys))
+        steps = {}
+        if os.path.isfile(os.path.join(jobPath, "NC.out")):
+            with open(os.path.join(jobPath, "NC.out"), errors="replace") as file:
+                steps = numCalcOutputSteps(file.read())
+        for step in completed:
+            self.store(keys[step-1][1], os.path.join(jobPath, "be.out", "be.%d" % step),
+                       os.path.join(jobPath, "fe.out", "fe.%d" % step), steps.get(step, ""))
+        return len(completed)
+
+    def materializeJob(self, jobPath):
+        '''Deploy the results of a NumCalc job if all its frequencies are cached, return True on success'''
+        keys = self.jobKeys(jobPath)
+        if not keys or not all(self.contains(key) for frequency, key in keys):
+            return False
+        stepOutputs = []
+        for step, (frequency, key) in enumerate(keys, 1):
+            stepOutputs.append(renumberStep(self.materialize(key, os.path.join(jobPath, "be.out", "be.%d" % step),
+                                                             os.path.join(jobPath, "fe.out", "fe.%d" % step)), step))
+        with open(os.path.join(jobPath, "NC.out"), "w") as file:
+            file.write("".join(stepOutputs))
+        return True
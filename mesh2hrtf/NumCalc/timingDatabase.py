@@ -0,0 +1,203 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Columnar database of the NumCalc timings of all frequency steps of many projects
+
+Each row is one frequency step of one NumCalc job (NumCalc/CPU_x_Core_y) with
+its timings from NumCalc.txt, the method and mesh size from NC.inp and, if
+available, the FMM nonzeros and solver iterations from NC.out. The columns
+are stored as NumPy arrays in a single compressed .npz file. Jobs whose log
+files did not change since the last update are not parsed again.
+
+    python -m mesh2hrtf.NumCalc.timingDatabase timings.npz <project> [<project> ...]
+'''
+
+import os
+import re
+import sys
+import json
+import numpy as np
+
+from .numCalcLogs import iterNumCalcSteps, readNumCalcInput, readNumCalcOutput
+from .resourceEstimator import bytesPerNonzero
+
+# column name -> dtype, missing values are -1 (integers) and NaN (floats)
+columnTypes = [('project', str),
+               ('job', str),
+               ('step', np.int64),
+               ('frequency', np.float64),
+               ('method', str),
+               ('numBoundaryElements', np.int64),
+               ('numBoundaryNodes', np.int64),
+               ('assemblingTime', np.float64),
+               ('solvingTime', np.float64),
+               ('postProcessingTime', np.float64),
+               ('totalTime', np.float64),
+               ('nonzeros', np.int64),
+               ('iterations', np.int64),
+               ('logTime', np.float64)]
+
+
+def missingValue(dtype):
+    if dtype is str:
+        return ""
+    if dtype is np.int64:
+        return -1
+    return np.nan
+
+
+class TimingDatabase:
+    '''NumCalc timings of all frequency steps, stored column by column'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.columns = dict((name, np.array([], dtype=dtype)) for name, dtype in columnTypes)
+        # log file -> [size, modification time] when it was parsed
+        self.sources = {}
+        if os.path.isfile(filename):
+            self.load()
+
+    def __len__(self):
+        return len(self.columns['step'])
+
+    def load(self):
+        with np.load(self.filename, allow_pickle=False) as data:
+            for name, dtype in columnTypes:
+                self.columns[name] = data[name]
+            self.sources = json.loads(str(data['sources']))
+
+    def save(self):
+        temp = self.filename+".tmp.npz"
+        np.savez_compressed(temp, sources=np.array(json.dumps(self.sources)), **self.columns)
+        os.replace(temp, self.filename)
+
+    def removeJob(self, project, job):
+        keep = ~((self.columns['project'] == project) & (self.columns['job'] == job))
+        for name in self.columns:
+            self.columns[name] = self.columns[name][keep]
+
+    def addJob(self, project, jobPath):
+        '''Parse the logs of one NumCalc job and replace its rows; return the number of steps'''
+        job = os.path.basename(os.path.normpath(jobPath))
+        logFile = os.path.join(jobPath, "NumCalc.txt")
+        if not os.path.isfile(logFile):
+            logFile = os.path.join(jobPath, "NC.out")
+        stat = os.stat(logFile)
+
+        method = ""
+        numBoundaryElements = -1
+        try:
+            numCalcInput = readNumCalcInput(os.path.join(jobPath, "NC.inp"))
+            method = numCalcInput['method'] or ""
+            numBoundaryElements = numCalcInput['numBoundaryElements'] or -1
+        except (OSError, ValueError, IndexError):
+            pass
+
+        # nonzeros, iterations and mesh size are only written to NC.out
+        output = {'numBoundaryElements': None, 'numBoundaryNodes': None, 'steps': []}
+        if os.path.isfile(os.path.join(jobPath, "NC.out")):
+            output = readNumCalcOutput(os.path.join(jobPath, "NC.out"))
+        outputSteps = dict((step['step'], step) for step in output['steps'])
+        if output['numBoundaryElements'] is not None:
+            numBoundaryElements = output['numBoundaryElements']
+        numBoundaryNodes = output['numBoundaryNodes'] or -1
+
+        rows = dict((name, []) for name, dtype in columnTypes)
+        with open(logFile, errors="replace") as file:
+            for step in iterNumCalcSteps(file):
+                step = dict(outputSteps.get(step['step'], {}), **step)
+                values = dict(step, project=project, job=job, method=method, logTime=stat.st_mtime,
+                              numBoundaryElements=numBoundaryElements, numBoundaryNodes=numBoundaryNodes)
+                for name, dtype in columnTypes:
+                    rows[name].append(values.get(name, missingValue(dtype)))
+
+        self.removeJob(project, job)
+        for name, dtype in columnTypes:
+            self.columns[name] = np.concatenate((self.columns[name], np.array(rows[name], dtype=dtype)))
+        self.sources[os.path.abspath(logFile)] = [stat.st_size, stat.st_mtime_ns]
+        return len(rows['step'])
+
+    def addProject(self, projectPath):
+        '''Add or update all NumCalc jobs of a project whose logs changed; return the number of parsed jobs'''
+        projectPath = os.path.abspath(projectPath)
+        numCalcPath = os.path.join(projectPath, "NumCalc")
+        numJobs = 0
+        for name in sorted(os.listdir(numCalcPath)):
+            jobPath = os.path.join(numCalcPath, name)
+            if not re.match(r"CPU_\d+_Core_\d+$", name):
+                continue
+            for logName in ["NumCalc.txt", "NC.out"]:
+                logFile = os.path.join(jobPath, logName)
+                if os.path.isfile(logFile):
+                    break
+            else:
+                continue
+            stat = os.stat(logFile)
+            if self.sources.get(logFile) == [stat.st_size, stat.st_mtime_ns]:
+                continue
+            self.addJob(projectPath, jobPath)
+            numJobs += 1
+        return numJobs
+
+    def select(self, **conditions):
+        '''Return the columns of the rows matching all conditions (column=value)'''
+        mask = np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            mask &= self.columns[name] == value
+        return dict((name, column[mask]) for name, column in self.columns.items())
+
+    def records(self):
+        '''Return the finished steps as records for ResourceEstimator.fit()'''
+        records = []
+        columns = self.columns
+        for ii in np.nonzero(~np.isnan(columns['totalTime']) & (columns['numBoundaryElements'] > 0))[0]:
+            method = str(columns['method'][ii])
+            numElements = int(columns['numBoundaryElements'][ii])
+            if method == '0':
+                memory = 16.*numElements**2
+            elif columns['nonzeros'][ii] >= 0:
+                memory = float(bytesPerNonzero*columns['nonzeros'][ii])
+            else:
+                memory = None
+            records.append((method, numElements, float(columns['frequency'][ii]), memory, float(columns['totalTime'][ii])))
+        return records
+
+    def summary(self):
+        '''Return a table with the number of steps and the total and maximum step time of each project'''
+        lines = ["%-40s %6s %8s %9s %10s %10s" % ("Project", "Method", "Elements", "Steps", "Total (s)", "Max (s)")]
+        for project in np.unique(self.columns['project']):
+            rows = self.select(project=project)
+            finished = ~np.isnan(rows['totalTime'])
+            lines.append("%-40s %6s %8d %9d %10.0f %10.0f" % (
+                project[-40:], ",".join(np.unique(rows['method'])), rows['numBoundaryElements'].max(),
+                finished.sum(), rows['totalTime'][finished].sum(), rows['totalTime'][finished].max(initial=0)))
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 1:
+        print("usage: python -m mesh2hrtf.NumCalc.timingDatabase <database.npz> [<project> ...]")
+        return 1
+    database = TimingDatabase(argv[0])
+    for projectPath in argv[1:]:
+        print("%s: %d jobs parsed" % (projectPath, database.addProject(projectPath)))
+    database.save()
+    print(database.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
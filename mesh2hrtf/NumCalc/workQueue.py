@@ -0,0 +1,229 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Lock-protected queue of single-frequency NumCalc tasks (NumCalc/Queue)
+
+Instead of fixed frequency lists per core, the exporter can write a single
+job description (job.json: the export plan and one task per ear and
+frequency). Workers on any machine that shares the project folder claim
+the next pending task, solve it (see queueWorker.py) and mark it done, so
+that no core waits while others still have work.
+
+The queue state (state.json) is only read and written while holding a lock
+directory. It is prepared with an owner file and renamed to NumCalc/Queue/lock,
+which is atomic also on network file systems. Stale locks are broken by
+renaming them away and checking their owner; their age is taken from the
+modification times on the file server.
+'''
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import contextlib
+
+
+class WorkQueue:
+    '''Tasks and their state in <project>/NumCalc/Queue'''
+
+    def __init__(self, projectPath, lockTimeout=60.):
+        self.projectPath = os.path.abspath(projectPath)
+        self.path = os.path.join(self.projectPath, "NumCalc", "Queue")
+        self.lockPath = os.path.join(self.path, "lock")
+        # locks older than lockTimeout seconds are left over from a crashed worker
+        self.lockTimeout = lockTimeout
+        self.description = None
+
+    @classmethod
+    def create(cls, projectPath, plan, tasks, key=None):
+        '''Write the job description and the state of the tasks
+
+        tasks are dicts with 'id', 'ear', 'object', 'frequency', 'folder'
+        (CPU_x_Core_y folder that collects the result) and 'index' (number of
+        the be.N/fe.N folder), in the order in which they are handed out. key
+        identifies the data the plan refers to (e.g. the meshes). Tasks that
+        are unchanged since the last job description with the same plan
+        (except its date) and key keep their state unless they failed, all
+        others are pending.
+        '''
+        queue = cls(projectPath)
+        if not os.path.exists(queue.path):
+            os.makedirs(queue.path)
+        with queue.lock():
+            oldTasks, oldState = {}, {}
+            try:
+                old = queue.readJSON("job.json")
+                oldState = queue.readJSON("state.json")
+            except (OSError, ValueError):
+                old = None
+            if old is not None and old.get('key') == key and \
+                    dict(old['plan'], date=None) == dict(json.loads(json.dumps(plan)), date=None):
+                oldTasks = dict((task['id'], task) for task in old['tasks'])
+            state = {}
+            for task in tasks:
+                if oldTasks.get(task['id']) == task and oldState.get(task['id'], {}).get('status') in ('CLAIMED', 'DONE'):
+                    state[task['id']] = oldState[task['id']]
+                else:
+                    state[task['id']] = {'status': 'PENDING', 'attempts': 0}
+            queue.writeJSON("job.json", {'plan': plan, 'key': key, 'tasks': tasks})
+            queue.writeJSON("state.json", state)
+        return queue
+
+    def writeJSON(self, name, data):
+        temp = os.path.join(self.path, "%s.%s.%d.tmp" % (name, socket.gethostname(), os.getpid()))
+        with open(temp, "w") as file:
+            json.dump(data, file, indent=1)
+        os.replace(temp, os.path.join(self.path, name))
+
+    def readJSON(self, name):
+        with open(os.path.join(self.path, name)) as file:
+            return json.load(file)
+
+    def readDescription(self):
+        if self.description is None:
+            self.description = self.readJSON("job.json")
+        return self.description
+
+    @property
+    def tasks(self):
+        return self.readDescription()['tasks']
+
+    @property
+    def plan(self):
+        return self.readDescription()['plan']
+
+    def readOwner(self, lockPath):
+        '''Return the token and modification time of the owner file of a lock directory (None if there is none)'''
+        try:
+            with open(os.path.join(lockPath, "owner")) as file:
+                return file.read(), os.fstat(file.fileno()).st_mtime
+        except OSError:
+            return None
+
+    @contextlib.contextmanager
+    def lock(self, pollInterval=0.1):
+        token = "%s.%d.%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex)
+        ownedPath = "%s.%s" % (self.lockPath, token)
+        ownerFile = os.path.join(ownedPath, "owner")
+        os.mkdir(ownedPath)
+        with open(ownerFile, "w") as file:
+            file.write(token)
+        try:
+            while True:
+                # the modification time of the lock is the time it was taken (on the file server)
+                os.utime(ownerFile)
+                try:
+                    os.rename(ownedPath, self.lockPath)
+                    break
+                except OSError:
+                    pass
+                owner = self.readOwner(self.lockPath)
+                if owner is not None and os.stat(ownerFile).st_mtime-owner[1] > self.lockTimeout:
+                    self.breakLock(owner[0], token)
+                    continue
+                time.sleep(pollInterval)
+        except BaseException:
+            shutil.rmtree(ownedPath, ignore_errors=True)
+            raise
+        try:
+            yield
+        finally:
+            self.releaseLock(token)
+
+    def breakLock(self, staleToken, token):
+        '''Remove the lock left over by the owner staleToken
+
+        Only one waiter can rename the lock away. If the lock was taken again
+        meanwhile, it is put back.
+        '''
+        stalePath = "%s.stale.%s" % (self.lockPath, token)
+        try:
+            os.rename(self.lockPath, stalePath)
+        except OSError:
+            return
+        owner = self.readOwner(stalePath)
+        if owner is not None and owner[0] != staleToken:
+            try:
+                os.rename(stalePath, self.lockPath)
+                return
+            except OSError:
+                pass
+        shutil.rmtree(stalePath, ignore_errors=True)
+
+    def releaseLock(self, token):
+        owner = self.readOwner(self.lockPath)
+        if owner is None or owner[0] != token:
+            # the lock was broken meanwhile
+            return
+        releasedPath = "%s.released.%s" % (self.lockPath, token)
+        os.rename(self.lockPath, releasedPath)
+        shutil.rmtree(releasedPath, ignore_errors=True)
+
+    def state(self):
+        '''Return the current state of all tasks (id -> dict with 'status', 'attempts', ...)'''
+        with self.lock():
+            return self.readJSON("state.json")
+
+    def claim(self, worker, staleTimeout=None):
+        '''Return the next pending task, marked as claimed by worker (None if no task is pending)
+
+        Tasks claimed longer than staleTimeout seconds ago (None: never) are
+        handed out again, e.g. after a worker was killed.
+        '''
+        now = time.time()
+        with self.lock():
+            state = self.readJSON("state.json")
+            for task in self.tasks:
+                taskState = state[task['id']]
+                stale = (taskState['status'] == 'CLAIMED' and staleTimeout is not None
+                         and now-taskState['claimTime'] > staleTimeout)
+                if taskState['status'] == 'PENDING' or stale:
+                    taskState.update({'status': 'CLAIMED', 'worker': worker, 'claimTime': now})
+                    taskState['attempts'] += 1
+                    self.writeJSON("state.json", state)
+                    return task
+        return None
+
+    def complete(self, task, worker, success, runTime=None, retries=1, log=None):
+        '''Mark a claimed task as done or failed (pending again while it has retries left)
+
+        log is appended to the NumCalc.txt of the task's folder.
+        '''
+        with self.lock():
+            state = self.readJSON("state.json")
+            taskState = state[task['id']]
+            if taskState.get('worker') != worker:
+                # the task was handed out again meanwhile
+                return
+            if success:
+                taskState['status'] = 'DONE'
+                taskState['runTime'] = runTime
+            elif taskState['attempts'] <= retries:
+                taskState['status'] = 'PENDING'
+            else:
+                taskState['status'] = 'FAILED'
+            self.writeJSON("state.json", state)
+            if log:
+                with open(os.path.join(self.projectPath, "NumCalc", task['folder'], "NumCalc.txt"), "a") as file:
+                    file.write(log)
+
+    def counts(self):
+        '''Return the number of tasks per status'''
+        counts = {'PENDING': 0, 'CLAIMED': 0, 'DONE': 0, 'FAILED': 0}
+        for taskState in self.state().values():
+            counts[taskState['status']] += 1
+        return counts
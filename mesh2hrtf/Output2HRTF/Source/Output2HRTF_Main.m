@@ -207,11 +207,11 @@ if ~isempty(evaluationGrids)
             end
             fprintf('...');
         end
-        pressure(:,:,ch)=tmpPressure;
+        % sort each ear, their folders may hold the frequencies in different orders (e.g. after resumeNumCalc)
+        [frequencies,idx]=sort(frequencies);
+        pressure(:,:,ch)=tmpPressure(idx,:);
         clear tmpPressure
     end
-    [frequencies,idx]=sort(frequencies);
-    pressure=pressure(idx,:,:);
 end
 
 % added Fabian Brinkmann
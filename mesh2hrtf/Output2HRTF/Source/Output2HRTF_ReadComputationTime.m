@@ -25,7 +25,13 @@ function data=Output2HRTF_ReadBEMPerformance(filename)
 %   Output:
 %       data
 
+data=zeros(0,6);
 fid=fopen(filename);
+if fid<0
+    % e.g. results deployed from the solve cache without NC.out
+    warning(['Output2HRTF_ReadComputationTime: ' filename ' not found']);
+    return
+end
 count=0;
 while ~feof(fid)
     line=fgets(fid);
@@ -57,5 +63,6 @@ while ~feof(fid)
         break
     end
 end
+fclose(fid);
 
 end %of function
\ No newline at end of file
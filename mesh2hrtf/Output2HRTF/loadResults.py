@@ -0,0 +1,118 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Fast loading of the NumCalc results (be.out/be.N) of a project
+
+Python counterpart of Output2HRTF_Load.m: the be.out folder is listed once,
+the fixed file header is parsed directly and the be.N files are read in
+parallel by a thread pool, with the numbers parsed by NumPy.
+'''
+
+import os
+import concurrent.futures
+import numpy as np
+
+from ..Mesh2Input.exportProject import readMatlabMatrix
+
+
+def readResultFile(filename):
+    '''Return the node/element numbers and the complex values of a pBoundary, vBoundary, pEvalGrid or vEvalGrid file
+
+    The files start with the version and the number of groups, followed by
+    a line with the group number and the number of rows, and the rows
+    "number real imaginary" of each (non-empty) group.
+    '''
+    with open(filename, "rb") as file:
+        lines = file.read().split(b"\n")
+    blocks = []
+    position = 2
+    while position < len(lines) and lines[position].strip():
+        numRows = int(lines[position].split()[1])
+        blocks.append(b" ".join(lines[position+1:position+1+numRows]))
+        position += 1+numRows
+    values = np.fromstring(b" ".join(blocks), sep=" ").reshape(-1, 3)
+    return values[:, 0].astype(int), values[:, 1]+1j*values[:, 2]
+
+
+def readFrequency(filename):
+    '''Return the frequency of a fe.out/fe.N/load file'''
+    with open(filename) as file:
+        return float(file.read().split("\n")[2])
+
+
+def numResults(folder):
+    '''Return the number of consecutive results be.1, be.2, ... in a be.out folder'''
+    names = set(os.listdir(folder))
+    num = 0
+    while "be.%d" % (num+1) in names:
+        num += 1
+    return num
+
+
+def readStep(folder, step, filename):
+    '''Return the frequency and the values of step (be.N) of a be.out folder'''
+    frequency = readFrequency(os.path.join(folder, "..", "fe.out", "fe.%d" % step, "load"))
+    return frequency, readResultFile(os.path.join(folder, "be.%d" % step, filename))[1]
+
+
+def loadResults(folder, filename, numWorkers=None):
+    '''Return the values (frequency x node) and the frequencies of a be.out folder
+
+    filename is 'pBoundary', 'vBoundary', 'pEvalGrid' or 'vEvalGrid'. The
+    frequencies are in the order of the steps (as Output2HRTF_Load.m).
+    '''
+    steps = range(1, numResults(folder)+1)
+    with concurrent.futures.ThreadPoolExecutor(numWorkers) as pool:
+        results = list(pool.map(lambda step: readStep(folder, step, filename), steps))
+    if not results:
+        return np.zeros((0, 0), complex), np.zeros(0)
+    return np.array([values for frequency, values in results]), np.array([frequency for frequency, values in results])
+
+
+def projectFolders(projectPath):
+    '''Return the ear (1 or 2) and the be.out folder of all cores listed in Output2HRTF.m'''
+    with open(os.path.join(projectPath, "Output2HRTF.m")) as file:
+        cpusAndCores = readMatlabMatrix(file.read(), "cpusAndCores")[0]
+    return [(ear, os.path.join(projectPath, "NumCalc", "CPU_%d_Core_%d" % (cpu, core), "be.out"))
+            for cpu, row in enumerate(cpusAndCores, 1) for core, ear in enumerate(row, 1) if ear]
+
+
+def loadProject(projectPath, filename="pEvalGrid", numWorkers=None):
+    '''Return the sorted frequencies and the values (frequency x node x ear) of a project
+
+    The results of all cores are read by one thread pool of numWorkers
+    threads (default: see concurrent.futures.ThreadPoolExecutor).
+    '''
+    tasks = [(ear, folder, step) for ear, folder in projectFolders(projectPath)
+             for step in range(1, numResults(folder)+1)]
+    if not tasks:
+        raise Exception("Error, no results found in %s/NumCalc" % projectPath)
+    with concurrent.futures.ThreadPoolExecutor(numWorkers) as pool:
+        results = list(pool.map(lambda task: readStep(task[1], task[2], filename), tasks))
+
+    numEars = max(ear for ear, folder, step in tasks)
+    frequencies = None
+    data = None
+    for ear in range(1, numEars+1):
+        earResults = sorted((result for task, result in zip(tasks, results) if task[0] == ear), key=lambda result: result[0])
+        earFrequencies = np.array([frequency for frequency, values in earResults])
+        if data is None:
+            frequencies = earFrequencies
+            data = np.zeros((len(earResults), len(earResults[0][1]), numEars), complex)
+        elif not np.array_equal(frequencies, earFrequencies):
+            raise Exception("Error, the ears were calculated for different frequencies")
+        for index, (frequency, values) in enumerate(earResults):
+            data[index, :, ear-1] = values
+    return frequencies, data
@@ -0,0 +1,367 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Consolidated binary archive of all results of a project
+
+writeArchive() packs the text files of all be.N folders of a project
+(pBoundary, vBoundary, pEvalGrid, vEvalGrid), the frequencies and the
+geometry of the evaluation grids into one file (default:
+<project>/Results.m2hrtf), optionally deleting be.out and fe.out after
+the archive was verified. ResultsArchive opens it memory-mapped.
+
+updateArchive() can be called any time while NumCalc is running: a
+manifest next to the archive records the size and modification time of
+every be.N already copied, so each call reads only the frequencies that
+finished since the last one.
+
+File layout: the magic string, the length of the JSON header (uint64,
+little endian), the JSON header and the arrays, each aligned to 4096
+bytes. The values of a result file are stored as complex128 array of
+shape (ear, node chunk, frequency, node in chunk), i.e. a range of nodes is
+contiguous for every frequency and a frequency is read chunk by chunk.
+
+    python -m mesh2hrtf.Output2HRTF.resultsArchive <project> [--update | --remove-results]
+'''
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import concurrent.futures
+import numpy as np
+
+from .loadResults import projectFolders, readResultFile, readFrequency
+from ..NumCalc.numCalcLogs import readNumCalcInput
+from ..NumCalc.numCalcResults import completedSteps
+from ..Mesh2Input.meshFiles import readNodes, readElements
+
+magic = b"MESH2HRTFARCHIVE"
+alignment = 4096
+resultKinds = ('pBoundary', 'vBoundary', 'pEvalGrid', 'vEvalGrid')
+
+
+class ResultsArchive:
+    '''Memory-mapped access to an archive written by writeArchive'''
+
+    def __init__(self, filename, mode='r'):
+        self.filename = filename
+        self.mode = mode
+        with open(filename, "rb") as file:
+            if file.read(len(magic)) != magic:
+                raise Exception("Error, %s is not a Mesh2HRTF results archive" % filename)
+            headerLength = int(np.frombuffer(file.read(8), dtype="<u8")[0])
+            self.header = json.loads(file.read(headerLength).decode("utf8"))
+        self.arrays = {}
+
+    def array(self, name):
+        '''Return the memory-mapped array name'''
+        if name not in self.arrays:
+            info = self.header['arrays'][name]
+            if not np.prod(info['shape']):
+                self.arrays[name] = np.zeros(info['shape'], dtype=info['dtype'])
+            else:
+                self.arrays[name] = np.memmap(self.filename, dtype=info['dtype'], mode=self.mode,
+                                              offset=info['offset'], shape=tuple(info['shape']))
+        return self.arrays[name]
+
+    @property
+    def frequencies(self):
+        return self.array('frequencies')
+
+    @property
+    def complete(self):
+        '''Return if the results of each ear and frequency are in the archive (ear x frequency)'''
+        return self.array('complete').astype(bool)
+
+    @property
+    def kinds(self):
+        return self.header['kinds']
+
+    @property
+    def numEars(self):
+        return self.header['numEars']
+
+    def numbers(self, kind='pEvalGrid'):
+        '''Return the node (element) numbers of the values of kind'''
+        return self.array(kind+"Numbers")
+
+    def frequencyIndex(self, frequency):
+        '''Return the index of a frequency'''
+        index = int(np.searchsorted(self.frequencies, frequency))
+        if index == len(self.frequencies) or self.frequencies[index] != frequency:
+            raise KeyError(frequency)
+        return index
+
+    def read(self, kind='pEvalGrid', frequencies=slice(None), nodes=slice(None), ears=slice(None)):
+        '''Return the values of kind (frequency x node x ear)
+
+        frequencies and ears are indices, slices or index arrays, nodes is a
+        slice with step 1 of the node (element) indices; only the chunks
+        holding these nodes are read.
+        '''
+        data = self.array(kind)
+        chunkSize = data.shape[3]
+        first, last, step = nodes.indices(len(self.numbers(kind)))
+        if step != 1:
+            raise ValueError("nodes must be a slice with step 1")
+        last = max(first, last)
+        firstChunk, lastChunk = first//chunkSize, max(first, last-1)//chunkSize
+        # integer indices are read as lists to keep the axes and dropped at the end
+        values = data[[ears] if isScalar(ears) else ears, firstChunk:lastChunk+1]
+        values = values[:, :, [frequencies] if isScalar(frequencies) else frequencies]
+        values = np.transpose(values, (2, 1, 3, 0)).reshape(values.shape[2], -1, values.shape[0])
+        values = values[:, first-firstChunk*chunkSize:last-firstChunk*chunkSize]
+        return values[0 if isScalar(frequencies) else slice(None), :, 0 if isScalar(ears) else slice(None)]
+
+    def grid(self):
+        '''Return the node numbers, coordinates, element numbers and element nodes of the evaluation grids'''
+        return (self.array('gridNodeNumbers'), self.array('gridNodes'),
+                self.array('gridElementNumbers'), self.array('gridElements'))
+
+
+def isScalar(index):
+    '''Return True for an integer index (no slice or index array)'''
+    return not isinstance(index, slice) and np.ndim(index) == 0
+
+
+def readStepResults(folder, step, kinds):
+    '''Return the frequency and the values of each kind of step (be.N) of a be.out folder'''
+    frequency = readFrequency(os.path.join(folder, "..", "fe.out", "fe.%d" % step, "load"))
+    return frequency, [readResultFile(os.path.join(folder, "be.%d" % step, kind))[1] for kind in kinds]
+
+
+def jobInput(jobPath):
+    '''Return the NC.inp (or NC.inp.done of finished or deployed jobs) of a job, None if there is none'''
+    for name in ("NC.inp", "NC.inp.done"):
+        if os.path.isfile(os.path.join(jobPath, name)):
+            return readNumCalcInput(os.path.join(jobPath, name))
+    return None
+
+
+def readGrids(jobPath):
+    '''Return the geometry of the evaluation grids listed in the NC.inp of a job'''
+    grid = ([], [], [], [])
+    numCalcInput = jobInput(jobPath) or {'nodeFiles': [], 'elementFiles': []}
+    for nodeFile, elementFile in zip(numCalcInput['nodeFiles'][1:], numCalcInput['elementFiles'][1:]):
+        numbers, nodes = readNodes(os.path.join(jobPath, nodeFile))
+        elementNumbers, elements = readElements(os.path.join(jobPath, elementFile))
+        for values, part in zip(grid, (numbers, nodes, elementNumbers, elements)):
+            values.append(part)
+    if not grid[0]:
+        return np.zeros(0, np.int64), np.zeros((0, 3)), np.zeros(0, np.int64), np.zeros((0, 3), np.int64)
+    numCorners = max(elements.shape[1] for elements in grid[3])
+    elements = [np.pad(elements, ((0, 0), (0, numCorners-elements.shape[1])), constant_values=-1) for elements in grid[3]]
+    return np.concatenate(grid[0]), np.concatenate(grid[1]), np.concatenate(grid[2]), np.concatenate(elements)
+
+
+def createArchive(filename, frequencies, numEars, numbers, grid, chunkSize):
+    '''Write an archive without results for the frequencies, ears and node (element) numbers of each kind'''
+    arrays = [('frequencies', frequencies), ('complete', (np.uint8, (numEars, len(frequencies)))),
+              ('gridNodeNumbers', grid[0]), ('gridNodes', grid[1]), ('gridElementNumbers', grid[2]), ('gridElements', grid[3])]
+    for kind in numbers:
+        numChunks = -(-len(numbers[kind])//chunkSize)
+        arrays.append((kind+"Numbers", numbers[kind]))
+        arrays.append((kind, (np.dtype(complex), (numEars, numChunks, len(frequencies), chunkSize))))
+
+    header = {'numEars': numEars, 'kinds': list(numbers), 'chunkSize': chunkSize, 'arrays': {}}
+    offset = 0
+    for name, value in arrays:
+        dtype, shape = (value.dtype, value.shape) if isinstance(value, np.ndarray) else value
+        header['arrays'][name] = {'dtype': np.dtype(dtype).str, 'shape': list(shape), 'offset': offset}
+        offset += -(-int(np.prod(shape))*np.dtype(dtype).itemsize//alignment)*alignment
+    # offsets relative to the data start, which depends on the header length
+    headerLength = len(json.dumps(header))+32*len(arrays)
+    dataStart = -(-(len(magic)+8+headerLength)//alignment)*alignment
+    for info in header['arrays'].values():
+        info['offset'] += dataStart
+    headerBytes = json.dumps(header).encode("utf8")
+    if len(headerBytes) > headerLength:
+        raise Exception("Error, the archive header is too long")
+    headerBytes = headerBytes.ljust(headerLength)
+
+    temp = filename+".tmp"
+    with open(temp, "wb") as file:
+        file.write(magic)
+        file.write(np.array([len(headerBytes)], dtype="<u8").tobytes())
+        file.write(headerBytes)
+        file.truncate(dataStart+offset)
+    archive = ResultsArchive(temp, mode='r+')
+    for name, value in arrays:
+        if isinstance(value, np.ndarray) and value.size:
+            archive.array(name)[...] = value
+            archive.array(name).flush()
+    del archive
+    os.replace(temp, filename)
+
+
+def stepSignature(folder, step):
+    '''Return the total size and the latest modification time (ns) of the files of step (be.N and fe.N/load)'''
+    stats = [entry.stat() for entry in os.scandir(os.path.join(folder, "be.%d" % step))]
+    stats.append(os.stat(os.path.join(folder, "..", "fe.out", "fe.%d" % step, "load")))
+    return [sum(stat.st_size for stat in stats), max(stat.st_mtime_ns for stat in stats)]
+
+
+def readManifest(filename):
+    '''Return the ingested steps {"CPU_x_Core_y/be.N": [ear, size, mtime]} of the manifest of an archive'''
+    try:
+        with open(filename+".manifest") as file:
+            return json.load(file)['steps']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def writeManifest(filename, steps):
+    temp = filename+".manifest.tmp"
+    with open(temp, "w") as file:
+        json.dump({'version': 1, 'steps': steps}, file, indent=0, sort_keys=True)
+    os.replace(temp, filename+".manifest")
+
+
+def updateArchive(projectPath, filename=None, chunkSize=None, numWorkers=None, batchSize=64, log=print):
+    '''Copy the complete results not yet in the archive of a project into it and return the number of new steps
+
+    The archive is allocated for all frequencies in the NC.inp files of the
+    project. Its manifest (<archive>.manifest) lists the size and
+    modification time of every ingested be.N, so only results that are
+    new or changed since the last call are read. Frequencies without
+    results are zero with complete == 0. chunkSize defaults to that of the
+    existing archive (4096 for a new one).
+    '''
+    filename = filename or os.path.join(projectPath, "Results.m2hrtf")
+    folders = projectFolders(projectPath)
+    inputs = [jobInput(os.path.dirname(folder)) for ear, folder in folders]
+    numEars = max(ear for ear, folder in folders)
+    frequencies = np.unique([frequency for numCalcInput in inputs if numCalcInput for frequency in numCalcInput['frequencies']])
+
+    # an archive of other frequencies, ears or chunk size is written again
+    archive = ResultsArchive(filename, mode='r+') if os.path.isfile(filename) else None
+    if archive is not None and (archive.numEars != numEars or chunkSize not in (None, archive.header['chunkSize'])
+                                or len(archive.frequencies) != len(frequencies)
+                                or not np.allclose(archive.frequencies, frequencies, rtol=1e-5, atol=0)):
+        log("The frequencies of %s changed, the archive is written again." % filename)
+        archive = None
+    manifest = readManifest(filename) if archive is not None else {}
+
+    # new or changed complete steps
+    tasks = []
+    for (ear, folder), numCalcInput in zip(folders, inputs):
+        if not numCalcInput or not os.path.isdir(folder):
+            continue
+        jobName = os.path.basename(os.path.dirname(folder))
+        for step in completedSteps(os.path.dirname(folder), len(numCalcInput['frequencies'])):
+            key = "%s/be.%d" % (jobName, step)
+            signature = [ear]+stepSignature(folder, step)
+            if manifest.get(key) != signature:
+                tasks.append((key, signature, folder, step))
+
+    if not tasks:
+        log("No new results.")
+        return 0
+    if archive is None:
+        firstStep = os.path.join(tasks[0][2], "be.%d" % tasks[0][3])
+        numbers = dict((kind, readResultFile(os.path.join(firstStep, kind))[0]) for kind in resultKinds
+                       if os.path.isfile(os.path.join(firstStep, kind)))
+        createArchive(filename, frequencies, numEars, numbers, readGrids(os.path.dirname(tasks[0][2])), chunkSize or 4096)
+        archive = ResultsArchive(filename, mode='r+')
+    kinds = archive.kinds
+
+    # copy the results in batches, the manifest is written after the data of each batch
+    def readTask(task):
+        key, signature, folder, step = task
+        return readStepResults(folder, step, kinds)
+
+    with concurrent.futures.ThreadPoolExecutor(numWorkers) as pool:
+        for first in range(0, len(tasks), batchSize):
+            batch = tasks[first:first+batchSize]
+            for (key, signature, folder, step), (frequency, values) in zip(batch, pool.map(readTask, batch)):
+                ear = signature[0]
+                index = int(np.argmin(np.abs(frequencies-frequency)))
+                if not np.isclose(frequencies[index], frequency, rtol=1e-5, atol=0):
+                    raise Exception("Error, %s/%s (%g Hz) is not a frequency of the project" % (projectPath, key, frequency))
+                for kind, kindValues in zip(kinds, values):
+                    data = archive.array(kind)
+                    padded = np.zeros(data.shape[1]*data.shape[3], complex)
+                    padded[:len(kindValues)] = kindValues
+                    data[ear-1, :, index, :] = padded.reshape(data.shape[1], data.shape[3])
+                archive.array('frequencies')[index] = frequency
+                archive.array('complete')[ear-1, index] = 1
+            for name in kinds+['frequencies', 'complete']:
+                archive.array(name).flush()
+            manifest.update((key, signature) for key, signature, folder, step in batch)
+            writeManifest(filename, manifest)
+            log("%d of %d new steps archived" % (min(first+batchSize, len(tasks)), len(tasks)))
+    log("%d of %d results complete." % (np.count_nonzero(archive.array('complete')), archive.array('complete').size))
+    return len(tasks)
+
+
+def writeArchive(projectPath, filename=None, chunkSize=None, numWorkers=None, removeResults=False,
+                 batchSize=64, log=print):
+    '''Write all results of a project into one archive and return its file name
+
+    The archive is brought up to date by updateArchive(). With
+    removeResults, the archive must be complete, every value is compared
+    with the text files and be.out and fe.out of all cores are deleted.
+    '''
+    filename = filename or os.path.join(projectPath, "Results.m2hrtf")
+    updateArchive(projectPath, filename, chunkSize, numWorkers, batchSize, log)
+    if not os.path.isfile(filename):
+        raise Exception("Error, no results found in %s/NumCalc" % projectPath)
+
+# ------------------------ Verify and remove the text files --------------------
+    if removeResults:
+        archive = ResultsArchive(filename)
+        if not np.all(archive.complete):
+            raise Exception("Error, %s is not complete, the text files were kept" % filename)
+        folders = [(ear, folder) for ear, folder in projectFolders(projectPath) if os.path.isdir(folder)]
+        tasks = [(ear, folder, step) for ear, folder in folders
+                 for step in completedSteps(os.path.dirname(folder), len(jobInput(os.path.dirname(folder))['frequencies']))]
+
+        def verifyStep(task):
+            ear, folder, step = task
+            frequency, values = readStepResults(folder, step, archive.kinds)
+            index = archive.frequencyIndex(frequency)
+            return all(np.array_equal(archive.read(kind, index, ears=ear-1), kindValues)
+                       for kind, kindValues in zip(archive.kinds, values))
+
+        with concurrent.futures.ThreadPoolExecutor(numWorkers) as pool:
+            if not all(pool.map(verifyStep, tasks)):
+                raise Exception("Error, %s differs from the results, the text files were kept" % filename)
+        for ear, folder in folders:
+            shutil.rmtree(folder)
+            shutil.rmtree(os.path.join(os.path.dirname(folder), "fe.out"), ignore_errors=True)
+        log("Archive verified, be.out and fe.out deleted.")
+    return filename
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack all results of a Mesh2HRTF project into one archive")
+    parser.add_argument("project", help="project folder")
+    parser.add_argument("--output", default=None, help="archive file (default: <project>/Results.m2hrtf)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="number of nodes per chunk (default: 4096)")
+    parser.add_argument("--workers", type=int, default=None, help="number of reading threads")
+    parser.add_argument("--remove-results", action="store_true", help="delete be.out and fe.out after verifying the archive")
+    parser.add_argument("--update", action="store_true", help="only add the results finished since the last call (partial projects)")
+    args = parser.parse_args(argv)
+
+    if args.update:
+        updateArchive(args.project, args.output, args.chunk_size, args.workers)
+    else:
+        writeArchive(args.project, args.output, args.chunk_size, args.workers, args.remove_results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Streaming SOFA writer for the evaluation grids of a project
+
+writeSofa() writes the pressure on the evaluation grids as SOFA file
+(netCDF4, optional package netCDF4) of the conventions SimpleFreeFieldTF
+or GeneralTF, as Output2HRTF_Main.m does with SOFAsave. The data
+variables are created chunked and compressed and are filled block by
+block: one ear and frequencyChunk frequencies are read from the be.N
+files (or the results archive, see resultsArchive.py), referenced if
+'reference' is set in Output2HRTF.m, and written, i.e. the memory does
+not grow with the number of frequencies.
+
+    python -m mesh2hrtf.Output2HRTF.sofaFiles <project>
+'''
+
+import os
+import re
+import sys
+import time
+import argparse
+import concurrent.futures
+import numpy as np
+
+from .loadResults import projectFolders, numResults, readResultFile, readFrequency
+from .resultsArchive import ResultsArchive, readGrids
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+# SOFA conventions (version 1.0) with their additional global attributes
+conventions = {'SimpleFreeFieldTF': {'DatabaseName': '', 'ListenerShortName': ''},
+               'GeneralTF': {}}
+
+
+# ------------------------ Project parameters ----------------------------------
+def readOutputParameters(projectPath):
+    '''Return the parameters of Output2HRTF_Main from the Output2HRTF.m of a project
+
+    reciprocity, reference, speedOfSound, densityOfAir, receiverCenter
+    (ear x 3) and receiverArea (ear).
+    '''
+    with open(os.path.join(projectPath, "Output2HRTF.m")) as file:
+        text = file.read()
+
+    def value(name, default):
+        match = re.search(r"^%s\s*=\s*([^;]+);" % name, text, re.M)
+        if not match:
+            return default
+        entry = match.group(1).strip()
+        return {'true': 1.0, 'false': 0.0}[entry] if entry in ('true', 'false') else float(entry)
+
+    receiverCenter = dict((int(ear), [float(x) for x in row.split()]) for ear, row in
+                          re.findall(r"^receiverCenter\((\d),1:3\)\s*=\s*\[([^\]]*)\]", text, re.M))
+    receiverArea = dict((int(ear), float(area)) for ear, area in
+                        re.findall(r"^receiverArea\((\d),1\)\s*=\s*([^;\s]+)", text, re.M))
+    ears = sorted(receiverCenter)
+    return {'reciprocity': bool(value("reciprocity", 0)),
+            'reference': bool(value("reference", 0)),
+            'speedOfSound': value("speedOfSound", 346.18),
+            'densityOfAir': value("densityOfAir", 1.1839),
+            'receiverCenter': np.array([receiverCenter[ear] for ear in ears]).reshape(-1, 3),
+            'receiverArea': np.array([receiverArea.get(ear, 1) for ear in ears])}
+
+
+def pointSource(frequencies, r, volumeFlow, speedOfSound, densityOfAir):
+    '''Return the pressure of a point source in the origin at the distance r
+
+    eq. (6.71) in: Williams, E. G. (1999). Fourier Acoustics.
+    '''
+    frequencies = np.asarray(frequencies)[:, np.newaxis]
+    return (-1j*densityOfAir*2*np.pi*frequencies*volumeFlow/(4*np.pi)
+            * np.exp(1j*2*np.pi*frequencies/speedOfSound*r)/r)
+
+
+# ------------------------ Sources of the results ------------------------------
+class TextResults:
+    '''Evaluation grid pressure read from the be.N files of a project'''
+
+    def __init__(self, projectPath, numWorkers=None):
+        self.numWorkers = numWorkers
+        tasks = [(ear, folder, step) for ear, folder in projectFolders(projectPath)
+                 for step in range(1, numResults(folder)+1)]
+        if not tasks:
+            raise Exception("Error, no results found in %s/NumCalc" % projectPath)
+        with concurrent.futures.ThreadPoolExecutor(numWorkers) as pool:
+            stepFrequencies = list(pool.map(lambda task: readFrequency(os.path.join(task[1], "..", "fe.out", "fe.%d" % task[2], "load")), tasks))
+        self.numEars = max(ear for ear, folder, step in tasks)
+        self.frequencies = np.unique(stepFrequencies)
+        self.steps = {}
+        for (ear, folder, step), frequency in zip(tasks, stepFrequencies):
+            self.steps[ear-1, frequency] = (folder, step)
+        for ear in range(self.numEars):
+            if sum(key[0] == ear for key in self.steps) != len(self.frequencies):
+                raise Exception("Error, the ears were calculated for different frequencies")
+        self.numNodes = len(readResultFile(os.path.join(tasks[0][1], "be.%d" % tasks[0][2], "pEvalGrid"))[0])
+
+    def read(self, ear, frequencies):
+        '''Return the pressure (frequency x node) of the indices frequencies of an ear (0, 1)'''
+        def readStep(frequency):
+            folder, step = self.steps[ear, frequency]
+            return readResultFile(os.path.join(folder, "be.%d" % step, "pEvalGrid"))[1]
+
+        with concurrent.futures.ThreadPoolExecutor(self.numWorkers) as pool:
+            return np.array(list(pool.map(readStep, self.frequencies[frequencies])))
+
+
+class ArchiveResults:
+    '''Evaluation grid pressure read from a complete results archive'''
+
+    def __init__(self, filename):
+        self.archive = ResultsArchive(filename)
+        if 'pEvalGrid' not in self.archive.kinds or not np.all(self.archive.complete):
+            raise Exception("Error, %s has no complete evaluation grid results" % filename)
+        self.numEars = self.archive.numEars
+        self.frequencies = np.array(self.archive.frequencies)
+        self.numNodes = len(self.archive.numbers('pEvalGrid'))
+
+    def read(self, ear, frequencies):
+        return self.archive.read('pEvalGrid', frequencies, ears=ear)
+
+
+# ------------------------ SOFA files ------------------------------------------
+def writeSofa(projectPath, filename, convention='SimpleFreeFieldTF', results=None, frequencyChunk=16,
+              nodeChunk=4096, compression=4, log=print):
+    '''Write the pressure on the evaluation grids of a project as SOFA file
+
+    results is a TextResults or ArchiveResults (default: the archive
+    <project>/Results.m2hrtf if it is complete, else the be.N files). The
+    variables Data.Real and Data.Imag (M x R x N) are chunked with
+    nodeChunk sources and frequencyChunk frequencies and compressed with
+    zlib level compression.
+    '''
+    if netCDF4 is None:
+        raise Exception("Error, writing SOFA files needs the Python package netCDF4")
+    if convention not in conventions:
+        raise ValueError("convention must be one of %s" % ", ".join(conventions))
+    parameters = readOutputParameters(projectPath)
+    if not parameters['reciprocity']:
+        raise Exception("Error, SOFA files are written for reciprocal calculations only")
+    if results is None:
+        results = defaultResults(projectPath)
+    jobPath = os.path.dirname(projectFolders(projectPath)[0][1])
+    sourcePositions = readGrids(jobPath)[1]
+    if len(sourcePositions) != results.numNodes:
+        raise Exception("Error, the evaluation grids of %s do not match the results" % jobPath)
+    numSources, numEars, numFrequencies = results.numNodes, results.numEars, len(results.frequencies)
+    version = applicationVersion()
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    temp = filename+".tmp"
+    dataset = netCDF4.Dataset(temp, "w", format="NETCDF4")
+    try:
+        attributes = {'Conventions': 'SOFA', 'Version': '1.0',
+                      'SOFAConventions': convention, 'SOFAConventionsVersion': '1.0',
+                      'APIName': 'Mesh2HRTF', 'APIVersion': version,
+                      'ApplicationName': 'Mesh2HRTF', 'ApplicationVersion': version,
+                      'AuthorContact': '', 'Organization': '', 'Title': '', 'Comment': '',
+                      'License': 'No license provided, ask the author for permission',
+                      'DataType': 'TF', 'RoomType': 'free field', 'History': '', 'References': '', 'Origin': '',
+                      'DateCreated': now, 'DateModified': now}
+        attributes.update(conventions[convention])
+        dataset.setncatts(attributes)
+        for name, size in (('I', 1), ('C', 3), ('R', numEars), ('E', 1), ('N', numFrequencies), ('M', numSources)):
+            dataset.createDimension(name, size)
+
+        def position(name, dimensions, value, kind='cartesian'):
+            variable = dataset.createVariable(name, "f8", dimensions)
+            variable.Type = kind
+            variable.Units = 'metre'
+            variable[:] = np.reshape(value, variable.shape)
+
+        position("ListenerPosition", ("I", "C"), [0, 0, 0])
+        position("ListenerUp", ("I", "C"), [0, 0, 1])
+        position("ListenerView", ("I", "C"), [1, 0, 0])
+        position("ReceiverPosition", ("R", "C", "I"), parameters['receiverCenter'][:numEars])
+        position("EmitterPosition", ("E", "C", "I"), [0, 0, 0])
+        position("SourcePosition", ("M", "C"), sourcePositions)
+        variable = dataset.createVariable("N", "f8", ("N",))
+        variable.LongName = 'frequency'
+        variable.Units = 'hertz'
+        variable[:] = results.frequencies
+
+        chunks = (min(numSources, nodeChunk), 1, min(numFrequencies, frequencyChunk))
+        data = []
+        for name in ("Data.Real", "Data.Imag"):
+            variable = dataset.createVariable(name, "f8", ("M", "R", "N"), zlib=compression > 0,
+                                              complevel=max(compression, 1), shuffle=True, chunksizes=chunks)
+            variable.LongName = 'pressure'
+            variable.Units = 'pascal'
+            data.append(variable)
+
+        # reference to the pressure of a point source in the origin (refMode 1 of Output2HRTF_Main.m)
+        r = np.min(np.sqrt(np.sum(sourcePositions**2, 1)))
+        for ear in range(numEars):
+            for first in range(0, numFrequencies, frequencyChunk):
+                block = slice(first, min(first+frequencyChunk, numFrequencies))
+                pressure = results.read(ear, block)
+                if parameters['reference']:
+                    area = parameters['receiverArea'][ear] if ear < len(parameters['receiverArea']) else 1
+                    pressure = pressure/pointSource(results.frequencies[block], r, .1*area,
+                                                    parameters['speedOfSound'], parameters['densityOfAir'])
+                data[0][:, ear, block] = pressure.real.T
+                data[1][:, ear, block] = pressure.imag.T
+            log("Ear %d of %d written to %s" % (ear+1, numEars, os.path.basename(filename)))
+    finally:
+        dataset.close()
+    os.replace(temp, filename)
+    return filename
+
+
+def defaultResults(projectPath, numWorkers=None):
+    '''Return the complete results archive of a project if there is one, else its be.N files'''
+    filename = os.path.join(projectPath, "Results.m2hrtf")
+    if os.path.isfile(filename):
+        archive = ResultsArchive(filename)
+        if 'pEvalGrid' in archive.kinds and np.all(archive.complete):
+            return ArchiveResults(filename)
+    return TextResults(projectPath, numWorkers)
+
+
+def applicationVersion():
+    '''Return the version of Mesh2HRTF from the VERSION file'''
+    filename = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "VERSION")
+    if not os.path.isfile(filename):
+        return ''
+    with open(filename) as file:
+        return file.readline().strip()
+
+
+def writeProjectSofa(projectPath, results=None, frequencyChunk=16, compression=4, log=print):
+    '''Write EvaluationGrid.sofa (SimpleFreeFieldTF) and EvaluationGrid_GeneralTF.sofa of a project'''
+    results = results or defaultResults(projectPath)
+    return [writeSofa(projectPath, os.path.join(projectPath, name), convention, results, frequencyChunk,
+                      compression=compression, log=log)
+            for name, convention in (("EvaluationGrid_GeneralTF.sofa", 'GeneralTF'), ("EvaluationGrid.sofa", 'SimpleFreeFieldTF'))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the SOFA files of the evaluation grids of a Mesh2HRTF project")
+    parser.add_argument("project", help="project folder")
+    parser.add_argument("--frequency-chunk", type=int, default=16, help="frequencies read and written at a time")
+    parser.add_argument("--compression", type=int, default=4, help="zlib level (0: uncompressed)")
+    parser.add_argument("--text", action="store_true", help="read the be.N files even if there is a results archive")
+    args = parser.parse_args(argv)
+
+    results = TextResults(args.project) if args.text else None
+    writeProjectSofa(args.project, results, args.frequency_chunk, args.compression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+#                                Mesh2HRTF
+#                Copyright (C) 2015 by Harald Ziegelwanger,
+#        Acoustics Research Institute, Austrian Academy of Sciences
+#                        mesh2hrtf.sourceforge.net
+#
+# Mesh2HRTF is licensed under the GNU Lesser General Public License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# Mesh2HRTF is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU Lesser General Public License for more details.
+# You should have received a copy of the GNU LesserGeneral Public License along with Mesh2HRTF. If not, see <http://www.gnu.org/licenses/lgpl.html>.
+#
+# If you use Mesh2HRTF:
+# - Provide credits:
+#   "Mesh2HRTF, H. Ziegelwanger, ARI, OEAW (mesh2hrtf.sourceforge.net)"
+# - In your publication, cite both articles:
+#   [1] Ziegelwanger, H., Kreuzer, W., and Majdak, P. (2015). "Mesh2HRTF: Open-source software package for the numerical calculation of head-related transfer functions," in Proceedings of the 22nd ICSV, Florence, IT.
+#   [2] Ziegelwanger, H., Majdak, P., and Kreuzer, W. (2015). "Numerical calculation of listener-specific head-related transfer functions and sound localization: Microphone model and mesh discretization," The Journal of the Acoustical Society of America, 138, 208-222.
+'''Mesh2HRTF Python tools
+
+The Blender add-on Mesh2Input/exportMesh2HRTF.py imports this package from
+its programPath; it can also be used directly, e.g.
+
+    import mesh2hrtf
+    mesh = mesh2hrtf.ObjectMesh('Reference', vertices, faces, materials=materials,
+                                materialNames=['Skin', 'Left ear', 'Right ear'])
+    mesh2hrtf.writeProject('/path/to/project', [mesh], ['3_ARI'])
+
+and the results of the solved project are loaded with
+
+    frequencies, pressure = mesh2hrtf.loadProject('/path/to/project', 'pEvalGrid')
+'''
+
+from .Mesh2Input import (ObjectMesh, EvaluationGrid, writeProject, distributeFrequencies,
+                         balanceFrequencies, scheduleLongestFirst, deployEvaluationGrid,
+                         cacheEvaluationGrid, nearFieldSphere, nearFieldRadius, nearFieldOffset,
+                         writeNodes, writeElements, readMeshHeader, pictureKey, cachedPictures,
+                         deployPictures, startRenderJob, ExportManifest, meshKey, gradeMesh, gradeMeshes,
+                         MeshResolution)
+from .Output2HRTF import loadResults, loadProject